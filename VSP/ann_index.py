@@ -0,0 +1,127 @@
+"""IVF-flat approximate nearest-neighbour index over the vendor matrix.
+
+Rows are clustered with spherical k-means (the matrix is L2-normalized, so
+cosine == dot product) into ``nlist`` inverted lists. A query scores the
+centroids, scans only the ``nprobe`` closest lists and scores their rows
+exactly. Row masks (service pre-filter) are applied to the probed rows and
+``nprobe`` is scaled up by the mask's selectivity; if a filter is very
+selective the search falls back to exact scoring of the allowed rows, and if
+the probed lists still do not hold ``k`` allowed rows more lists are probed.
+
+The index only stores centroids and row ids, persisted as an ``.npz`` next to
+the embeddings store and tied to it through the manifest's matrix hash.
+"""
+import os
+
+import numpy as np
+
+
+def _spherical_kmeans(x, nlist, iters, rng, chunk=8192):
+    centroids = x[rng.choice(x.shape[0], nlist, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids, chunk)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty lists from random points
+            sums[empty] = x[rng.choice(x.shape[0], int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def _assign(x, centroids, chunk=8192):
+    out = np.empty(x.shape[0], dtype=np.int32)
+    for i in range(0, x.shape[0], chunk):
+        out[i:i + chunk] = np.argmax(np.asarray(x[i:i + chunk]) @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    def __init__(self, centroids, order, offsets, matrix_sha256=None):
+        self.centroids = centroids
+        # rows grouped by list: order[offsets[l]:offsets[l + 1]] are the rows of list l
+        self.order = order
+        self.offsets = offsets
+        self.matrix_sha256 = matrix_sha256
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix, nlist=None, iters=10, sample_per_list=64, seed=0, matrix_sha256=None):
+        n = matrix.shape[0]
+        nlist = int(nlist or max(1, 4 * int(np.sqrt(n))))
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(seed)
+        train_n = min(n, nlist * sample_per_list)
+        train = np.asarray(matrix[np.sort(rng.choice(n, train_n, replace=False))], dtype=np.float32)
+        centroids = _spherical_kmeans(train, nlist, iters, rng)
+        assign = _assign(matrix, centroids)
+        order = np.argsort(assign, kind='stable').astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(centroids, order, offsets, matrix_sha256)
+
+    def save(self, path):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, centroids=self.centroids, order=self.order, offsets=self.offsets,
+                 matrix_sha256=np.asarray(self.matrix_sha256 or ''))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, matrix_sha256=None):
+        """Load a saved index; None if missing or built for a different matrix."""
+        try:
+            with np.load(path) as z:
+                sha = str(z['matrix_sha256'])
+                if matrix_sha256 and sha != matrix_sha256:
+                    return None
+                return cls(z['centroids'], z['order'], z['offsets'], sha)
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _probe_rows(self, lists):
+        return np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists]) if len(lists) else np.zeros(0, dtype=np.int64)
+
+    def candidates(self, q, k=20, nprobe=8, mask=None, exact_below=2048):
+        """Sorted row ids to score exactly for normalized query ``q`` (allowed rows of the probed lists)."""
+        nprobe = nprobe or 1
+        if mask is not None:
+            allowed = int(mask.sum())
+            if allowed <= max(exact_below, k):
+                # a selective filter: scoring the allowed rows exactly is cheaper than probing
+                return np.flatnonzero(mask)
+            # probe proportionally more lists so roughly as many allowed rows are seen
+            nprobe = int(np.ceil(nprobe * mask.shape[0] / allowed))
+        nprobe = max(1, min(nprobe, self.nlist))
+        lists = np.argsort(-(self.centroids @ q))
+        probed = nprobe
+        rows = self._probe_rows(lists[:probed])
+        if mask is not None:
+            rows = rows[mask[rows]]
+        # widen the probe until k allowed rows are in the candidate set
+        while rows.shape[0] < k and probed < self.nlist:
+            extra = self._probe_rows(lists[probed:probed * 2])
+            probed *= 2
+            rows = np.concatenate([rows, extra[mask[extra]] if mask is not None else extra])
+        # sorted row ids keep the gather sequential over a memmapped matrix
+        return np.sort(rows)
+
+    def search(self, matrix, q, k=20, nprobe=8, mask=None, exact_below=2048):
+        """Return (rows, scores) of the approximate top-k for normalized query ``q``."""
+        rows = self.candidates(q, k, nprobe, mask, exact_below)
+        return top_rows(rows, np.asarray(matrix[rows]) @ q, k)
+
+
+def top_rows(rows, scores, k):
+    k = min(k, rows.shape[0])
+    if k <= 0:
+        return rows[:0], scores[:0]
+    idx = np.argpartition(-scores, k - 1)[:k] if k < rows.shape[0] else np.arange(rows.shape[0])
+    idx = idx[np.argsort(-scores[idx], kind='stable')]
+    return rows[idx], scores[idx]
@@ -0,0 +1,183 @@
+"""Append-only, segmented JSONL audit log for vendor selection.
+
+``select_vendors`` only enqueues a record; a background task drains the queue
+and group-commits whole batches to the current segment file. Each worker
+process writes its own segments (pid in the file name) so multiple uvicorn
+workers never interleave lines, and segments rotate by size and age.
+"""
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LEGACY_SEGMENT = 'audit-00000000T000000-legacy.jsonl'
+
+
+class AuditLog:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, segment_seconds=24 * 3600, batch_size=512, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self._fh = None
+        self._opened_at = 0.0
+        self._queue = None
+        self._task = None
+        # optional callback(record_count, seconds) after each group commit
+        self.on_batch = None
+        # optional callback(segment path, offset, records, line sizes) after each
+        # group commit, e.g. to maintain an index of the segments
+        self.on_commit = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --- writing ---
+
+    def append(self, record):
+        """Queue a record for the background writer (or write it now if none runs)."""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(record)
+        else:
+            self.write_batch([record])
+
+    def append_many(self, records):
+        """Queue several records so they land in the same group commit."""
+        records = list(records)
+        if not records:
+            return
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(records)
+        else:
+            self.write_batch(records)
+
+    def write_batch(self, records):
+        if not records:
+            return
+        started = time.perf_counter()
+        lines = [(json.dumps(r, default=str) + '\n').encode('utf-8') for r in records]
+        fh = self._segment()
+        offset = fh.tell()
+        fh.write(b''.join(lines))
+        fh.flush()
+        if self.fsync:
+            os.fsync(fh.fileno())
+        if self.on_batch is not None:
+            self.on_batch(len(records), time.perf_counter() - started)
+        if self.on_commit is not None:
+            try:
+                self.on_commit(fh.name, offset, records, [len(l) for l in lines])
+            except Exception as e:
+                # the records are durable; the index catches up from the segment later
+                print('Audit index update failed:', str(e))
+
+    def _segment(self):
+        if self._fh is not None:
+            too_big = self._fh.tell() >= self.segment_bytes
+            too_old = time.time() - self._opened_at >= self.segment_seconds
+            if not (too_big or too_old):
+                return self._fh
+            self._fh.close()
+        name = f"audit-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.jsonl"
+        self._fh = open(os.path.join(self.directory, name), 'ab')
+        self._opened_at = time.time()
+        return self._fh
+
+    async def _writer(self):
+        while True:
+            item = await self._queue.get()
+            batch = []
+            stop = False
+            # group commit: take whatever else is already waiting
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+            if batch:
+                try:
+                    await asyncio.to_thread(self.write_batch, batch)
+                except Exception as e:
+                    print('Audit write failed:', str(e))
+            if stop:
+                return
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        """Flush everything queued so far and stop the writer."""
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    # --- reading / migration ---
+
+    def segments(self):
+        return sorted(os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.jsonl'))
+
+    def iter_records(self):
+        for path in self.segments():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except Exception:
+                        # a torn last line from a crash; skip it
+                        continue
+
+    def import_legacy(self, path):
+        """Import the old selection_audit.json array once; returns records imported.
+
+        Workers take turns on a lock file; the ``.legacy_imported`` marker is
+        written only after the import succeeded, so a crash or a file that does
+        not parse leaves the import to be retried on the next start.
+        """
+        if not os.path.exists(path):
+            return 0
+        marker = os.path.join(self.directory, '.legacy_imported')
+        with open(os.path.join(self.directory, '.legacy_import.lock'), 'a') as lock:
+            if fcntl is not None:
+                # the others wait here until the first worker is done
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            if os.path.exists(marker):
+                return 0
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print('Legacy audit import failed (retried on next start):', str(e))
+                return 0
+            records = data if isinstance(data, list) else []
+            tmp = os.path.join(self.directory, LEGACY_SEGMENT + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for r in records:
+                    f.write(json.dumps(r, default=str) + '\n')
+            os.replace(tmp, os.path.join(self.directory, LEGACY_SEGMENT))
+            with open(marker + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'source': path, 'count': len(records)}, f)
+            os.replace(marker + '.tmp', marker)
+        if records:
+            print(f'Imported {len(records)} audit records from {path}')
+        return len(records)
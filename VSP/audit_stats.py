@@ -0,0 +1,443 @@
+"""Incrementally maintained analytics and an index over the selection audit trail.
+
+Every group commit of the audit log (see ``AuditLog.on_commit``) is folded into
+a SQLite database in the same transaction that advances the segment's indexed
+offset:
+
+- ``selection_stats``: selections per day and facet, by method
+  (local_rerank / llm_rerank), rerank outcome and retrieval mode, with the
+  number of requests they answered and how often the final list agreed with
+  retrieval (same top vendor, overlap of the final list with retrieval's top).
+- ``vendor_stats``: per vendor, day, facet and method, how often it was ranked
+  at each final position (rank 0: retrieved but not shortlisted) and the sum of
+  its retrieval-minus-final rank deltas (positive: moved up by the rerank).
+- ``records`` / ``record_facets`` / ``record_vendors``: where each record sits
+  in its segment, indexed by time, service / market and vendor, so a query
+  reads only the matching lines.
+
+A facet is ``*`` (every selection), ``service:<name>`` or ``market:<name>``, so
+per-service and per-market numbers never double count a selection in the
+totals. Segments written while the index was not updated (first start, a
+crash, another worker's writer) are picked up from their indexed offset by
+``catch_up``; dashboards only ever read the aggregates.
+"""
+import os
+import json
+import sqlite3
+import threading
+
+from request_store import encode_cursor, decode_cursor
+
+ALL = '*'
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS segments (name TEXT PRIMARY KEY, offset INTEGER NOT NULL)',
+    '''CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        method TEXT,
+        segment TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        length INTEGER NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS records_created_at ON records(created_at, id)',
+    '''CREATE TABLE IF NOT EXISTS record_facets (
+        facet TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        record_id INTEGER NOT NULL,
+        PRIMARY KEY (facet, created_at, record_id)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS record_vendors (
+        vendor TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        record_id INTEGER NOT NULL,
+        PRIMARY KEY (vendor, created_at, record_id)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS selection_stats (
+        facet TEXT NOT NULL,
+        day TEXT NOT NULL,
+        method TEXT NOT NULL,
+        outcome TEXT NOT NULL,
+        retrieval TEXT NOT NULL,
+        selections INTEGER NOT NULL,
+        requests INTEGER NOT NULL,
+        top1_agree INTEGER NOT NULL,
+        overlap_sum REAL NOT NULL,
+        PRIMARY KEY (facet, day, method, outcome, retrieval)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS vendor_stats (
+        facet TEXT NOT NULL,
+        day TEXT NOT NULL,
+        vendor TEXT NOT NULL,
+        method TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        compared INTEGER NOT NULL,
+        delta_sum INTEGER NOT NULL,
+        abs_delta_sum INTEGER NOT NULL,
+        PRIMARY KEY (facet, day, vendor, method, rank)
+    ) WITHOUT ROWID''',
+    'CREATE INDEX IF NOT EXISTS vendor_stats_vendor ON vendor_stats(vendor, facet, day)',
+]
+
+SELECTION_UPSERT = '''INSERT INTO selection_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (facet, day, method, outcome, retrieval) DO UPDATE SET
+        selections = selections + excluded.selections, requests = requests + excluded.requests,
+        top1_agree = top1_agree + excluded.top1_agree, overlap_sum = overlap_sum + excluded.overlap_sum'''
+
+VENDOR_UPSERT = '''INSERT INTO vendor_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (facet, day, vendor, method, rank) DO UPDATE SET
+        count = count + excluded.count, compared = compared + excluded.compared,
+        delta_sum = delta_sum + excluded.delta_sum, abs_delta_sum = abs_delta_sum + excluded.abs_delta_sum'''
+
+GROUPS = ('day', 'service', 'market', 'method', 'outcome', 'retrieval')
+
+
+def _values(value):
+    """Request fields arrive as lists, plain strings or JSON-encoded lists."""
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if not isinstance(value, list):
+        value = [value]
+    return sorted({str(v).strip().lower() for v in value if v not in (None, '') and str(v).strip()})
+
+
+def record_facets(record):
+    """``service:`` and ``market:`` facets of an audit record's request."""
+    req = record.get('request') if isinstance(record.get('request'), dict) else {}
+    services = _values(req.get('services_needed') or req.get('service'))
+    markets = _values(req.get('target_markets') or req.get('targetMarkets') or req.get('markets'))
+    return [f'service:{s}' for s in services] + [f'market:{m}' for m in markets]
+
+
+def record_method(record):
+    """'llm_rerank' or 'local_rerank' from the record's method ('rag_retrieval:llm_rerank')."""
+    return str(record.get('method') or 'unknown').rsplit(':', 1)[-1]
+
+
+def _names(items):
+    return [i.get('name') for i in items or [] if isinstance(i, dict) and i.get('name')]
+
+
+class AuditStats:
+    def __init__(self, path, segment_dir):
+        self.path = path
+        self.segment_dir = segment_dir
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for stmt in SCHEMA:
+                conn.execute(stmt)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    # --- ingestion ---
+
+    def on_commit(self, path, offset, records, sizes):
+        """``AuditLog.on_commit`` hook: index a batch just appended at ``offset`` of ``path``."""
+        name = os.path.basename(path)
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT offset FROM segments WHERE name = ?', (name,)).fetchone()
+            indexed = row[0] if row else 0
+            if indexed == offset:
+                self._ingest(conn, name, offset, zip(records, sizes))
+            elif indexed < offset + sum(sizes):
+                # an earlier batch was missed (or a torn line precedes this one)
+                self._ingest(conn, name, indexed, self._read_lines(path, indexed))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def catch_up(self, segments):
+        """Index whatever the segment files hold beyond their indexed offset; returns records added."""
+        added = 0
+        for path in segments:
+            name = os.path.basename(path)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            row = self._conn().execute('SELECT offset FROM segments WHERE name = ?', (name,)).fetchone()
+            if row and row[0] >= size:
+                continue
+            conn = self._conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # re-read under the write lock: another worker may have got here first
+                row = conn.execute('SELECT offset FROM segments WHERE name = ?', (name,)).fetchone()
+                added += self._ingest(conn, name, row[0] if row else 0, self._read_lines(path, row[0] if row else 0))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return added
+
+    @staticmethod
+    def _read_lines(path, offset):
+        """(record or None, line size) for every complete line from ``offset``."""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return  # a partial last line waits for its newline
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield (record if isinstance(record, dict) else None), len(line)
+
+    def _ingest(self, conn, name, offset, lines):
+        selections, vendors, index = {}, {}, ([], [])
+        rows = 0
+        for record, size in lines:
+            if record is not None and record.get('createdAt'):
+                self._add(conn, name, offset, size, record, selections, vendors, index)
+                rows += 1
+            offset += size
+        # in primary key order, so large batches (catch-up) walk each b-tree once
+        conn.executemany('INSERT OR IGNORE INTO record_facets VALUES (?, ?, ?)', sorted(index[0]))
+        conn.executemany('INSERT OR IGNORE INTO record_vendors VALUES (?, ?, ?)', sorted(index[1]))
+        conn.executemany(SELECTION_UPSERT, [k + tuple(v) for k, v in sorted(selections.items())])
+        conn.executemany(VENDOR_UPSERT, [k + tuple(v) for k, v in sorted(vendors.items())])
+        conn.execute('INSERT INTO segments (name, offset) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET offset = excluded.offset',
+                     (name, offset))
+        return rows
+
+    @staticmethod
+    def _add(conn, name, offset, size, record, selections, vendors, index):
+        created = str(record['createdAt'])
+        day, method = created[:10], record_method(record)
+        facets = record_facets(record)
+        final = _names(record.get('final_selection'))
+        retrieved = _names(record.get('retrieval_candidates'))
+        cur = conn.execute('INSERT INTO records (created_at, method, segment, offset, length) VALUES (?, ?, ?, ?, ?)',
+                           (created, method, name, offset, size))
+        record_id = cur.lastrowid
+        index[0].extend((f, created, record_id) for f in facets)
+        index[1].extend((v, created, record_id) for v in set(final) | set(retrieved))
+
+        top1 = int(bool(final) and bool(retrieved) and final[0] == retrieved[0])
+        overlap = len(set(final) & set(retrieved[:len(final)])) / len(final) if final else 0.0
+        retrieval_rank = {v: i + 1 for i, v in reversed(list(enumerate(retrieved)))}
+        ranks = {}
+        for i, v in enumerate(final):
+            ranks.setdefault(v, i + 1)
+        for v in retrieved:
+            ranks.setdefault(v, 0)
+        for facet in [ALL] + facets:
+            key = (facet, day, method, str(record.get('rerank_outcome') or ''), str(record.get('retrieval') or ''))
+            s = selections.setdefault(key, [0, 0, 0, 0.0])
+            s[0] += 1
+            s[1] += int(record.get('coalesced') or 1)
+            s[2] += top1
+            s[3] += overlap
+            for v, rank in ranks.items():
+                vs = vendors.setdefault((facet, day, v, method, rank), [0, 0, 0, 0])
+                vs[0] += 1
+                if rank and v in retrieval_rank:
+                    delta = retrieval_rank[v] - rank
+                    vs[1] += 1
+                    vs[2] += delta
+                    vs[3] += abs(delta)
+
+    # --- queries ---
+
+    def stats(self, day_from=None, day_to=None, facet=ALL, vendor=None, group='day', limit=50):
+        """Aggregates for a day range and facet: totals, one row per ``group`` value and the top vendors.
+
+        With ``vendor`` the groups count that vendor's shortlistings instead of
+        selections, and the vendor list holds just that vendor.
+        """
+        if group not in GROUPS:
+            raise ValueError(f'group must be one of {", ".join(GROUPS)}')
+        conn = self._conn()
+        where, args = ['facet = ?'], [facet]
+        if group in ('service', 'market'):
+            if facet != ALL:
+                raise ValueError(f'group={group} cannot be combined with a service or market filter')
+            where, args = ['facet LIKE ?'], [group + ':%']
+        if day_from:
+            where.append('day >= ?')
+            args.append(day_from[:10])
+        if day_to:
+            where.append('day <= ?')
+            args.append(day_to[:10])
+        group_col = 'facet' if group in ('service', 'market') else group
+
+        totals_where, totals_args = ['facet = ?'] + where[1:], [facet] + args[1:]
+        totals = self._selection_totals(conn, totals_where, totals_args)
+        if vendor:
+            vwhere, vargs = where + ['vendor = ?'], args + [vendor]
+            if group in ('outcome', 'retrieval'):
+                raise ValueError(f'group={group} is not kept per vendor')
+            rows = conn.execute(f'SELECT {group_col}, method, rank, SUM(count) FROM vendor_stats INDEXED BY vendor_stats_vendor '
+                                f'WHERE {" AND ".join(vwhere)} '
+                                f'GROUP BY {group_col}, method, rank', vargs).fetchall()
+            groups = {}
+            for key, method, rank, count in rows:
+                g = groups.setdefault(key, {'key': _group_key(group, key), 'shortlisted': 0, 'retrieved_only': 0, 'methods': {}})
+                if rank:
+                    g['shortlisted'] += count
+                    g['methods'][method] = g['methods'].get(method, 0) + count
+                else:
+                    g['retrieved_only'] += count
+            vendors = self._vendors(conn, totals_where, totals_args, 1, vendor)
+        else:
+            rows = conn.execute(f'SELECT {group_col}, method, SUM(selections), SUM(requests), SUM(top1_agree), SUM(overlap_sum) '
+                                f'FROM selection_stats WHERE {" AND ".join(where)} GROUP BY {group_col}, method', args).fetchall()
+            groups = {}
+            for key, method, selections, requests, top1, overlap in rows:
+                g = groups.setdefault(key, _selection_row(_group_key(group, key)))
+                _add_selections(g, method, selections, requests, top1, overlap)
+            for g in groups.values():
+                _finish_selections(g)
+            vendors = self._vendors(conn, totals_where, totals_args, limit)
+        return {'totals': totals, 'groups': sorted(groups.values(), key=lambda g: str(g['key'])), 'vendors': vendors}
+
+    def _selection_totals(self, conn, where, args):
+        totals = _selection_row(None)
+        totals.pop('key')
+        totals['outcomes'] = {}
+        for method, outcome, selections, requests, top1, overlap in conn.execute(
+                'SELECT method, outcome, SUM(selections), SUM(requests), SUM(top1_agree), SUM(overlap_sum) '
+                f'FROM selection_stats WHERE {" AND ".join(where)} GROUP BY method, outcome', args):
+            _add_selections(totals, method, selections, requests, top1, overlap)
+            totals['outcomes'][outcome] = totals['outcomes'].get(outcome, 0) + selections
+        return _finish_selections(totals)
+
+    def _vendors(self, conn, where, args, limit, vendor=None):
+        """Most often shortlisted vendors (or just ``vendor``) with their rank distribution and mean rank change."""
+        cond = ' AND '.join(where)
+        if vendor:
+            sql = (f'SELECT vendor, method, rank, SUM(count), SUM(compared), SUM(delta_sum), SUM(abs_delta_sum) '
+                   f'FROM vendor_stats INDEXED BY vendor_stats_vendor WHERE {cond} AND vendor = ? GROUP BY method, rank')
+            rows = conn.execute(sql, args + [vendor]).fetchall()
+        else:
+            # one pass for the top vendors, one for their per-rank rows
+            sql = (f'SELECT vendor, method, rank, SUM(count), SUM(compared), SUM(delta_sum), SUM(abs_delta_sum) '
+                   f'FROM vendor_stats WHERE {cond} AND vendor IN (SELECT vendor FROM vendor_stats WHERE {cond} AND rank > 0 '
+                   'GROUP BY vendor ORDER BY SUM(count) DESC, vendor LIMIT ?) GROUP BY vendor, method, rank')
+            rows = conn.execute(sql, args + args + [int(limit)]).fetchall()
+        out, sums = {}, {}
+        for name, method, rank, count, c, d, ad in rows:
+            v = out.get(name)
+            if v is None:
+                v = out[name] = {'vendor': name, 'shortlisted': 0, 'retrieved_only': 0, 'ranks': {}, 'methods': {}}
+                sums[name] = [0, 0, 0, 0]
+            if not rank:
+                v['retrieved_only'] += count
+                continue
+            v['shortlisted'] += count
+            v['ranks'][rank] = v['ranks'].get(rank, 0) + count
+            v['methods'][method] = v['methods'].get(method, 0) + count
+            s = sums[name]
+            s[0], s[1], s[2], s[3] = s[0] + rank * count, s[1] + c, s[2] + d, s[3] + ad
+        for name, v in out.items():
+            rank_sum, compared, delta, abs_delta = sums[name]
+            v['ranks'] = {str(r): n for r, n in sorted(v['ranks'].items())}
+            v['mean_rank'] = round(rank_sum / v['shortlisted'], 3) if v['shortlisted'] else None
+            v['mean_rank_delta'] = round(delta / compared, 3) if compared else None
+            v['mean_abs_rank_delta'] = round(abs_delta / compared, 3) if compared else None
+        return sorted((v for v in out.values() if v['shortlisted'] or vendor), key=lambda v: (-v['shortlisted'], v['vendor']))
+
+    def query(self, vendor=None, facets=(), created_from=None, created_to=None, method=None, cursor=None, limit=50):
+        """Matching audit records, newest first; returns (records, next_cursor).
+
+        Filters go through the vendor / facet / time indexes and only the
+        matching lines are read back from the segments.
+        """
+        if created_to and len(created_to) == 10:
+            created_to += 'T23:59:59.999999Z'  # a bare date includes that whole day
+        where, args = [], []
+        if vendor:
+            where.append('id IN (SELECT record_id FROM record_vendors WHERE vendor = ?'
+                         + (' AND created_at >= ?' if created_from else '') + (' AND created_at <= ?' if created_to else '') + ')')
+            args += [vendor] + [t for t in (created_from, created_to) if t]
+        for facet in facets:
+            where.append('id IN (SELECT record_id FROM record_facets WHERE facet = ?'
+                         + (' AND created_at >= ?' if created_from else '') + (' AND created_at <= ?' if created_to else '') + ')')
+            args += [facet] + [t for t in (created_from, created_to) if t]
+        if created_from:
+            where.append('created_at >= ?')
+            args.append(created_from)
+        if created_to:
+            where.append('created_at <= ?')
+            args.append(created_to)
+        if method:
+            where.append('method = ?')
+            args.append(method)
+        if cursor:
+            # the cursor is the id of the last record on the previous page
+            last_id = decode_cursor(cursor)
+            last = self._conn().execute('SELECT created_at FROM records WHERE id = ?', (last_id,)).fetchone()
+            if last is None:
+                raise ValueError('invalid cursor')
+            where.append('(created_at < ? OR (created_at = ? AND id < ?))')
+            args += [last[0], last[0], last_id]
+        sql = 'SELECT id, segment, offset, length FROM records'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        rows = self._conn().execute(sql, args + [int(limit) + 1]).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return self._read_records(rows[:limit]), next_cursor
+
+    def _read_records(self, rows):
+        out, files = [], {}
+        try:
+            for _, segment, offset, length in rows:
+                f = files.get(segment)
+                if f is None:
+                    f = files[segment] = open(os.path.join(self.segment_dir, segment), 'rb')
+                f.seek(offset)
+                out.append(json.loads(f.read(length)))
+        finally:
+            for f in files.values():
+                f.close()
+        return out
+
+    def indexed(self):
+        return self._conn().execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+
+def _group_key(group, key):
+    return key.split(':', 1)[1] if group in ('service', 'market') else key
+
+
+def _selection_row(key):
+    return {'key': key, 'selections': 0, 'requests': 0, 'methods': {}, 'top1_agree': 0, 'overlap_sum': 0.0}
+
+
+def _add_selections(row, method, selections, requests, top1, overlap):
+    row['selections'] += selections
+    row['requests'] += requests
+    row['methods'][method] = row['methods'].get(method, 0) + selections
+    row['top1_agree'] += top1
+    row['overlap_sum'] += overlap
+
+
+def _finish_selections(row):
+    """Replace the running sums with rates: how often the final list agreed with retrieval."""
+    n = row['selections']
+    row['top1_agreement'] = round(row.pop('top1_agree') / n, 4) if n else None
+    row['retrieval_overlap'] = round(row.pop('overlap_sum') / n, 4) if n else None
+    return row
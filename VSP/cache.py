@@ -0,0 +1,185 @@
+"""Two-tier cache for query embeddings and LLM rerank results.
+
+Tier 1 is an in-process LRU with TTL; tier 2 is an optional SQLite file shared
+by all workers on the host. Values must be JSON-serializable. Each cache
+counts hits per tier and misses so they can be reported.
+
+Async callers use ``aget``/``aget_many``/``aset``: memory hits are answered
+inline and disk reads and writes run in a thread, so a locked cache file
+never stalls the event loop.
+"""
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def normalize_text(text):
+    return ' '.join(str(text).lower().split())
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    def __init__(self, path, ttl=86400, purge_interval=60.0, timeout=1.0):
+        self.path = path
+        self.ttl = ttl
+        # a cache read or write gives up (and misses) rather than queue behind another worker's lock
+        self.timeout = timeout
+        # expired rows are deleted at most this often, from set(), so the file stops growing
+        self.purge_interval = purge_interval
+        self._purged = time.monotonic()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS cache (ns TEXT, key TEXT, expires REAL, value TEXT, PRIMARY KEY (ns, key))')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns, key):
+        row = self._conn().execute('SELECT expires, value FROM cache WHERE ns = ? AND key = ?', (ns, key)).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return json.loads(row[1])
+
+    def set(self, ns, key, value):
+        self._conn().execute('INSERT OR REPLACE INTO cache (ns, key, expires, value) VALUES (?, ?, ?, ?)',
+                             (ns, key, time.time() + self.ttl, json.dumps(value, default=str)))
+        if time.monotonic() - self._purged > self.purge_interval:
+            self.purge()
+
+    def purge(self):
+        """Delete expired rows (their pages are reused by later writes)."""
+        self._purged = time.monotonic()
+        return self._conn().execute('DELETE FROM cache WHERE expires < ?', (time.time(),)).rowcount
+
+    def clear(self, ns):
+        self._conn().execute('DELETE FROM cache WHERE ns = ?', (ns,))
+
+
+class TieredCache:
+    def __init__(self, name, maxsize=1024, ttl=3600, disk=None):
+        self.name = name
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = disk
+        self.version = None
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def ensure_version(self, version):
+        """Drop entries made against an older catalog/embeddings version.
+
+        Callers also put the version in their keys, so stale disk entries
+        written by other workers simply miss and age out.
+        """
+        if version != self.version:
+            if self.version is not None:
+                self.memory.clear()
+                self.counters['invalidations'] += 1
+            self.version = version
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.counters['memory_hits'] += 1
+            return value
+        if self.disk is not None:
+            value = self._disk_get([key])[0]
+            if value is not None:
+                self.counters['disk_hits'] += 1
+                self.memory.set(key, value)
+                return value
+        self.counters['misses'] += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._disk_set(key, value)
+
+    async def aget(self, key):
+        return (await self.aget_many([key]))[0]
+
+    async def aget_many(self, keys):
+        """Values for ``keys`` (None for misses); the disk tier is read in one thread hop."""
+        out = [self.memory.get(key) for key in keys]
+        todo = [i for i, value in enumerate(out) if value is None]
+        self.counters['memory_hits'] += len(keys) - len(todo)
+        if todo and self.disk is not None:
+            found = await asyncio.to_thread(self._disk_get, [keys[i] for i in todo])
+            for i, value in zip(todo, found):
+                if value is not None:
+                    out[i] = value
+                    self.counters['disk_hits'] += 1
+                    self.memory.set(keys[i], value)
+        self.counters['misses'] += sum(1 for value in out if value is None)
+        return out
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def _disk_get(self, keys):
+        try:
+            return [self.disk.get(self.name, key) for key in keys]
+        except sqlite3.Error as e:
+            print('Disk cache read failed:', str(e))
+            return [None] * len(keys)
+
+    def _disk_set(self, key, value):
+        # best effort: the memory tier already has the value
+        try:
+            self.disk.set(self.name, key, value)
+        except sqlite3.Error as e:
+            print('Disk cache write failed:', str(e))
+
+    def stats(self):
+        lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+        hits = lookups - self.counters['misses']
+        return {**self.counters, 'size': len(self.memory), 'hit_rate': round(hits / lookups, 4) if lookups else None}
@@ -0,0 +1,186 @@
+"""RFP documents and export archives for submitted requests.
+
+``RfpStore`` renders ``data/rfps/<id>_rfp.txt`` and remembers the hash of the
+request body it was rendered from (``data/rfps/sources/<id>.sha256``), so an
+unchanged request reuses its file. ``render_batch`` is a plain module-level
+function so job workers can run it in a process pool.
+
+``stream_export`` zips the RFPs, request bodies and attached uploads on the
+fly and yields the archive as it is produced, so an export is streamed to the
+client without a copy on disk and memory stays flat however large it is.
+Uploads that are already compressed are stored as-is.
+"""
+import os
+import json
+import hashlib
+import zipfile
+
+# bump when the RFP layout changes so every stored RFP is rendered again
+RFP_TEMPLATE_VERSION = 1
+CHUNK = 1 << 20
+# deflating these again only costs time
+STORED_EXTENSIONS = {'.zip', '.gz', '.bz2', '.xz', '.7z', '.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp',
+                     '.docx', '.xlsx', '.pptx', '.mp4', '.mov'}
+
+
+def rfp_value(value):
+    # checkbox fields are stored JSON-encoded, as the form sends them (API clients may send lists)
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if isinstance(value, list):
+        return ', '.join(map(str, value))
+    return '' if value is None else value
+
+
+def render_rfp(request_id, body):
+    """A simple RFP document (text) for one request."""
+    lines = [
+        f"Request for Proposal (RFP)",
+        f"Request ID: {request_id}",
+        f"Project Name: {rfp_value(body.get('projectName'))}",
+        f"Description: {rfp_value(body.get('description'))}",
+        f"Company: {rfp_value(body.get('company_name'))}",
+        f"Primary Contact: {rfp_value(body.get('primary_contact'))}",
+        f"Email: {rfp_value(body.get('email'))}",
+        f"Request Type: {rfp_value(body.get('request_type'))}",
+        f"Services Needed: {rfp_value(body.get('services_needed'))}",
+        f"Target Markets: {rfp_value(body.get('target_markets'))}",
+        f"Budget: {rfp_value(body.get('budget'))}",
+        f"Decision Deadline: {rfp_value(body.get('decisionDeadline'))}",
+        f"Additional Info: {rfp_value(body.get('additional_info'))}",
+        f"Key Criteria: {rfp_value(body.get('keyCriteria'))}",
+        '',
+        'Thank you for considering this RFP.'
+    ]
+    return '\n'.join(lines)
+
+
+def body_hash(request_id, body):
+    canonical = json.dumps([RFP_TEMPLATE_VERSION, request_id, body], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _write_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class RfpStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.sources = os.path.join(directory, 'sources')
+        os.makedirs(self.sources, exist_ok=True)
+
+    def filename(self, request_id):
+        return f'{request_id}_rfp.txt'
+
+    def path(self, request_id):
+        return os.path.join(self.directory, self.filename(request_id))
+
+    def url(self, request_id):
+        return f'/data/rfps/{self.filename(request_id)}'
+
+    def ensure(self, request_id, body):
+        """Path of the request's RFP and whether the stored one was reused."""
+        digest = body_hash(request_id, body)
+        path, source = self.path(request_id), os.path.join(self.sources, f'{request_id}.sha256')
+        try:
+            with open(source, 'r', encoding='utf-8') as f:
+                if f.read().strip() == digest and os.path.exists(path):
+                    return path, True
+        except OSError:
+            pass
+        _write_atomic(path, render_rfp(request_id, body))
+        _write_atomic(source, digest)
+        return path, False
+
+
+def render_batch(directory, entries):
+    """Ensure the RFP of every (id, body) pair; returns [(id, reused)]. Runs in a worker process or thread."""
+    store = RfpStore(directory)
+    return [(request_id, store.ensure(request_id, body)[1]) for request_id, body in entries]
+
+
+def _unique(name, taken):
+    base, ext = os.path.splitext(name)
+    i = 1
+    while name in taken:
+        i += 1
+        name = f'{base} ({i}){ext}'
+    taken.add(name)
+    return name
+
+
+class _Sink:
+    """Write-only file for ``zipfile``: collects what it writes until ``take``."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def stream_export(members):
+    """Zip ``members`` on the fly, yielding the archive's bytes as they are produced.
+
+    ``members`` are (archive name, source path) pairs or (archive name, None,
+    text). Sources are read in CHUNK blocks; the output is not seekable, so
+    sizes and CRCs follow each member in a data descriptor.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6, allowZip64=True) as zf:
+        for member in members:
+            name, source = member[0], member[1]
+            if source is None:
+                zf.writestr(name, member[2])
+            else:
+                info = zipfile.ZipInfo.from_file(source, name)
+                stored = os.path.splitext(name)[1].lower() in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with open(source, 'rb') as src, zf.open(info, 'w') as dst:
+                    for block in iter(lambda: src.read(CHUNK), b''):
+                        dst.write(block)
+                        data = sink.take()
+                        if data:
+                            yield data
+            data = sink.take()
+            if data:
+                yield data
+    # the central directory, written on close
+    yield sink.take()
+
+
+def export_members(entries, upload_path, missing=None):
+    """Archive members for (entry, rfp path) pairs: per request its RFP, body and attached uploads.
+
+    A generator, so the members of a large export are never all in memory.
+    ``upload_path(file_meta)`` maps a stored file to its path on disk (None if
+    it is gone); gone files are skipped and appended to ``missing``.
+    """
+    for entry, rfp_path in entries:
+        folder = entry['id']
+        yield f'{folder}/rfp.txt', rfp_path
+        yield f'{folder}/request.json', None, json.dumps(entry, indent=2, default=str)
+        taken = set()
+        for f in entry.get('files') or []:
+            path = upload_path(f)
+            if path is None:
+                if missing is not None:
+                    missing.append({'id': folder, 'file': f.get('originalname')})
+                continue
+            name = os.path.basename(f.get('originalname') or 'file').replace('\\', '_') or 'file'
+            yield f'{folder}/files/{_unique(name, taken)}', path
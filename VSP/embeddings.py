@@ -0,0 +1,109 @@
+"""Embedding calls and the incremental vendor embedding builder.
+
+Vendor blobs are sent to the embeddings API in batches (the API accepts a list
+of inputs), batches run with bounded concurrency and retry/backoff, and
+vendors whose blob hash and model match the stored vector are reused instead
+of being embedded again.
+
+Calls go through the shared async client in ``openai_client.py``; set
+``OPENAI_BASE_URL`` to point at a local stand-in such as
+``scripts/stub_openai.py``.
+"""
+import os
+import random
+import asyncio
+
+import numpy as np
+
+from openai_client import client_available, get_client
+from vendor_vectors import vendor_blob, blob_hash
+
+
+def embed_model():
+    return os.getenv('OPENAI_EMBED_MODEL', 'text-embedding-3-small')
+
+
+def embeddings_available():
+    return client_available()
+
+
+async def embed_texts(texts, model=None):
+    """Embed a list of texts in one API call; returns vectors in input order."""
+    if not embeddings_available():
+        raise RuntimeError('OPENAI_API_KEY not set or openai package missing')
+    resp = await get_client().embeddings.create(model=model or embed_model(), input=list(texts))
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+async def _embed_with_retry(texts, model, embed_fn, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            vecs = await embed_fn(texts, model)
+            if len(vecs) != len(texts):
+                raise RuntimeError(f'expected {len(texts)} embeddings, got {len(vecs)}')
+            return vecs
+        except Exception as e:
+            if attempt == retries:
+                print('Embedding batch failed:', str(e))
+                return None
+            # exponential backoff with jitter so concurrent batches do not retry in lockstep
+            await asyncio.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+async def build_vendor_embeddings(catalog, existing=None, model=None, embed_fn=None, batch_size=64,
+                                  concurrency=4, retries=3, backoff=0.5, force=False):
+    """Embed the catalog, reusing rows of ``existing`` (a VendorMatrix) that are still current.
+
+    Returns (names, vectors, hashes, stats) with stats counting embedded,
+    reused and failed vendors. A vendor whose batch fails keeps its previous
+    vector (if any) under its old hash so the next build retries it.
+    """
+    model = model or embed_model()
+    embed_fn = embed_fn or embed_texts
+    # vectors from another model live in a different space; never mix them in
+    if existing is not None and existing.manifest.get('model') != model:
+        existing = None
+    old_hashes = dict(zip(existing.names, existing.manifest.get('hashes') or [])) if existing is not None else {}
+
+    names, vectors, hashes = [], [], []
+    todo = []  # (slot, blob) still to embed
+    stats = {'embedded': 0, 'reused': 0, 'failed': 0}
+    seen = set()
+    for v in catalog:
+        name = v.get('name')
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        blob = vendor_blob(v)
+        h = blob_hash(blob)
+        names.append(name)
+        if not force and old_hashes.get(name) == h:
+            vectors.append(np.asarray(existing.vector(name), dtype=np.float32))
+            hashes.append(h)
+            stats['reused'] += 1
+        else:
+            vectors.append(None)
+            hashes.append(h)
+            todo.append((len(names) - 1, blob))
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_batch(batch):
+        async with sem:
+            vecs = await _embed_with_retry([b for _, b in batch], model, embed_fn, retries, backoff)
+        for i, (slot, _) in enumerate(batch):
+            if vecs is not None:
+                vectors[slot] = vecs[i]
+                stats['embedded'] += 1
+            else:
+                stats['failed'] += 1
+                old = existing.vector(names[slot]) if existing is not None else None
+                if old is not None:
+                    vectors[slot] = np.asarray(old, dtype=np.float32)
+                    hashes[slot] = old_hashes.get(names[slot])
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), max(1, batch_size))]
+    await asyncio.gather(*(run_batch(b) for b in batches))
+
+    keep = [i for i, vec in enumerate(vectors) if vec is not None]
+    return ([names[i] for i in keep], [vectors[i] for i in keep], [hashes[i] for i in keep], stats)
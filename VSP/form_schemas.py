@@ -0,0 +1,273 @@
+"""Compiled registry of the form schemas in ``public/formSchemas``.
+
+Every ``*.json`` schema is parsed once and recompiled only when a file is
+added, removed or changed. Each field becomes a small coercing validator
+(text, textarea, email, number, date, select, checkbox; ``required``,
+``options``, ``min`` / ``max``, ``minLength`` / ``maxLength`` and ``pattern``
+are honoured), and the whole set is serialized into one versioned bundle: the
+main form plus every ``{RequestType}_{ServicesNeeded}`` subform, so the
+client navigates the form without further requests.
+
+``validate(body)`` checks a submitted body against the main form, the
+subform its request type and service select, and any extra schemas (e.g.
+``schema/form_schema.json``) for fields the main form does not define.
+Values come back coerced: checkbox lists as lists (the UI sends them
+JSON-encoded), options in their canonical spelling, numbers as numbers.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import date
+
+MAIN_FORM = 'new_request'
+EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class FormError(ValueError):
+    """A body that does not match its forms; ``errors`` maps field names to messages."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f'{k}: {v}' for k, v in errors.items()))
+
+
+def form_id(*parts):
+    """Schema id for a combination, as the UI builds it (``Testing/Analytical`` -> ``TestingAnalytical``)."""
+    return '_'.join(re.sub(r'[^A-Za-z0-9_\-]', '', re.sub(r'\s+', '_', str(p).strip())) for p in parts)
+
+
+def _empty(value):
+    return value is None or value == '' or value == []
+
+
+def _as_list(value):
+    """Checkbox values: a list, a JSON-encoded list or a single value."""
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError('must be a list')
+    return value if isinstance(value, list) else [value]
+
+
+def _scalar(value):
+    if isinstance(value, list):
+        if len(value) != 1:
+            raise ValueError('must be a single value')
+        value = value[0]
+    return value
+
+
+def _compile_field(field):
+    """Coercing validator ``fn(value) -> value`` for one non-empty field value (raises ValueError)."""
+    kind = field.get('type') or 'text'
+    options = {str(o).strip().lower(): o for o in field.get('options') or []}
+
+    def option(value):
+        key = str(value).strip().lower()
+        if key not in options:
+            raise ValueError(f'{value!r} is not one of {", ".join(map(str, options.values()))}')
+        return options[key]
+
+    if kind == 'checkbox':
+        def check(value):
+            out = []
+            for v in _as_list(value):
+                v = option(v) if options else str(v)
+                if v not in out:
+                    out.append(v)
+            return out
+        return check
+    if kind == 'select' and options:
+        return lambda value: option(_scalar(value))
+    if kind == 'number':
+        low, high = field.get('min'), field.get('max')
+
+        def number(value):
+            value = _scalar(value)
+            try:
+                n = float(str(value).strip().replace(',', ''))
+            except ValueError:
+                raise ValueError('must be a number')
+            if n != n or n in (float('inf'), float('-inf')):
+                raise ValueError('must be a number')
+            if low is not None and n < low or high is not None and n > high:
+                raise ValueError(f'must be between {low} and {high}')
+            return int(n) if n.is_integer() else n
+        return number
+    if kind == 'date':
+        def iso_date(value):
+            try:
+                return date.fromisoformat(str(_scalar(value)).strip()).isoformat()
+            except ValueError:
+                raise ValueError('must be a date (YYYY-MM-DD)')
+        return iso_date
+
+    min_len, max_len = field.get('minLength'), field.get('maxLength')
+    pattern = re.compile(field['pattern']) if field.get('pattern') else None
+
+    def text(value):
+        value = str(_scalar(value))
+        if kind == 'email' and not EMAIL.match(value.strip()):
+            raise ValueError('must be an email address')
+        if min_len is not None and len(value) < min_len or max_len is not None and len(value) > max_len:
+            raise ValueError(f'must be {min_len or 0} to {max_len or "any"} characters')
+        if pattern is not None and not pattern.fullmatch(value):
+            raise ValueError('has an invalid format')
+        return value
+    return text
+
+
+class CompiledForm:
+    def __init__(self, schema):
+        self.id = schema.get('id')
+        self.schema = schema
+        self.fields = {}
+        for f in schema.get('fields') or []:
+            if isinstance(f, dict) and f.get('name'):
+                self.fields[f['name']] = (_compile_field(f), bool(f.get('required')), f.get('type') or 'text')
+
+    def apply(self, body, clean, errors, skip=()):
+        """Coerce the fields of ``body`` this form defines into ``clean``; messages go to ``errors``."""
+        for name, (check, _, kind) in self.fields.items():
+            if name in skip or name not in body:
+                continue
+            value = body[name]
+            if _empty(value) or (kind == 'checkbox' and value == '[]'):
+                clean[name] = [] if kind == 'checkbox' else ''
+                continue
+            try:
+                clean[name] = check(value)
+            except ValueError as e:
+                errors[name] = str(e)
+
+    def missing(self, body):
+        return [name for name, (_, required, kind) in self.fields.items()
+                if required and (_empty(body.get(name)) or (kind == 'checkbox' and body.get(name) == '[]'))]
+
+
+class FormSet:
+    """One compiled snapshot of the schema directory."""
+
+    def __init__(self, forms, extra=()):
+        self.forms = {f.id: f for f in forms}
+        self.extra = list(extra)
+        self.main = self.forms.get(MAIN_FORM)
+        self.subforms = {}
+        main_fields = self.main.schema.get('fields', []) if self.main else []
+        types = next((f.get('options') or [] for f in main_fields if f.get('name') == 'request_type'), [])
+        services = next((f.get('options') or [] for f in main_fields if f.get('name') == 'services_needed'), [])
+        for t in types:
+            for s in services:
+                if form_id(t, s) in self.forms:
+                    self.subforms.setdefault(t, {})[s] = form_id(t, s)
+        content = {'main': MAIN_FORM if self.main else None, 'subforms': self.subforms,
+                   'forms': {k: f.schema for k, f in sorted(self.forms.items())}}
+        canonical = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        self.version = hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+        self.bundle = json.dumps({'version': self.version, **content}, ensure_ascii=False).encode('utf-8')
+
+    def subform(self, body):
+        if not self.subforms:
+            return None
+        t, s = body.get('request_type'), body.get('services_needed')
+        if _empty(t) or _empty(s) or isinstance(t, list) or isinstance(s, list):
+            return None
+        return self.forms.get(form_id(t, s))
+
+    def validate(self, body, partial=False, allow_unknown=True):
+        """``body`` with its known fields coerced; raises FormError. ``partial`` skips required checks."""
+        if self.main is None:
+            return dict(body)
+        clean, errors = dict(body), {}
+        self.main.apply(body, clean, errors)
+        sub = self.subform(clean)
+        known = set(self.main.fields)
+        if sub is not None:
+            sub.apply(body, clean, errors, skip=known)
+            known |= set(sub.fields)
+        for form in self.extra:
+            # only fields the forms above do not define
+            form.apply(body, clean, errors, skip=known)
+            known |= set(form.fields)
+        if not allow_unknown:
+            for name in body:
+                if name not in known:
+                    errors[name] = 'is not a field of this form'
+        if not partial:
+            for name in self.missing(clean):
+                errors.setdefault(name, 'is required')
+        if errors:
+            raise FormError(errors)
+        return clean
+
+    def missing(self, body):
+        """Required fields of the main form and the body's subform that ``body`` leaves empty."""
+        if self.main is None:
+            return []
+        sub = self.subform(body)
+        return self.main.missing(body) + (sub.missing(body) if sub is not None else [])
+
+
+class FormRegistry:
+    def __init__(self, directory, extra_paths=(), check_interval=1.0):
+        self.directory = directory
+        self.extra_paths = list(extra_paths)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = 0.0
+        self._forms = None
+        self.errors = {}
+
+    def _current_stamp(self):
+        stamp = []
+        try:
+            names = sorted(f for f in os.listdir(self.directory) if f.endswith('.json'))
+        except OSError:
+            names = []
+        for path in [os.path.join(self.directory, n) for n in names] + self.extra_paths:
+            try:
+                st = os.stat(path)
+                stamp.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+        return tuple(stamp)
+
+    def get(self):
+        """The compiled FormSet, recompiled when a schema file changed (checked every ``check_interval`` s)."""
+        now = time.monotonic()
+        if self._forms is not None and now - self._checked < self.check_interval:
+            return self._forms
+        with self._lock:
+            self._checked = now
+            stamp = self._current_stamp()
+            if self._forms is None or stamp != self._stamp:
+                self._forms = self._compile(stamp)
+                self._stamp = stamp
+            return self._forms
+
+    def _compile(self, stamp):
+        forms, extra, errors = [], [], {}
+        for path, _, _ in stamp:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    schema = json.load(f)
+                if not isinstance(schema, dict):
+                    raise ValueError('expected a JSON object')
+                if path in self.extra_paths:
+                    extra.append(CompiledForm(schema))
+                else:
+                    # the id is the file name, which is also how the UI looks subforms up
+                    schema['id'] = os.path.splitext(os.path.basename(path))[0]
+                    forms.append(CompiledForm(schema))
+            except (OSError, ValueError, re.error) as e:
+                errors[os.path.basename(path)] = str(e)
+                print('Form schema skipped:', path, str(e))
+        compiled = FormSet(forms, extra)
+        self.errors = errors
+        print(f'Compiled {len(compiled.forms)} form schemas (version {compiled.version})')
+        return compiled
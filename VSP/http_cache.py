@@ -0,0 +1,189 @@
+"""Conditional GETs and precompressed variants for files served by the app.
+
+``AssetDir`` serves the files of one directory. Each file's strong ETag
+(SHA-256 of its bytes) and its gzip/brotli variants are computed once and
+recomputed only when the file's mtime/size change. Responses carry ETag and
+Last-Modified, answer If-None-Match / If-Modified-Since with 304, and pick
+the smallest encoding the client accepts. A request whose ``v`` query
+parameter matches the current ETag (see ``versioned_url``) is cacheable
+forever, since any change to the file changes the URL.
+"""
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.responses import Response, FileResponse
+
+try:
+    import brotli
+except Exception:
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+COMPRESSIBLE = {'.js', '.css', '.json', '.html', '.txt', '.svg', '.csv', '.md'}
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # compare opaque tags; a weak client copy (W/"..") of our tag still matches for GET
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return etag in tags or f'W/{etag}' in tags
+
+
+def not_modified(request, etag, mtime=None):
+    """True when the request's validators say the client copy is current."""
+    inm = request.headers.get('if-none-match')
+    if inm is not None:
+        return etag_matches(inm, etag)
+    ims = request.headers.get('if-modified-since')
+    if ims and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get('accept-encoding', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def cached_bytes_response(request, content, etag, media_type, cache_control=REVALIDATE, mtime=None, variants=None):
+    """200/304 for in-memory content with optional {'br': bytes, 'gzip': bytes} variants."""
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if mtime is not None:
+        headers['Last-Modified'] = formatdate(mtime, usegmt=True)
+    if not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+    accepted = accepted_encodings(request)
+    for encoding in ('br', 'gzip'):
+        body = (variants or {}).get(encoding)
+        if body is not None and encoding in accepted:
+            headers['Content-Encoding'] = encoding
+            return Response(body, media_type=media_type, headers=headers)
+    return Response(content, media_type=media_type, headers=headers)
+
+
+def compressed_variants(content, path=''):
+    """gzip/brotli encodings of ``content`` that are actually smaller."""
+    variants = {}
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE or len(content) < 256:
+        return variants
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        variants['gzip'] = gz
+    if brotli is not None:
+        br = brotli.compress(content, quality=11)
+        if len(br) < len(content):
+            variants['br'] = br
+    return variants
+
+
+class _Asset:
+    __slots__ = ('stamp', 'mtime', 'content', 'etag', 'variants')
+
+    def __init__(self, path, st):
+        with open(path, 'rb') as f:
+            self.content = f.read()
+        self.stamp = (st.st_mtime_ns, st.st_size)
+        self.mtime = st.st_mtime
+        self.etag = '"' + hashlib.sha256(self.content).hexdigest()[:32] + '"'
+        self.variants = compressed_variants(self.content, path)
+
+
+def version_token(etag):
+    """The ``?v=`` value ``versioned_url`` puts on an asset's URL."""
+    return etag.strip('"')[:12]
+
+
+class AssetDir:
+    """Cached, validated, precompressed serving of the files in one directory."""
+
+    def __init__(self, directory, max_bytes=4 * 1024 * 1024):
+        self.directory = os.path.realpath(directory)
+        self.max_bytes = max_bytes
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, relpath):
+        path = os.path.realpath(os.path.join(self.directory, relpath))
+        if not path.startswith(self.directory + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def asset(self, relpath):
+        """The cached entry for ``relpath`` (refreshed if the file changed), or None."""
+        path = self.resolve(relpath)
+        if path is None:
+            return None
+        st = os.stat(path)
+        if st.st_size > self.max_bytes:
+            return None
+        cur = self._assets.get(path)
+        if cur is None or cur.stamp != (st.st_mtime_ns, st.st_size):
+            cur = _Asset(path, st)
+            with self._lock:
+                self._assets[path] = cur
+        return cur
+
+    def warm(self):
+        """Precompute ETags and compressed variants for every file up front."""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                self.asset(os.path.relpath(os.path.join(root, name), self.directory))
+
+    def etag(self, relpath):
+        a = self.asset(relpath)
+        return a.etag if a else None
+
+    def versioned_url(self, prefix, relpath):
+        tag = self.etag(relpath)
+        url = f'{prefix}/{relpath}'
+        return f'{url}?v={version_token(tag)}' if tag else url
+
+    def response(self, request, relpath, cache_control=REVALIDATE, media_type=None, filename=None):
+        """Serve ``relpath`` (None if it does not exist)."""
+        path = self.resolve(relpath)
+        if path is None:
+            return None
+        media_type = media_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        a = self.asset(relpath)
+        if a is None:
+            # too large to keep in memory: stream it, validated by stat
+            st = os.stat(path)
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            headers = {'ETag': etag, 'Cache-Control': cache_control, 'Last-Modified': formatdate(st.st_mtime, usegmt=True)}
+            if not_modified(request, etag, st.st_mtime):
+                return Response(status_code=304, headers=headers)
+            return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
+        v = request.query_params.get('v')
+        # only the exact current token is immutable; any other v revalidates
+        if v == version_token(a.etag):
+            cache_control = IMMUTABLE
+        response = cached_bytes_response(request, a.content, a.etag, media_type, cache_control, a.mtime, a.variants)
+        if filename and response.status_code == 200:
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+def immutable_file_response(request, path, etag, media_type=None, filename=None):
+    """Content-addressed files never change: validate by hash and cache forever."""
+    etag = f'"{etag}"'
+    headers = {'ETag': etag, 'Cache-Control': IMMUTABLE}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
@@ -0,0 +1,211 @@
+"""Local background job queue.
+
+``JobQueue.submit(kind, params)`` records a job and returns it right away;
+``workers`` asyncio tasks take jobs in order and run ``handlers[kind](job)``.
+Handlers push blocking work (rendering, compression) through
+``run_blocking``, which uses a process pool when ``processes`` > 0 and a
+thread otherwise, and report progress with ``job.progress``.
+
+Each job's state is kept in ``<directory>/<id>.json``, rewritten atomically
+at most every ``save_interval`` seconds while it runs, so a poll answered by
+another worker process sees it too. A job left queued or running by a
+process that no longer exists is reported as failed. Finished jobs are
+removed after ``keep_seconds``.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+ACTIVE = ('queued', 'running')
+
+
+def now_iso():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+
+
+class Job:
+    def __init__(self, queue, kind, params):
+        self.queue = queue
+        self.id = f"JOB-{int(time.time() * 1000)}-{os.urandom(3).hex()}"
+        self.kind = kind
+        self.params = params
+        self.state = 'queued'
+        self.stage = None
+        self.total = 0
+        self.done = 0
+        self.errors = []
+        self.result = {}
+        self.created_at = now_iso()
+        self.started_at = None
+        self.finished_at = None
+        self._saved = 0.0
+        self._lock = threading.Lock()
+
+    def to_dict(self):
+        return {'id': self.id, 'kind': self.kind, 'state': self.state, 'stage': self.stage,
+                'total': self.total, 'done': self.done, 'errors': self.errors[:100], 'error_count': len(self.errors),
+                'result': self.result, 'params': self.params, 'pid': os.getpid(),
+                'created_at': self.created_at, 'started_at': self.started_at, 'finished_at': self.finished_at}
+
+    def progress(self, done=None, total=None, stage=None, advance=0):
+        """Update the counters (safe from a worker thread); saved at most every save_interval."""
+        with self._lock:
+            if total is not None:
+                self.total = total
+            if stage is not None:
+                self.stage = stage
+            if done is not None:
+                self.done = done
+            self.done += advance
+        self.save(force=stage is not None)
+
+    def save(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._saved < self.queue.save_interval:
+            return
+        self._saved = now
+        with self._lock:
+            data = json.dumps(self.to_dict(), default=str)
+        path = self.queue.path(self.id)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+class JobQueue:
+    def __init__(self, directory, handlers, workers=2, processes=0, keep_seconds=24 * 3600, save_interval=0.5):
+        self.directory = directory
+        self.handlers = handlers
+        self.workers = workers
+        self.processes = processes
+        self.keep_seconds = keep_seconds
+        self.save_interval = save_interval
+        self.jobs = {}
+        self.counters = {'submitted': 0, 'succeeded': 0, 'failed': 0}
+        self.pool = None
+        self._queue = None
+        self._tasks = []
+        self._swept = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    # --- lifecycle ---
+
+    async def start(self):
+        self._sweep()
+        self._queue = asyncio.Queue()
+        if self.processes > 0 and self.pool is None:
+            # spawned, not forked: the server process holds threads and sqlite connections
+            self.pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('spawn'))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    # --- jobs ---
+
+    def submit(self, kind, params):
+        if kind not in self.handlers:
+            raise ValueError(f'unknown job type {kind!r}; expected one of {", ".join(sorted(self.handlers))}')
+        if self._queue is None:
+            raise RuntimeError('job queue is not running')
+        if time.time() - self._swept > 3600:
+            self._sweep()
+        job = Job(self, kind, params)
+        self.jobs[job.id] = job
+        self.counters['submitted'] += 1
+        job.save(force=True)
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id):
+        """A job's state (from this process or the state file another one wrote), or None."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if os.path.basename(job_id) != job_id:
+            return None
+        try:
+            with open(self.path(job_id), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('state') in ACTIVE and not _pid_alive(data.get('pid') or 0):
+            data.update(state='failed', errors=data.get('errors', []) + ['interrupted: the worker running it exited'])
+        return data
+
+    def pending(self):
+        return sum(1 for j in self.jobs.values() if j.state in ACTIVE)
+
+    async def run_blocking(self, fn, *args):
+        """Run ``fn(*args)`` in the process pool (if any) or a thread."""
+        if self.pool is not None:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.state, job.started_at = 'running', now_iso()
+            job.save(force=True)
+            try:
+                await self.handlers[job.kind](job)
+                job.state = 'succeeded'
+                self.counters['succeeded'] += 1
+            except asyncio.CancelledError:
+                job.state = 'failed'
+                job.errors.append('cancelled: the server shut down')
+                self.counters['failed'] += 1
+                job.finished_at = now_iso()
+                job.save(force=True)
+                raise
+            except Exception as e:
+                print(f'Job {job.id} failed:', str(e))
+                job.state = 'failed'
+                job.errors.append(str(e))
+                self.counters['failed'] += 1
+            job.finished_at = now_iso()
+            job.save(force=True)
+            # the state file answers polls from now on
+            self.jobs.pop(job.id, None)
+
+    def _sweep(self):
+        """Remove state files of jobs finished more than keep_seconds ago."""
+        now = self._swept = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime < self.keep_seconds:
+                    continue
+                if name.endswith('.json'):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if data.get('state') in ACTIVE and _pid_alive(data.get('pid') or 0):
+                        continue
+                os.unlink(path)
+            except (OSError, ValueError):
+                pass
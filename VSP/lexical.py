@@ -0,0 +1,128 @@
+"""BM25 lexical retrieval over vendor profiles and rank fusion helpers.
+
+Each vendor document is its name, services, countries, certifications and
+description. The inverted index stores, per term, the vendor ids and the
+precomputed BM25 term weight (tf and length normalization folded in), so a
+query is one ``scores[ids] += idf * weight`` per query term. Document
+frequencies are kept per term and idf is computed at query time, so
+documents can be added or removed without rebuilding the index.
+"""
+import re
+import copy
+
+import numpy as np
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def vendor_document(v):
+    fields = [v.get('name') or '']
+    for key in ('services', 'countries', 'certifications'):
+        fields.extend(v.get(key) or [])
+    fields.append(v.get('description') or '')
+    return ' '.join(map(str, fields))
+
+
+class BM25Index:
+    """``documents`` may hold None for deleted slots; they get no postings and are not counted."""
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        docs = [tokenize(d) if d is not None else None for d in documents]
+        self.size = len(docs)
+        lengths = [len(d) for d in docs if d is not None]
+        self.n = len(lengths)
+        self.avgdl = float(np.mean(lengths)) if lengths else 0.0
+        doc_len = np.asarray([len(d) if d is not None else 0 for d in docs], dtype=np.float32)
+        postings = {}
+        for i, toks in enumerate(docs):
+            for t, tf in self._counts(toks or ()).items():
+                postings.setdefault(t, ([], []))
+                postings[t][0].append(i)
+                postings[t][1].append(tf)
+        self.postings = {}
+        for t, (ids, tfs) in postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            self.postings[t] = (ids, self._weight(np.asarray(tfs, dtype=np.float32), doc_len[ids]).astype(np.float32))
+        self.df = {t: len(ids) for t, (ids, _) in postings.items()}
+
+    @staticmethod
+    def _counts(toks):
+        counts = {}
+        for t in toks:
+            counts[t] = counts.get(t, 0) + 1
+        return counts
+
+    def _weight(self, tf, length):
+        # tf saturation and length normalization; idf is applied at query time
+        norm = self.k1 * (1 - self.b + self.b * length / self.avgdl) if self.avgdl else self.k1
+        return tf * (self.k1 + 1) / (tf + norm)
+
+    def with_changes(self, size, added=(), removed=()):
+        """A copy with documents ``added`` [(slot, text)] and ``removed`` [text] applied.
+
+        Removed documents keep their postings (callers mask their slots out) but
+        no longer count towards idf; new documents are normalized by the
+        original average length until the index is rebuilt.
+        """
+        new = copy.copy(self)
+        new.size = size
+        new.df = dict(self.df)
+        for text in removed:
+            new.n -= 1
+            for t in set(tokenize(text)):
+                new.df[t] = new.df.get(t, 1) - 1
+        grouped = {}
+        for slot, text in added:
+            toks = tokenize(text)
+            new.n += 1
+            for t, tf in self._counts(toks).items():
+                grouped.setdefault(t, ([], []))
+                grouped[t][0].append(slot)
+                grouped[t][1].append(float(self._weight(tf, len(toks))))
+                new.df[t] = new.df.get(t, 0) + 1
+        if grouped:
+            new.postings = dict(self.postings)
+            for t, (ids, w) in grouped.items():
+                ids, w = np.asarray(ids, dtype=np.int32), np.asarray(w, dtype=np.float32)
+                old = self.postings.get(t)
+                new.postings[t] = (np.concatenate([old[0], ids]), np.concatenate([old[1], w])) if old else (ids, w)
+        return new
+
+    def scores(self, query):
+        """Dense BM25 scores for every document."""
+        out = np.zeros(self.size, dtype=np.float32)
+        for t in set(tokenize(query)):
+            hit = self.postings.get(t)
+            if hit is not None:
+                df = self.df[t]
+                idf = np.log(1 + (self.n - df + 0.5) / (df + 0.5))
+                out[hit[0]] += (idf * hit[1]).astype(np.float32)
+        return out
+
+
+def top_ids(scores, ids, k):
+    """The k best of ``ids`` by ``scores`` (stable for ties), best first."""
+    if ids.size == 0 or k <= 0:
+        return ids[:0]
+    sub = scores[ids]
+    if k < ids.size:
+        part = np.argpartition(-sub, k - 1)[:k]
+        # keep catalog order among ties, like a stable sort would
+        part = np.sort(part)
+    else:
+        part = np.arange(ids.size)
+    return ids[part[np.argsort(-sub[part], kind='stable')]]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse several best-first id lists; returns {id: score} (higher is better)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (k + rank + 1)
+    return fused
@@ -0,0 +1,303 @@
+"""In-process metrics for the selection pipeline, exposed in Prometheus text format.
+
+``stage(name)`` times a block into the ``vsp_stage_seconds`` histogram and
+into the current request's timings, which the middleware turns into a
+``Server-Timing`` header. Counters cover rerank outcomes and upstream errors;
+callback collectors export values owned elsewhere (e.g. cache hit counters)
+at scrape time. ``SlowRequestProfiler`` samples thread stacks while requests
+run and writes collapsed stacks (flamegraph input) for the slow ones.
+"""
+import os
+import sys
+import time
+import bisect
+import threading
+import contextvars
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_timings = contextvars.ContextVar('vsp_timings', default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for n, v in zip(names, values):
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{n}="{v}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, v in sorted(self.values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, key)} {v}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # key -> [per-bucket counts (+Inf last), sum]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            cur = self.values.get(key)
+            if cur is None:
+                cur = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            cur[0][i] += 1
+            cur[1] += value
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + ('+Inf',), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{_labels(self.label_names + ("le",), key + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Collector(Metric):
+    """A metric whose samples are read from a callback at scrape time."""
+
+    def __init__(self, name, help_text, kind, labels, fn):
+        super().__init__(name, help_text, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self):
+        lines = self.header()
+        try:
+            samples = list(self.fn())
+        except Exception as e:
+            print('Metrics collector failed:', self.name, str(e))
+            samples = []
+        for key, v in samples:
+            lines.append(f'{self.name}{_labels(self.label_names, key)} {v}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, name, help_text, kind, labels, fn):
+        return self.add(Collector(name, help_text, kind, labels, fn))
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+STAGE_SECONDS = registry.histogram('vsp_stage_seconds', 'Time spent in each selection pipeline stage.', ('stage',))
+HTTP_SECONDS = registry.histogram('vsp_http_request_seconds', 'HTTP request latency (until the response starts).', ('method', 'route', 'status'))
+RERANKS = registry.counter('vsp_rerank_total', 'Final rankings by source (llm, llm_cached or local fallback).', ('method',))
+RERANK_FALLBACKS = registry.counter('vsp_rerank_fallbacks_total', 'Local rankings served instead of the LLM, by reason.', ('reason',))
+UPSTREAM_ERRORS = registry.counter('vsp_upstream_errors_total', 'Failed calls to upstream services.', ('upstream',))
+AUDIT_FLUSH_SECONDS = registry.histogram('vsp_audit_flush_seconds', 'Background audit group-commit (write + fsync) latency.')
+SLOW_PROFILES = registry.counter('vsp_slow_request_profiles_total', 'Slow requests whose stack samples were written.')
+
+
+# --- per-request timings ---
+
+def begin_request():
+    """Start collecting stage timings for the current request; returns the list."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def stage(name):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t
+        STAGE_SECONDS.observe(dt, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, dt))
+
+
+def server_timing(timings):
+    """Server-Timing header value; repeated stages (batch items) are summed."""
+    totals, order = {}, []
+    for name, dt in list(timings):
+        if name not in totals:
+            order.append(name)
+            totals[name] = 0.0
+        totals[name] += dt
+    return ', '.join(f'{n};dur={totals[n] * 1000:.2f}' for n in order)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request latency histogram, Server-Timing, optional profiling."""
+
+    def __init__(self, app, profiler=None):
+        self.app = app
+        self.profiler = profiler
+        self._routes = {}
+
+    def _route(self, scope):
+        # label by route template, not raw path, to keep label cardinality bounded
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'unmatched'
+        if endpoint not in self._routes:
+            paths = [r.path for r in getattr(scope.get('app'), 'routes', []) if getattr(r, 'endpoint', None) is endpoint]
+            self._routes[endpoint] = paths[0] if paths else getattr(endpoint, '__name__', 'unknown')
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        timings = begin_request()
+        sid = self.profiler.start() if self.profiler else None
+        t = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                if timings:
+                    message['headers'] = list(message.get('headers', [])) + [(b'server-timing', server_timing(timings).encode('latin-1'))]
+                HTTP_SECONDS.observe(time.perf_counter() - t, method=scope['method'], route=self._route(scope), status=message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if sid is not None:
+                self.profiler.stop(sid, time.perf_counter() - t, f"{scope['method']} {scope['path']}")
+
+
+# --- slow request profiler ---
+
+class SlowRequestProfiler:
+    """Samples every thread's stack while requests are in flight.
+
+    One background thread takes a sample every ``interval`` seconds and adds
+    it to each in-flight session. When a request finishes above
+    ``threshold`` seconds its samples are written as collapsed stacks
+    (``thread;frame;frame count`` lines) to ``directory``. The selection
+    pipeline shares the event loop and threadpool with other requests, so
+    concurrent work shows up in the samples too.
+    """
+
+    def __init__(self, threshold, directory, interval=0.005, max_files=200):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self.max_files = max_files
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._next_id = 0
+
+    def start(self):
+        with self._lock:
+            self._next_id += 1
+            sid = self._next_id
+            self._sessions[sid] = _Tally()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='vsp-profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return sid
+
+    def stop(self, sid, duration, label):
+        with self._lock:
+            samples = self._sessions.pop(sid, None)
+        if samples and duration >= self.threshold:
+            self._write(samples, duration, label)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._sessions.values())
+            if not active:
+                self._wake.clear()
+                self._wake.wait(1.0)
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join([names.get(ident, str(ident))] + parts[::-1]))
+            with self._lock:
+                for tally in self._sessions.values():
+                    tally.update(stacks)
+            time.sleep(self.interval)
+
+    def _write(self, samples, duration, label):
+        os.makedirs(self.directory, exist_ok=True)
+        files = sorted(f for f in os.listdir(self.directory) if f.endswith('.folded'))
+        for old in files[:max(0, len(files) - self.max_files + 1)]:
+            os.unlink(os.path.join(self.directory, old))
+        safe = ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:60]
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{int(duration * 1000)}ms-{safe}.folded"
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        SLOW_PROFILES.inc()
+        print(f'Slow request ({duration * 1000:.0f} ms) profile written to {name}')
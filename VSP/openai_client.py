@@ -0,0 +1,64 @@
+"""The application-scoped async OpenAI client.
+
+One ``AsyncOpenAI`` instance, with one httpx connection pool, is
+shared by every embedding and chat call in the process. Calls are awaited
+on the event loop rather than parked on executor threads. The server opens
+it during startup warm-up and closes it on shutdown; scripts get it lazily.
+The SDK (and httpx) are only imported when the client is first created, which
+keeps roughly 0.4 s of imports off worker start-up.
+
+Environment:
+  OPENAI_API_KEY / OPENAI_BASE_URL   credentials and endpoint (e.g. scripts/stub_openai.py)
+  VSP_OPENAI_MAX_CONNECTIONS         pool size (default 100)
+  VSP_OPENAI_MAX_KEEPALIVE           idle keep-alive connections kept (default 20)
+  VSP_OPENAI_TIMEOUT_S               default per-request timeout (default 60)
+  VSP_OPENAI_MAX_RETRIES             SDK retries with backoff on 429/5xx/connection errors (default 2)
+"""
+import os
+import importlib.util
+
+_client = None
+_sdk_installed = None
+
+
+def client_available():
+    global _sdk_installed
+    if not os.getenv('OPENAI_API_KEY'):
+        return False
+    if _sdk_installed is None:
+        _sdk_installed = importlib.util.find_spec('openai') is not None
+    return _sdk_installed
+
+
+def create_client():
+    import httpx
+    import openai
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv('VSP_OPENAI_MAX_CONNECTIONS', '100')),
+        max_keepalive_connections=int(os.getenv('VSP_OPENAI_MAX_KEEPALIVE', '20')),
+        keepalive_expiry=30.0,
+    )
+    timeout = httpx.Timeout(float(os.getenv('VSP_OPENAI_TIMEOUT_S', '60')), connect=5.0)
+    return openai.AsyncOpenAI(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        base_url=os.getenv('OPENAI_BASE_URL') or None,
+        max_retries=int(os.getenv('VSP_OPENAI_MAX_RETRIES', '2')),
+        timeout=timeout,
+        http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+
+
+def get_client():
+    """The shared client (created on first use); None without an API key or the openai package."""
+    global _client
+    if _client is None and client_available():
+        _client = create_client()
+    return _client
+
+
+async def close_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
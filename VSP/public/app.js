@@ -1,15 +1,33 @@
-async function fetchJSON(url, noCache = true) {
-  // By default add a cache-busting timestamp and instruct fetch to ignore caches
-  if (noCache) {
-    const sep = url.includes('?') ? '&' : '?';
-    url = `${url}${sep}_=${Date.now()}`;
-  }
-  const r = await fetch(url, { cache: 'no-store' });
+async function fetchJSON(url) {
+  // 'no-cache' revalidates with the server on every call: unchanged schemas and
+  // assets come back as an empty 304 instead of being downloaded again
+  const r = await fetch(url, { cache: 'no-cache' });
   return r.json();
 }
 
+// every form schema in one versioned response (null when the server has no bundle)
+let schemaBundle = null;
+
+async function loadBundle() {
+  try {
+    const r = await fetch('/api/schemas/bundle', { cache: 'no-cache' });
+    schemaBundle = r.ok ? await r.json() : null;
+  } catch (e) {
+    schemaBundle = null;
+  }
+  return schemaBundle;
+}
+
+function bundledSchema(filePath) {
+  const id = String(filePath).split('/').pop().replace(/\.json$/, '');
+  return schemaBundle && schemaBundle.forms[id] ? schemaBundle.forms[id] : null;
+}
+
 async function loadSchemas() {
-  const schemas = await fetchJSON('/api/schemas');
+  const bundle = await loadBundle();
+  const schemas = bundle
+    ? Object.keys(bundle.forms).sort().map(id => ({ id, file: `/formSchemas/${id}.json` }))
+    : await fetchJSON('/api/schemas');
   const container = document.getElementById('schemas');
   container.innerHTML = '';
   if (!schemas.length) {
@@ -51,7 +69,7 @@ async function loadSchemas() {
 // refresh handler added to UI (refresh button will be wired in init)
 
 async function loadSchema(filePath) {
-  const schema = await fetchJSON(filePath);
+  const schema = bundledSchema(filePath) || await fetchJSON(filePath);
   document.getElementById('form-area').hidden = false;
   document.getElementById('form-title').innerText = schema.title || 'Form';
   document.getElementById('form-desc').innerText = schema.description || '';
@@ -147,6 +165,7 @@ async function loadSchema(filePath) {
       fd.append('status', 'rfp');
       const resp = await fetch('/api/requests', { method: 'POST', body: fd });
       const json = await resp.json();
+      if (!resp.ok) { showFormErrors(json); return; }
       showToast('Request saved, generating RFP…', 2000);
       document.getElementById('result-area').hidden = false;
       document.getElementById('result').innerText = JSON.stringify(json, null, 2);
@@ -223,6 +242,7 @@ async function loadSchema(filePath) {
     }
     const resp = await fetch('/api/requests', { method: 'POST', body: fd });
     const json = await resp.json();
+    if (!resp.ok) { showFormErrors(json); return; }
     showToast('Request submitted ✓', 3000);
     document.getElementById('result-area').hidden = false;
     document.getElementById('result').innerText = JSON.stringify(json, null, 2);
@@ -253,30 +273,19 @@ async function loadSchema(filePath) {
         }
       });
     }
-    // Call the vendor selection endpoint
+    // Call the vendor selection endpoint (streamed: the retrieval shortlist shows first,
+    // then the LLM ranking replaces it as it arrives)
     try {
-      const vresp = await fetch('/api/select_vendors', {
+      const vresp = await fetch('/api/select_vendors?stream=1', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
         body: JSON.stringify(reqObj)
       });
-      const vjson = await vresp.json();
-      if (vjson && vjson.vendors) {
-        // display in the dedicated vendor recommendations area
-        const varea = document.getElementById('vendor-recs-area');
-        const listNode = document.getElementById('vendor-recs');
-        if (vjson.vendors.length) {
-          varea.hidden = false;
-          listNode.innerHTML = '';
-          vjson.vendors.forEach((v, i) => {
-            const entry = document.createElement('div'); entry.className = 'small';
-            const title = document.createElement('div'); title.innerHTML = `<strong>${i+1}. ${v.name || v}</strong> ${v.score ? `<span class='muted'>(${v.score})</span>` : ''}`;
-            const reason = document.createElement('div'); reason.className = 'muted'; reason.style.marginTop='6px'; reason.innerText = v.reason || '';
-            entry.appendChild(title); entry.appendChild(reason);
-            listNode.appendChild(entry);
-          });
-        }
-      }
+      await readNdjson(vresp, evt => {
+        if (!evt || !evt.vendors) return;
+        const note = evt.event === 'retrieval' ? 'Preliminary matches — ranking…' : (evt.partial ? 'Ranking…' : '');
+        renderVendorRecs(evt.vendors, note);
+      });
     } catch (e) {
       // ignore errors for now
     }
@@ -339,6 +348,48 @@ async function loadSchema(filePath) {
   }
 }
 
+// read a newline-delimited JSON response, calling onEvent for each line as it arrives
+async function readNdjson(resp, onEvent) {
+  if (!resp.body || !resp.body.getReader) {
+    (await resp.text()).split('\n').filter(Boolean).forEach(l => onEvent(JSON.parse(l)));
+    return;
+  }
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buf.indexOf('\n')) >= 0) {
+      const line = buf.slice(0, nl); buf = buf.slice(nl + 1);
+      if (line.trim()) onEvent(JSON.parse(line));
+    }
+  }
+  if (buf.trim()) onEvent(JSON.parse(buf));
+}
+
+function renderVendorRecs(vendors, note) {
+  // display in the dedicated vendor recommendations area
+  const varea = document.getElementById('vendor-recs-area');
+  const listNode = document.getElementById('vendor-recs');
+  if (!vendors.length) return;
+  varea.hidden = false;
+  listNode.innerHTML = '';
+  if (note) {
+    const status = document.createElement('div'); status.className = 'muted small'; status.innerText = note;
+    listNode.appendChild(status);
+  }
+  vendors.forEach((v, i) => {
+    const entry = document.createElement('div'); entry.className = 'small';
+    const title = document.createElement('div'); title.innerHTML = `<strong>${i+1}. ${v.name || v}</strong> ${v.score ? `<span class='muted'>(${v.score})</span>` : ''}`;
+    const reason = document.createElement('div'); reason.className = 'muted'; reason.style.marginTop='6px'; reason.innerText = v.reason || '';
+    entry.appendChild(title); entry.appendChild(reason);
+    listNode.appendChild(entry);
+  });
+}
+
 // keep currently loaded subform schema in memory
 let currentSubformSchema = null;
 
@@ -358,7 +409,9 @@ async function loadSubformIfReady(requestType, serviceNeeded) {
 
   const file = `/formSchemas/${sanitizeForFilename(requestType)}_${sanitizeForFilename(serviceNeeded)}.json`;
   try {
-    const schema = await fetchJSON(file);
+    // with the bundle a missing combination needs no request either
+    const schema = schemaBundle ? bundledSchema(file) : await fetchJSON(file);
+    if (!schema) throw new Error('no subform');
     // render into subform-fields area
     currentSubformSchema = schema;
     const area = document.getElementById('subform-area');
@@ -393,20 +446,32 @@ async function loadSubformIfReady(requestType, serviceNeeded) {
   }
 }
 
-async function loadRequests() {
-  const list = await fetchJSON('/api/requests');
+// list views only need a summary; the full entry is fetched when loaded into the form
+const REQUEST_LIST_FIELDS = 'id,createdAt,status,body.projectName,files';
+let requestsCursor = null;
+
+async function loadRequests(more = false) {
   const node = document.getElementById('requests-list');
-  if (!list.length) { node.innerText = '(no requests yet)'; return; }
-  node.innerHTML = '';
-  list.slice().reverse().forEach(r => {
+  const q = (document.getElementById('requests-search') || {}).value || '';
+  let url = `/api/requests?limit=25&fields=${REQUEST_LIST_FIELDS}`;
+  if (q) url += `&q=${encodeURIComponent(q)}`;
+  if (more && requestsCursor) url += `&cursor=${encodeURIComponent(requestsCursor)}`;
+  const page = await fetchJSON(url);
+  // the Node server still returns the whole array, oldest first
+  const list = Array.isArray(page) ? page.slice().reverse() : page.items;
+  requestsCursor = Array.isArray(page) ? null : page.next_cursor;
+  if (!more) node.innerHTML = '';
+  const oldMore = document.getElementById('requests-more'); if (oldMore) oldMore.remove();
+  if (!more && !list.length) { node.innerText = q ? '(no matching requests)' : '(no requests yet)'; return; }
+  list.forEach(r => {
     const div = document.createElement('div'); div.className = 'small';
     const title = r.body && r.body.projectName ? r.body.projectName : r.id;
-    div.innerHTML = `<strong>${title}</strong> <span class='muted'>(${r.id} — ${new Date(r.createdAt).toLocaleString()})</span>`;
+    div.innerHTML = `<strong>${title}</strong> <span class='muted'>(${r.id} — ${new Date(r.createdAt).toLocaleString()}${r.status ? ' — ' + r.status : ''})</span>`;
 
     // actions: load into form & download files
     const actions = document.createElement('div'); actions.className='request-actions';
     const loadBtn = document.createElement('button'); loadBtn.innerText = 'Load into form';
-    loadBtn.onclick = () => loadRequestIntoForm(r);
+    loadBtn.onclick = async () => loadRequestIntoForm(Array.isArray(page) ? r : await fetchJSON(`/api/requests/${encodeURIComponent(r.id)}`));
     actions.appendChild(loadBtn);
 
     if (r.files && r.files.length) {
@@ -415,11 +480,19 @@ async function loadRequests() {
       actions.appendChild(filesBlock);
     }
     div.appendChild(actions);
-
-    const meta = document.createElement('pre'); meta.innerText = JSON.stringify(r, null, 2);
-    div.appendChild(meta);
     node.appendChild(div);
   });
+  if (requestsCursor) {
+    const moreBtn = document.createElement('button'); moreBtn.id = 'requests-more'; moreBtn.type = 'button'; moreBtn.innerText = 'Load more';
+    moreBtn.onclick = () => loadRequests(true);
+    node.appendChild(moreBtn);
+  }
+}
+
+// the server checks submissions against the form schemas; show what it rejected
+function showFormErrors(json) {
+  const fields = json && json.fields ? Object.entries(json.fields).map(([k, v]) => `${k} ${v}`).join('; ') : '';
+  showToast(fields || (json && json.error) || 'Request rejected', 4000);
 }
 
 function showToast(msg, timeout = 2500) {
@@ -0,0 +1,334 @@
+"""SQLite-backed repository for submitted requests.
+
+Requests used to live in a single ``data/requests.json`` array that was parsed
+and rewritten on every submit. This store keeps one row per request in a WAL
+mode SQLite database so creates, updates and id lookups are indexed and
+several uvicorn workers can write concurrently.
+
+Listing is keyset-paginated on rowid and filtered through indexed columns
+(status, request_type, created_at), a request -> service table and an FTS5
+index over the body text. Schema upgrades are keyed on ``PRAGMA user_version``.
+"""
+import os
+import json
+import base64
+import sqlite3
+import threading
+from datetime import datetime
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS requests (
+        id TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        updated_at TEXT,
+        status TEXT,
+        entry TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS requests_created_at ON requests(created_at)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+]
+
+# user_version -> statements upgrading from the previous version
+MIGRATIONS = {
+    1: [
+        'ALTER TABLE requests ADD COLUMN request_type TEXT',
+        'CREATE INDEX IF NOT EXISTS requests_status ON requests(status)',
+        'CREATE INDEX IF NOT EXISTS requests_request_type ON requests(request_type)',
+        '''CREATE TABLE IF NOT EXISTS request_services (
+            request_id TEXT NOT NULL,
+            service TEXT NOT NULL,
+            PRIMARY KEY (service, request_id)
+        ) WITHOUT ROWID''',
+        'CREATE INDEX IF NOT EXISTS request_services_request ON request_services(request_id)',
+        # rowid of requests_fts == rowid of requests
+        'CREATE VIRTUAL TABLE IF NOT EXISTS requests_fts USING fts5(text)',
+    ],
+}
+
+# top-level entry keys a list view may project, and their indexed column (if any)
+ENTRY_FIELDS = {
+    'id': 'id',
+    'createdAt': 'created_at',
+    'updatedAt': 'updated_at',
+    'status': 'status',
+    'body': None,
+    'files': None,
+}
+
+
+def now_iso():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _as_list(value):
+    """Form values arrive as plain strings or JSON-encoded checkbox lists."""
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            parsed = json.loads(value)
+            if isinstance(parsed, list):
+                return parsed
+        except ValueError:
+            pass
+    return [value] if value not in (None, '') else []
+
+
+def index_fields(entry):
+    """(request_type, services, searchable text) for an entry."""
+    body = entry.get('body') or {}
+    request_type = body.get('request_type') or None
+    services = sorted({str(s).strip().lower() for s in _as_list(body.get('services_needed')) if str(s).strip()})
+    text = ' '.join(' '.join(map(str, _as_list(v))) for v in body.values() if v is not None)
+    text += ' ' + ' '.join(f.get('originalname') or '' for f in entry.get('files') or [])
+    return request_type, services, text
+
+
+def fts_query(text):
+    """Free text -> FTS5 query in which every word must match (as a prefix)."""
+    words = ''.join(c if c.isalnum() else ' ' for c in str(text)).split()
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def encode_cursor(rowid):
+    return base64.urlsafe_b64encode(str(rowid).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except Exception:
+        raise ValueError('invalid cursor')
+
+
+def projection_sql(fields):
+    """(select expression, params) building the projected entry as JSON text.
+
+    ``fields`` are top-level keys (id, createdAt, status, body, files, ...)
+    and/or ``body.<key>`` paths; no fields means the whole stored entry.
+    """
+    if not fields:
+        return 'entry', []
+    parts, body_keys = [], []
+    for f in fields:
+        if f.startswith('body.') and len(f) > 5:
+            body_keys.append(f[5:])
+        elif f in ENTRY_FIELDS:
+            parts.append(f"'{f}', " + (ENTRY_FIELDS[f] or f"json_extract(entry, '$.{f}')"))
+        else:
+            raise ValueError(f'unknown field: {f}')
+    params = []
+    if body_keys and 'body' not in fields:
+        parts.append("'body', json_object(" + ', '.join('?, json_extract(entry, ?)' for _ in body_keys) + ')')
+        for k in body_keys:
+            params.extend([k, '$.body.' + json.dumps(k)])
+    return 'json_object(' + ', '.join(parts) + ')', params
+
+
+class RequestStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        # sqlite connections must not be shared between threads; FastAPI runs
+        # sync endpoints in a threadpool so keep one connection per thread
+        self._local = threading.local()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT explicitly
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front so only one worker
+        # creates the schema / runs the legacy import
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for stmt in SCHEMA:
+                conn.execute(stmt)
+            self._import_legacy(conn)
+            self._migrate(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _import_legacy(self, conn):
+        """One-time migration of the old requests.json array into the table."""
+        done = conn.execute("SELECT value FROM meta WHERE key = 'legacy_import'").fetchone()
+        if done or not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            # nothing is recorded, so the import is tried again on the next start
+            print('Legacy requests import failed (retried on next start):', str(e))
+            return
+        count = 0
+        for e in data if isinstance(data, list) else []:
+            if not isinstance(e, dict) or not e.get('id'):
+                continue
+            conn.execute(
+                'INSERT OR IGNORE INTO requests (id, created_at, updated_at, status, entry) VALUES (?, ?, ?, ?, ?)',
+                (e['id'], e.get('createdAt') or now_iso(), e.get('updatedAt'), e.get('status'), json.dumps(e, default=str))
+            )
+            count += 1
+        conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_import', ?)", (json.dumps({'source': self.legacy_json, 'count': count, 'at': now_iso()}),))
+        if count:
+            print(f'Imported {count} requests from {self.legacy_json}')
+
+    def _migrate(self, conn):
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for target in sorted(v for v in MIGRATIONS if v > version):
+            for stmt in MIGRATIONS[target]:
+                conn.execute(stmt)
+            if target == 1:
+                # backfill the filter columns/tables from the stored entries
+                for rowid, entry in conn.execute('SELECT rowid, entry FROM requests').fetchall():
+                    self._index(conn, rowid, json.loads(entry))
+            conn.execute(f'PRAGMA user_version = {int(target)}')
+
+    def _index(self, conn, rowid, e):
+        request_type, services, text = index_fields(e)
+        conn.execute('UPDATE requests SET request_type = ? WHERE rowid = ?', (request_type, rowid))
+        conn.execute('DELETE FROM request_services WHERE request_id = ?', (e['id'],))
+        conn.executemany('INSERT OR IGNORE INTO request_services (request_id, service) VALUES (?, ?)', [(e['id'], s) for s in services])
+        conn.execute('DELETE FROM requests_fts WHERE rowid = ?', (rowid,))
+        conn.execute('INSERT INTO requests_fts (rowid, text) VALUES (?, ?)', (rowid, text))
+
+    def get(self, request_id):
+        row = self._conn().execute('SELECT entry FROM requests WHERE id = ?', (request_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def uses_file(self, digest):
+        """Whether any saved request lists the stored file ``digest`` (a full scan; only rejected uploads ask)."""
+        row = self._conn().execute(
+            "SELECT 1 FROM requests, json_each(requests.entry, '$.files') AS f "
+            "WHERE json_extract(f.value, '$.sha256') = ? LIMIT 1", (digest,)).fetchone()
+        return row is not None
+
+    def all(self):
+        # rowid order == insertion order, matching the old append-only array
+        rows = self._conn().execute('SELECT entry FROM requests ORDER BY rowid').fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def page(self, status=None, request_type=None, services=None, created_from=None, created_to=None,
+             q=None, fields=None, cursor=None, limit=50, newest_first=True):
+        """One page of matching requests as JSON text; returns (rows, next_cursor).
+
+        Rows are serialized JSON objects (projected in SQL when ``fields`` is
+        given), so listing never parses and re-serializes full entries.
+        """
+        select, params = projection_sql(fields)
+        where, args = [], []
+        if status:
+            where.append('status = ?')
+            args.append(status)
+        if request_type:
+            where.append('request_type = ?')
+            args.append(request_type)
+        for service in services or []:
+            where.append('EXISTS (SELECT 1 FROM request_services WHERE service = ? AND request_id = requests.id)')
+            args.append(service.strip().lower())
+        if created_from:
+            where.append('created_at >= ?')
+            args.append(created_from)
+        if created_to:
+            where.append('created_at <= ?')
+            args.append(created_to)
+        if q:
+            match = fts_query(q)
+            if not match:
+                return [], None
+            where.append('rowid IN (SELECT rowid FROM requests_fts WHERE requests_fts MATCH ?)')
+            args.append(match)
+        if cursor:
+            where.append('rowid < ?' if newest_first else 'rowid > ?')
+            args.append(decode_cursor(cursor))
+        sql = f'SELECT rowid, {select} FROM requests'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY rowid ' + ('DESC' if newest_first else 'ASC') + ' LIMIT ?'
+        rows = self._conn().execute(sql, params + args + [limit + 1]).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return [r[1] for r in rows[:limit]], next_cursor
+
+    def iter_rows(self, page_size=500, limit=None, **filters):
+        """Every matching row (JSON text), fetched a page at a time.
+
+        Each page is a complete query, so the generator may be resumed on a
+        different thread (StreamingResponse iterates it in a threadpool).
+        """
+        cursor, sent = filters.pop('cursor', None), 0
+        while True:
+            size = page_size if limit is None else min(page_size, limit - sent)
+            if size <= 0:
+                return
+            rows, cursor = self.page(cursor=cursor, limit=size, **filters)
+            yield from rows
+            sent += len(rows)
+            if not cursor:
+                return
+
+    def create(self, body, files, status=None):
+        """Insert a new request and return the stored entry."""
+        conn = self._conn()
+        ts = int(datetime.utcnow().timestamp() * 1000)
+        while True:
+            entry = {'id': f'REQ-{ts}', 'createdAt': now_iso(), 'body': body, 'files': files}
+            if status:
+                entry['status'] = status
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cur = conn.execute(
+                    'INSERT INTO requests (id, created_at, status, entry) VALUES (?, ?, ?, ?)',
+                    (entry['id'], entry['createdAt'], status, json.dumps(entry, default=str))
+                )
+                self._index(conn, cur.lastrowid, entry)
+                conn.execute('COMMIT')
+                return entry
+            except sqlite3.IntegrityError:
+                conn.execute('ROLLBACK')
+                # another request (or worker) took this millisecond id
+                ts += 1
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def update(self, request_id, body, files, status=None):
+        """Merge body/files/status into an existing request; None if not found."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT rowid, entry FROM requests WHERE id = ?', (request_id,)).fetchone()
+            if not row:
+                conn.execute('ROLLBACK')
+                return None
+            rowid, e = row[0], json.loads(row[1])
+            e.setdefault('body', {}).update(body)
+            if files:
+                # the same document re-uploaded (draft -> submit) is listed once
+                have = {f.get('sha256') for f in e.get('files', []) if f.get('sha256')}
+                e.setdefault('files', []).extend(f for f in files if not f.get('sha256') or f['sha256'] not in have)
+            if status:
+                e['status'] = status
+            e['updatedAt'] = now_iso()
+            conn.execute(
+                'UPDATE requests SET updated_at = ?, status = ?, entry = ? WHERE id = ?',
+                (e['updatedAt'], e.get('status'), json.dumps(e, default=str), request_id)
+            )
+            self._index(conn, rowid, e)
+            conn.execute('COMMIT')
+            return e
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
@@ -0,0 +1,110 @@
+"""Deadlines, hedged retries and circuit breaking for upstream calls.
+
+``hedged`` runs an async call inside a time budget. It optionally starts a
+duplicate attempt when the first is slow, and retries failed attempts while
+time remains. ``CircuitBreaker`` stops calling an upstream that keeps failing.
+After ``threshold`` consecutive failures it is open for ``cooldown`` seconds.
+One probe call then decides whether it closes or opens again.
+"""
+import time
+import asyncio
+import threading
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker; ``threshold`` 0 disables it."""
+
+    def __init__(self, name, threshold=5, cooldown=30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out now (in half-open state only one probe at a time)."""
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self.state = HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.threshold > 0 and (self.state == HALF_OPEN or self.failures >= self.threshold):
+                if self.state != OPEN:
+                    self.opened += 1
+                    print(f'Circuit {self.name} opened after {self.failures} failures; retrying in {self.cooldown:.0f}s')
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """The allowed call ended without a verdict (e.g. it was cancelled)."""
+        with self._lock:
+            self._probing = False
+
+
+async def hedged(call, timeout, attempts=1, hedge_after=0.0):
+    """Return the first successful result of ``call()`` within ``timeout`` seconds.
+
+    ``call`` is a coroutine factory; up to ``attempts`` calls are made. A
+    failed attempt starts the next one right away. With ``hedge_after`` > 0 a
+    further attempt also starts whenever that long passes without any attempt
+    finishing. Raises ``asyncio.TimeoutError`` when the budget runs out and
+    the last error when every attempt failed; unfinished attempts are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending, started, last_error = set(), 0, None
+
+    def launch():
+        nonlocal started
+        started += 1
+        pending.add(asyncio.ensure_future(call()))
+
+    try:
+        launch()
+        next_hedge = loop.time() + hedge_after
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                raise asyncio.TimeoutError()
+            wait = deadline - now
+            if hedge_after > 0 and started < attempts:
+                wait = min(wait, max(0.0, next_hedge - now))
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                pending.discard(t)
+                if t.exception() is None:
+                    return t.result()
+                last_error = t.exception()
+            if started < attempts and (not pending or (hedge_after > 0 and loop.time() >= next_hedge)):
+                launch()
+                next_hedge = loop.time() + hedge_after
+        raise last_error
+    finally:
+        for t in pending:
+            t.cancel()
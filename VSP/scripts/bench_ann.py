@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Recall@k and latency of the IVF index vs exact search on synthetic vectors.
+
+Vectors are drawn around random cluster centres so the data has the kind of
+structure real embeddings have (uniform random vectors make every ANN look bad).
+
+Usage: python scripts/bench_ann.py [--vendors 200000] [--dim 256] [--queries 200] [--filter 0.3]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+VSP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, VSP_ROOT)
+from vendor_vectors import VendorMatrix  # noqa: E402
+from ann_index import IVFIndex  # noqa: E402
+
+
+def synthetic_vectors(n, dim, clusters=1000, noise=0.35, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    x = centres[rng.integers(0, clusters, n)] + noise * rng.normal(size=(n, dim)).astype(np.float32)
+    return x
+
+
+def percentile(samples, p):
+    return round(float(np.percentile(samples, p)), 3)
+
+
+def run(vm, queries, k, mask, exact):
+    lat, results = [], []
+    for q in queries:
+        t = time.perf_counter()
+        results.append([n for n, _ in vm.top_k(q, k, mask, exact=exact)])
+        lat.append((time.perf_counter() - t) * 1000)
+    return results, {'p50_ms': percentile(lat, 50), 'p95_ms': percentile(lat, 95)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vendors', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32')
+    parser.add_argument('--filter', type=float, default=0.0, help='fraction of rows allowed by a pre-filter mask (0 = no mask)')
+    args = parser.parse_args()
+
+    x = synthetic_vectors(args.vendors, args.dim)
+    vm = VendorMatrix([f'v{i}' for i in range(args.vendors)], x)
+    rng = np.random.default_rng(1)
+    queries = x[rng.integers(0, args.vendors, args.queries)] + 0.3 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    mask = rng.random(args.vendors) < args.filter if args.filter else None
+
+    t = time.perf_counter()
+    vm.ann = IVFIndex.build(vm.matrix, nlist=args.nlist or None)
+    build_s = time.perf_counter() - t
+
+    truth, exact_lat = run(vm, queries, args.k, mask, exact=True)
+    report = {
+        'vendors': args.vendors, 'dim': args.dim, 'k': args.k, 'nlist': vm.ann.nlist,
+        'filter_fraction': args.filter or None, 'build_s': round(build_s, 2),
+        'exact': exact_lat, 'ivf': [],
+    }
+    for nprobe in [int(p) for p in args.nprobe.split(',')]:
+        vm.nprobe = nprobe
+        got, lat = run(vm, queries, args.k, mask, exact=False)
+        recall = np.mean([len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(truth, got)])
+        report['ivf'].append({'nprobe': nprobe, f'recall@{args.k}': round(float(recall), 4), **lat})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Benchmark service/market pre-filtering: per-vendor scan vs the catalog indexes.
+
+Usage: python scripts/bench_catalog_filter.py [--vendors 100000] [--repeat 20]
+"""
+import json
+import time
+import argparse
+
+from bench_common import synthetic_catalog
+from vendor_catalog import VendorCatalog, matches_service
+
+
+def scan_markets(vendors, target_markets):
+    out = []
+    for v in vendors:
+        v_markets = [c.lower() for c in v.get('countries', [])]
+        if any(tm.lower() in vm or vm in tm.lower() for tm in target_markets for vm in v_markets):
+            out.append(v)
+    return out
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return result, {'p50_ms': round(samples[len(samples) // 2], 3), 'min_ms': round(samples[0], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vendors', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    vendors = synthetic_catalog(args.vendors)
+    t = time.perf_counter()
+    catalog = VendorCatalog(vendors)
+    build_ms = (time.perf_counter() - t) * 1000
+
+    service, markets = 'packaging', ['United States (FDA)', 'Japan']
+    scan_s, scan_service = timed(lambda: [v for v in vendors if matches_service(v, service)], args.repeat)
+    idx_s, index_service = timed(lambda: catalog.service_mask(service), args.repeat)
+    scan_m, scan_market = timed(lambda: scan_markets(vendors, markets), args.repeat)
+    idx_m, index_market = timed(lambda: catalog.market_mask(markets), args.repeat)
+    assert len(scan_s) == int(idx_s.sum()) and len(scan_m) == int(idx_m.sum())
+
+    print(json.dumps({
+        'vendors': args.vendors,
+        'index_build_ms': round(build_ms, 1),
+        'service_filter': {'scan': scan_service, 'index': index_service, 'matches': len(scan_s)},
+        'market_filter': {'scan': scan_market, 'index': index_market, 'matches': len(scan_m)},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Shared helpers for the benchmark scripts: synthetic data and JSON results.
+
+Every benchmark writes a JSON document with a ``meta`` block (git commit,
+host, versions, arguments) next to its ``results`` so two runs can be
+compared with ``scripts/bench_compare.py``.
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+
+import numpy as np
+
+VSP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if VSP_ROOT not in sys.path:
+    sys.path.insert(0, VSP_ROOT)
+
+SERVICES = ['Manufacturing', 'Packaging', 'Serialization', 'Testing/Analytical', 'Cold Chain Logistics',
+            'Fill/Finish', 'Lyophilization', 'Stability Studies', 'Regulatory Consulting', 'Clinical Supply']
+COUNTRIES = ['United States (FDA)', 'European Union (EMA)', 'Japan (PMDA)', 'United Kingdom (MHRA)', 'Canada (Health Canada)',
+             'Australia (TGA)', 'China (NMPA)', 'India (CDSCO)', 'Brazil (ANVISA)', 'Switzerland (Swissmedic)']
+WORDS = 'sterile biologics commercial clinical packaging serialization analytics vaccine injectable cold-chain gmp capacity scale-up release'.split()
+# the options of public/formSchemas/new_request.json
+FORM_SERVICES = ['Manufacturing', 'Packaging', 'Testing/Analytical', 'Serialization']
+FORM_MARKETS = ['United States (FDA)', 'European Union (EMA)', 'Japan (PMDA)', 'China (NMPA)']
+CERTIFICATIONS = ['GMP', 'ISO 9001', 'ISO 13485', 'GDP', 'FDA registered', 'EU GMP']
+
+
+def synthetic_catalog(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        'name': f'Vendor {i:07d}',
+        'description': ' '.join(rng.choices(WORDS, k=12)),
+        'services': rng.sample(SERVICES, rng.randint(1, 3)),
+        'countries': rng.sample(COUNTRIES, rng.randint(1, 4)),
+        'certifications': rng.sample(CERTIFICATIONS, rng.randint(0, 2)),
+        'capacity_per_month': rng.randint(0, 1000000),
+    } for i in range(n)]
+
+
+def synthetic_request(rng):
+    """A request body like the UI submits, with values the new_request form accepts."""
+    return {
+        'projectName': f"Project {rng.randint(1, 10**6)}",
+        'description': ' '.join(rng.choices(WORDS, k=8)),
+        'request_type': rng.choice(['Clinical', 'Commercial']),
+        'services_needed': rng.choice(FORM_SERVICES),
+        'target_markets': rng.sample(FORM_MARKETS, rng.randint(1, 3)),
+        'keyCriteria': rng.sample(['Price', 'Quality', 'Delivery', 'Support'], 2),
+    }
+
+
+def summarize(samples_ms):
+    """Latency percentiles (ms) for a list of samples."""
+    if not samples_ms:
+        return {'count': 0}
+    a = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'count': int(a.size),
+        'mean_ms': round(float(a.mean()), 3),
+        'p50_ms': round(float(np.percentile(a, 50)), 3),
+        'p95_ms': round(float(np.percentile(a, 95)), 3),
+        'p99_ms': round(float(np.percentile(a, 99)), 3),
+        'max_ms': round(float(a.max()), 3),
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=VSP_ROOT, capture_output=True, text=True, timeout=5)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=VSP_ROOT, capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '') if out.returncode == 0 else None
+    except Exception:
+        return None
+
+
+def write_results(name, args, results, out=None):
+    """Print the results document and write it to ``out`` (if given)."""
+    doc = {
+        'benchmark': name,
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'host': platform.node(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    text = json.dumps(doc, indent=2)
+    print(text)
+    if out:
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    return doc
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Compare two benchmark result files (bench_micro.py / load_test.py --out).
+
+Prints every numeric metric present in both runs with its relative change;
+``--threshold`` flags changes beyond that fraction. Lower is better for
+latencies, higher for throughput / ``ok`` counts.
+
+Usage: python scripts/bench_compare.py base.json new.json [--threshold 0.1] [--only p50_ms,p95_ms,throughput_rps]
+"""
+import sys
+import json
+import argparse
+
+HIGHER_IS_BETTER = ('throughput_rps', 'ok', 'overlap', 'ratio')
+
+
+def flatten(node, prefix=''):
+    out = {}
+    if isinstance(node, dict):
+        for k, v in node.items():
+            out.update(flatten(v, f'{prefix}.{k}' if prefix else k))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        out[prefix] = float(node)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1, help='flag relative changes above this')
+    parser.add_argument('--only', default='', help='comma separated metric names to show (e.g. p50_ms,p95_ms)')
+    args = parser.parse_args()
+
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"base: {base['meta'].get('commit')} {base['meta'].get('timestamp')}")
+    print(f"new:  {new['meta'].get('commit')} {new['meta'].get('timestamp')}")
+    if base['meta'].get('args') != new['meta'].get('args'):
+        print('warning: runs used different arguments')
+
+    only = {m for m in args.only.split(',') if m}
+    a, b = flatten(base['results']), flatten(new['results'])
+    worse = 0
+    rows = []
+    for key in sorted(a.keys() & b.keys()):
+        leaf = key.rsplit('.', 1)[-1]
+        if only and leaf not in only:
+            continue
+        old, cur = a[key], b[key]
+        change = (cur - old) / old if old else 0.0
+        better = change > 0 if leaf in HIGHER_IS_BETTER else change < 0
+        flag = ''
+        if abs(change) > args.threshold:
+            flag = 'better' if better else 'WORSE'
+            worse += not better
+        rows.append((key, old, cur, change, flag))
+    width = max((len(r[0]) for r in rows), default=10)
+    for key, old, cur, change, flag in rows:
+        print(f'{key:<{width}}  {old:>12.3f}  {cur:>12.3f}  {change * 100:>+8.1f}%  {flag}')
+    sys.exit(1 if worse else 0)
+
+
+if __name__ == '__main__':
+    main()
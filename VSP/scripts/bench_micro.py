@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the hot paths: vector scoring, catalog filtering, storage.
+
+Each group runs in-process against synthetic data and reports latency
+percentiles; the JSON document (see ``--out``) can be compared with another
+run via ``scripts/bench_compare.py``.
+
+Usage: python scripts/bench_micro.py [--vendors 100000] [--dim 256] [--repeat 50] [--only scoring,filtering,storage] [--out results.json]
+"""
+import os
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from bench_common import synthetic_catalog, synthetic_request, time_calls, write_results
+from vendor_catalog import VendorCatalog
+from vendor_vectors import VendorMatrix
+from ann_index import IVFIndex
+from lexical import top_ids
+from request_store import RequestStore
+from audit_log import AuditLog
+from upload_store import UploadStore, PendingFile
+
+
+def clustered_vectors(n, dim, clusters=1000, noise=0.35, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    return centres[rng.integers(0, clusters, n)] + noise * rng.normal(size=(n, dim)).astype(np.float32)
+
+
+def bench_scoring(args, vendors):
+    names = [v['name'] for v in vendors]
+    vm = VendorMatrix(names, clustered_vectors(len(names), args.dim))
+    queries = list(clustered_vectors(args.batch, args.dim, seed=1))
+    mask = np.random.default_rng(2).random(len(names)) < 0.3
+    it = iter(range(1 << 62))
+    q = lambda: queries[next(it) % len(queries)]  # noqa: E731
+    results = {
+        'top_k_exact': time_calls(lambda: vm.top_k(q(), 20, exact=True), args.repeat),
+        'top_k_exact_masked': time_calls(lambda: vm.top_k(q(), 20, mask, exact=True), args.repeat),
+        f'top_k_batch_{args.batch}': time_calls(lambda: vm.top_k_batch(queries, 20), max(3, args.repeat // 10)),
+    }
+    vm.ann = IVFIndex.build(vm.matrix)
+    results['top_k_ivf'] = time_calls(lambda: vm.top_k(q(), 20), args.repeat)
+    results['top_k_ivf_masked'] = time_calls(lambda: vm.top_k(q(), 20, mask), args.repeat)
+    return results
+
+
+def bench_filtering(args, vendors):
+    catalog = VendorCatalog(vendors)
+    bm25 = catalog.bm25
+    ids = np.flatnonzero(catalog.service_mask('packaging'))
+    query = 'sterile injectable fill finish packaging for commercial vaccine release'
+    return {
+        'catalog_build': time_calls(lambda: VendorCatalog(vendors), 3, warmup=0),
+        'service_mask': time_calls(lambda: catalog.service_mask('packaging'), args.repeat),
+        'market_mask': time_calls(lambda: catalog.market_mask(['United States (FDA)', 'Japan']), args.repeat),
+        'bm25_scores': time_calls(lambda: bm25.scores(query), args.repeat),
+        'bm25_top_ids': time_calls(lambda: top_ids(bm25.scores(query), ids, 50), args.repeat),
+    }
+
+
+def bench_storage(args, workdir):
+    rng = random.Random(0)
+    store = RequestStore(os.path.join(workdir, 'requests.db'))
+    for _ in range(args.requests):
+        store.create(synthetic_request(rng), [], status=rng.choice(['draft', 'submitted', 'rfp']))
+    results = {
+        'request_create': time_calls(lambda: store.create(synthetic_request(rng), [], status='submitted'), args.repeat),
+        'request_page': time_calls(lambda: store.page(limit=50), args.repeat),
+        'request_page_filtered': time_calls(lambda: store.page(status='submitted', services=['Packaging'], limit=50), args.repeat),
+        'request_page_search': time_calls(lambda: store.page(q='sterile vaccine', limit=50), args.repeat),
+    }
+    log = AuditLog(os.path.join(workdir, 'audit'))
+    record = {'event': 'vendor_selection', 'request': synthetic_request(rng), 'final': [{'name': f'Vendor {i}'} for i in range(9)]}
+    results['audit_write_1'] = time_calls(lambda: log.write_batch([record]), args.repeat)
+    results['audit_write_100'] = time_calls(lambda: log.write_batch([record] * 100), args.repeat)
+
+    uploads = UploadStore(os.path.join(workdir, 'uploads'), 1 << 30, 1 << 30)
+    chunk = os.urandom(1 << 20)
+
+    def upload_8mb():
+        f = PendingFile(uploads, 'spec.pdf', 'application/pdf')
+        for _ in range(8):
+            f.write(chunk)
+        f.write(os.urandom(16))  # a new digest every time
+        f.commit()
+    results['upload_8mb'] = time_calls(upload_8mb, max(3, args.repeat // 5))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vendors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--batch', type=int, default=32, help='queries per top_k_batch call')
+    parser.add_argument('--requests', type=int, default=10000, help='rows preloaded into the request store')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--only', default='scoring,filtering,storage')
+    parser.add_argument('--out', help='write the results JSON here')
+    args = parser.parse_args()
+
+    groups = set(args.only.split(','))
+    vendors = synthetic_catalog(args.vendors) if groups & {'scoring', 'filtering'} else []
+    results = {}
+    if 'scoring' in groups:
+        results['scoring'] = bench_scoring(args, vendors)
+    if 'filtering' in groups:
+        results['filtering'] = bench_filtering(args, vendors)
+    if 'storage' in groups:
+        workdir = tempfile.mkdtemp(prefix='vsp-bench-')
+        try:
+            results['storage'] = bench_storage(args, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    write_results('micro', args, results, args.out)
+
+
+if __name__ == '__main__':
+    main()
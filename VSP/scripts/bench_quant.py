@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Memory, latency and top-k overlap of compact vector codes vs exact float32 scoring.
+
+For each code kind (float16, int8, binary) the vendor matrix is encoded, the
+first pass scores the codes and the best ``--rescore`` rows are rescored in
+float32. Reported per kind: bytes held by the codes (and the ratio to the
+float32 matrix), float32 bytes read per query for rescoring, latency
+percentiles, and the mean overlap of the top-k with exact search. With
+``--ivf`` the same is measured on top of the IVF index.
+
+Usage: python scripts/bench_quant.py [--vendors 200000] [--dim 256] [--queries 200] [--rescore 100,200,400] [--ivf] [--out results/quant.json]
+"""
+import time
+import argparse
+
+import numpy as np
+
+from bench_common import summarize, write_results
+from bench_ann import synthetic_vectors
+from vendor_vectors import VendorMatrix
+from vector_codes import KINDS, VectorCodes
+from ann_index import IVFIndex
+
+
+def run(vm, queries, k, mask, exact=False):
+    lat, results = [], []
+    for q in queries:
+        t = time.perf_counter()
+        results.append([n for n, _ in vm.top_k(q, k, mask, exact=exact)])
+        lat.append((time.perf_counter() - t) * 1000)
+    return results, summarize(lat)
+
+
+def overlap(truth, got, k):
+    return round(float(np.mean([len(set(a) & set(b)) / max(1, min(k, len(a))) for a, b in zip(truth, got)])), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vendors', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--kinds', default=','.join(KINDS))
+    parser.add_argument('--rescore', default='100,200,400', help='comma separated shortlist sizes')
+    parser.add_argument('--filter', type=float, default=0.0, help='fraction of rows allowed by a pre-filter mask (0 = no mask)')
+    parser.add_argument('--ivf', action='store_true', help='also measure codes on top of the IVF index')
+    parser.add_argument('--nprobe', type=int, default=8)
+    parser.add_argument('--out', default='')
+    args = parser.parse_args()
+
+    x = synthetic_vectors(args.vendors, args.dim)
+    vm = VendorMatrix([f'v{i}' for i in range(args.vendors)], x)
+    rng = np.random.default_rng(1)
+    queries = x[rng.integers(0, args.vendors, args.queries)] + 0.3 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    mask = rng.random(args.vendors) < args.filter if args.filter else None
+
+    truth, exact_lat = run(vm, queries, args.k, mask, exact=True)
+    results = {'float32': {'bytes': int(vm.matrix.nbytes), 'latency': exact_lat}}
+    ivf = IVFIndex.build(vm.matrix) if args.ivf else None
+    if ivf is not None:
+        vm.ann, vm.nprobe = ivf, args.nprobe
+        got, lat = run(vm, queries, args.k, mask)
+        results['ivf_float32'] = {'overlap': overlap(truth, got, args.k), 'latency': lat}
+
+    for kind in [k for k in args.kinds.split(',') if k]:
+        t = time.perf_counter()
+        codes = VectorCodes.build(vm.matrix, kind)
+        build_s = time.perf_counter() - t
+        row = {'bytes': codes.nbytes, 'ratio': round(vm.matrix.nbytes / codes.nbytes, 1), 'build_s': round(build_s, 2)}
+        vm.codes = codes
+        for rescore in [int(r) for r in args.rescore.split(',')]:
+            vm.rescore = rescore
+            entry = {'rescore_bytes_per_query': rescore * args.dim * 4}
+            vm.ann = None
+            got, lat = run(vm, queries, args.k, mask)
+            entry.update(overlap=overlap(truth, got, args.k), latency=lat)
+            if ivf is not None:
+                vm.ann = ivf
+                got, lat = run(vm, queries, args.k, mask)
+                entry['ivf'] = {'overlap': overlap(truth, got, args.k), 'latency': lat}
+            row[f'rescore_{rescore}'] = entry
+        vm.codes = vm.ann = None
+        results[kind] = row
+    write_results('quant', args, results, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,44 +1,84 @@
 import os
-import json
+import sys
 import asyncio
 
-VSP_ROOT = os.path.dirname(os.path.dirname(__file__))
+VSP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(VSP_ROOT, 'data')
 VENDORS_CATALOG = os.path.join(DATA_DIR, 'vendors_catalog.json')
-VENDORS_EMBED = os.path.join(DATA_DIR, 'vendors_embeddings.json')
+VENDORS_EMBED_JSON = os.path.join(DATA_DIR, 'vendors_embeddings.json')
+VENDORS_EMBED_NPY = os.path.join(DATA_DIR, 'vendors_embeddings.npy')
+VENDORS_EMBED_MANIFEST = os.path.join(DATA_DIR, 'vendors_embeddings.manifest.json')
+VENDORS_EMBED_IVF = os.path.join(DATA_DIR, 'vendors_embeddings.ivf.npz')
+VENDORS_DELTA_NPY = os.path.join(DATA_DIR, 'vendors_embeddings.delta.npy')
+VENDORS_DELTA_MANIFEST = os.path.join(DATA_DIR, 'vendors_embeddings.delta.manifest.json')
+VENDORS_CHANGES = os.path.join(DATA_DIR, 'vendors_changes.jsonl')
 
-try:
-    import openai  # type: ignore
-except Exception:
-    openai = None
+sys.path.insert(0, VSP_ROOT)
+from vendor_vectors import VendorMatrix, save_store, convert_json_store, build_ann_for_store  # noqa: E402
+from embeddings import build_vendor_embeddings, embeddings_available  # noqa: E402
+from openai_client import close_client  # noqa: E402
+from vendor_catalog import CatalogLoader  # noqa: E402
+
+MODEL = os.getenv('OPENAI_EMBED_MODEL', 'text-embedding-3-small')
 
-async def get_embedding(text):
-    if not openai or not os.getenv('OPENAI_API_KEY'):
-        raise RuntimeError('OPENAI_API_KEY not set or openai package missing')
-    openai.api_key = os.getenv('OPENAI_API_KEY')
-    model = os.getenv('OPENAI_EMBED_MODEL', 'text-embedding-3-small')
-    resp = await asyncio.to_thread(openai.Embeddings.create, model=model, input=text)
-    return resp['data'][0]['embedding']
 
-async def build():
+def read_catalog():
     if not os.path.exists(VENDORS_CATALOG):
         raise RuntimeError('vendors_catalog.json not found')
-    with open(VENDORS_CATALOG, 'r', encoding='utf-8') as f:
-        catalog = json.load(f)
-
-    out = {}
-    for v in catalog:
-        name = v.get('name')
-        blob = f"{name}. Services: {', '.join(v.get('services', []))}. Countries: {', '.join(v.get('countries', []))}. Description: {v.get('description', '')}"
-        print('Embedding', name)
-        vec = await get_embedding(blob)
-        out[name] = vec
-
-    tmp = VENDORS_EMBED + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(out, f)
-    os.replace(tmp, VENDORS_EMBED)
-    print('Saved embeddings to', VENDORS_EMBED)
+    # include changes made through /api/vendors that are not compacted yet
+    return CatalogLoader(VENDORS_CATALOG, changes_path=VENDORS_CHANGES).get().live()
+
+
+async def build(force=False):
+    if not embeddings_available():
+        raise RuntimeError('OPENAI_API_KEY not set or openai package missing')
+    catalog = read_catalog()
+    existing = VendorMatrix.open(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST)
+    if existing is not None:
+        delta = VendorMatrix.open(VENDORS_DELTA_NPY, VENDORS_DELTA_MANIFEST)
+        if delta is not None and delta.dim == existing.dim:
+            existing = existing.with_delta(delta)
+    try:
+        names, vectors, hashes, stats = await build_vendor_embeddings(
+            catalog,
+            existing=existing,
+            model=MODEL,
+            batch_size=int(os.getenv('VSP_EMBED_BATCH_SIZE', '64')),
+            concurrency=int(os.getenv('VSP_EMBED_CONCURRENCY', '4')),
+            retries=int(os.getenv('VSP_EMBED_RETRIES', '3')),
+            force=force,
+        )
+    finally:
+        await close_client()
+    print(f"Embedded {stats['embedded']}, reused {stats['reused']}, failed {stats['failed']}")
+    if not names:
+        raise RuntimeError('no embeddings built')
+    save_store(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, names, vectors, MODEL, hashes)
+    print('Saved embeddings to', VENDORS_EMBED_NPY)
+    # the delta store's vectors are part of the new store now
+    for path in (VENDORS_DELTA_MANIFEST, VENDORS_DELTA_NPY):
+        if os.path.exists(path):
+            os.remove(path)
+    build_ann()
+
+
+def build_ann():
+    index = build_ann_for_store(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, VENDORS_EMBED_IVF,
+                                int(os.getenv('VSP_ANN_MIN_VENDORS', '20000')), int(os.getenv('VSP_ANN_NLIST', '0')) or None)
+    if index is not None:
+        print(f'Saved IVF index ({index.nlist} lists) to', VENDORS_EMBED_IVF)
+
+
+def convert(path):
+    """Convert an existing JSON {name: [floats]} embeddings file to the binary store."""
+    manifest = convert_json_store(path, VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, MODEL, read_catalog())
+    print(f"Converted {manifest['count']} vectors (dim {manifest['dim']}) from {path} to {VENDORS_EMBED_NPY}")
+    build_ann()
+
 
 if __name__ == '__main__':
-    asyncio.run(build())
+    # usage: build_vendor_embeddings.py [--full | --convert [path/to/vendors_embeddings.json]]
+    if len(sys.argv) > 1 and sys.argv[1] == '--convert':
+        convert(sys.argv[2] if len(sys.argv) > 2 else VENDORS_EMBED_JSON)
+    else:
+        asyncio.run(build(force='--full' in sys.argv[1:]))
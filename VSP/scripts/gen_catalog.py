@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Generate a synthetic vendor catalog (1k .. 1M vendors) with its embeddings store.
+
+Writes ``vendors_catalog.json`` plus ``vendors_embeddings.npy`` / ``.manifest.json``
+(and the IVF index for large catalogs) into ``--out``. Vectors are the same
+hashed bag-of-words that ``scripts/stub_openai.py`` returns, so a server using
+the stub as its embeddings endpoint retrieves against them consistently.
+
+    python scripts/gen_catalog.py --vendors 100000 --out /tmp/vsp-100k
+    VSP_DATA_DIR=/tmp/vsp-100k OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=stub \
+        uvicorn server:app --port 8000
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+from bench_common import synthetic_catalog
+from vendor_vectors import vendor_blob, blob_hash, save_store, build_ann_for_store
+from embeddings import embed_model
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def embed_catalog(vendors, dim):
+    """stub_openai.stub_vector for every vendor blob, with per-token hashes memoized."""
+    out = np.zeros((len(vendors), dim), dtype=np.float32)
+    memo = {}
+    for row, v in enumerate(vendors):
+        for tok in TOKEN_RE.findall(vendor_blob(v).lower()):
+            hit = memo.get(tok)
+            if hit is None:
+                h = int.from_bytes(hashlib.md5(tok.encode('utf-8')).digest()[:8], 'little')
+                hit = memo[tok] = (h % dim, 1.0 if (h >> 63) else -1.0)
+            out[row, hit[0]] += hit[1]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vendors', type=int, default=10000)
+    parser.add_argument('--dim', type=int, default=256, help='must match the stub server --dim')
+    parser.add_argument('--out', required=True, help='data directory to write (use as VSP_DATA_DIR)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--ann-min-vendors', type=int, default=int(os.getenv('VSP_ANN_MIN_VENDORS', '20000')))
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    timings = {}
+    t = time.perf_counter()
+    vendors = synthetic_catalog(args.vendors, seed=args.seed)
+    with open(os.path.join(args.out, 'vendors_catalog.json'), 'w', encoding='utf-8') as f:
+        json.dump(vendors, f)
+    timings['catalog_s'] = round(time.perf_counter() - t, 2)
+
+    t = time.perf_counter()
+    vectors = embed_catalog(vendors, args.dim)
+    timings['embed_s'] = round(time.perf_counter() - t, 2)
+
+    t = time.perf_counter()
+    npy = os.path.join(args.out, 'vendors_embeddings.npy')
+    manifest = os.path.join(args.out, 'vendors_embeddings.manifest.json')
+    save_store(npy, manifest, [v['name'] for v in vendors], vectors, embed_model(),
+               [blob_hash(vendor_blob(v)) for v in vendors])
+    timings['store_s'] = round(time.perf_counter() - t, 2)
+
+    t = time.perf_counter()
+    ann = build_ann_for_store(npy, manifest, os.path.join(args.out, 'vendors_embeddings.ivf.npz'), args.ann_min_vendors)
+    if ann is not None:
+        timings['ann_s'] = round(time.perf_counter() - t, 2)
+
+    print(json.dumps({'out': args.out, 'vendors': args.vendors, 'dim': args.dim, 'model': embed_model(),
+                      'ann_lists': ann.nlist if ann is not None else None, **timings}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Concurrent load driver for a running server.
+
+Scenarios (``--scenario``, comma separated, mixed round-robin):
+  select    POST /api/select_vendors with a synthetic request
+  stream    POST /api/select_vendors?stream=1, timed to the first and last NDJSON event
+  requests  POST /api/requests as multipart with an ``--upload-kb`` attachment
+  list      GET /api/requests (first page, list projection)
+  rfp       POST /api/generate_rfp/{id} for requests created during setup
+
+Runs ``--concurrency`` workers until ``--requests`` calls finished or
+``--duration`` seconds passed, then reports throughput, latency percentiles
+and errors per scenario as JSON (``--out`` to keep it for bench_compare.py).
+Point the server at scripts/stub_openai.py (and a gen_catalog.py data dir)
+so upstream latency and errors are controlled:
+
+    python scripts/stub_openai.py --port 9000 --latency-ms 300 --error-rate 0.02 &
+    VSP_DATA_DIR=/tmp/vsp-100k OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=stub uvicorn server:app --port 8000 &
+    python scripts/load_test.py --url http://127.0.0.1:8000 --scenario select,requests,rfp --concurrency 32 --duration 60
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import httpx
+
+from bench_common import synthetic_request, summarize, write_results
+
+
+def form_fields(body):
+    # the UI sends list values as JSON strings
+    return {k: json.dumps(v) if isinstance(v, list) else str(v) for k, v in body.items()}
+
+
+async def do_select(client, rng, ctx):
+    r = await client.post('/api/select_vendors', json=synthetic_request(rng))
+    r.raise_for_status()
+    return {}
+
+
+async def do_stream(client, rng, ctx):
+    t = time.perf_counter()
+    first = None
+    async with client.stream('POST', '/api/select_vendors?stream=1', json=synthetic_request(rng)) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if line.strip() and first is None:
+                first = (time.perf_counter() - t) * 1000
+    return {'first_event_ms': first}
+
+
+async def do_requests(client, rng, ctx):
+    files = {'files': ('spec.pdf', os.urandom(ctx['upload_bytes']), 'application/pdf')} if ctx['upload_bytes'] else None
+    r = await client.post('/api/requests', data=form_fields(synthetic_request(rng)), files=files)
+    r.raise_for_status()
+    ctx['ids'].append(r.json()['id'])
+    return {}
+
+
+async def do_list(client, rng, ctx):
+    r = await client.get('/api/requests', params={'limit': 25, 'fields': 'id,createdAt,status,body.projectName,files'})
+    r.raise_for_status()
+    return {}
+
+
+async def do_rfp(client, rng, ctx):
+    r = await client.post(f"/api/generate_rfp/{rng.choice(ctx['ids'])}")
+    r.raise_for_status()
+    return {}
+
+
+SCENARIOS = {'select': do_select, 'stream': do_stream, 'requests': do_requests, 'list': do_list, 'rfp': do_rfp}
+
+
+async def run(args):
+    scenarios = [s.strip() for s in args.scenario.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f'unknown scenario(s): {", ".join(unknown)}')
+    ctx = {'upload_bytes': args.upload_kb * 1024, 'ids': []}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        if 'rfp' in scenarios:
+            setup_rng = random.Random(args.seed)
+            for _ in range(10):
+                await do_requests(client, setup_rng, dict(ctx, upload_bytes=0))
+
+        latencies = defaultdict(list)
+        extras = defaultdict(lambda: defaultdict(list))
+        errors = defaultdict(lambda: defaultdict(int))
+        issued = 0
+        deadline = time.perf_counter() + args.duration if args.duration else None
+
+        async def worker(wid):
+            nonlocal issued
+            rng = random.Random(args.seed * 1000 + wid)
+            while True:
+                if (args.requests and issued >= args.requests) or (deadline and time.perf_counter() >= deadline):
+                    return
+                name = scenarios[issued % len(scenarios)]
+                issued += 1
+                t = time.perf_counter()
+                try:
+                    extra = await SCENARIOS[name](client, rng, ctx)
+                except httpx.HTTPStatusError as e:
+                    errors[name][str(e.response.status_code)] += 1
+                    continue
+                except httpx.HTTPError as e:
+                    errors[name][type(e).__name__] += 1
+                    continue
+                latencies[name].append((time.perf_counter() - t) * 1000)
+                for k, v in extra.items():
+                    if v is not None:
+                        extras[name][k].append(v)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    results = {'elapsed_s': round(elapsed, 3), 'scenarios': {}}
+    total_ok = total_err = 0
+    for name in scenarios:
+        ok, err = len(latencies[name]), sum(errors[name].values())
+        total_ok, total_err = total_ok + ok, total_err + err
+        entry = {'ok': ok, 'errors': dict(errors[name]), 'throughput_rps': round(ok / elapsed, 2) if elapsed else 0.0,
+                 'latency': summarize(latencies[name])}
+        for k, samples in extras[name].items():
+            entry[k] = summarize(samples)
+        results['scenarios'][name] = entry
+    results['total'] = {'ok': total_ok, 'errors': total_err, 'throughput_rps': round(total_ok / elapsed, 2) if elapsed else 0.0,
+                        'latency': summarize([x for name in scenarios for x in latencies[name]])}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scenario', default='select')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=0, help='stop after this many calls (0: use --duration)')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run (0: use --requests)')
+    parser.add_argument('--upload-kb', type=int, default=256, help='attachment size for the requests scenario (0: none)')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the results JSON here')
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error('give --requests or --duration')
+    write_results('load', args, asyncio.run(run(args)), args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenAI embeddings and chat completions endpoints.
+
+Vectors are deterministic hashed bag-of-words, so texts that share words get
+similar embeddings and rebuilding the same text returns the same vector.
+Chat completions answer the rerank prompt with a ``{"top_k": [...]}`` object
+built from the candidate names in the request (streamed as SSE when asked).
+``--latency-ms`` / ``--jitter-ms`` delay every call and ``--error-rate``
+fails that fraction of calls with 500/429, to exercise timeouts and fallbacks.
+
+Usage:
+    python scripts/stub_openai.py [--port 9000] [--dim 256] [--latency-ms 300 --jitter-ms 100 --error-rate 0.05]
+    export OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=stub
+"""
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DIM = 256
+LATENCY_MS = 0.0
+JITTER_MS = 0.0
+ERROR_RATE = 0.0
+
+app = FastAPI(title='VSP OpenAI stub')
+stats = {'embedding_calls': 0, 'embedding_inputs': 0, 'chat_calls': 0, 'chat_streams': 0, 'errors': 0}
+
+
+def stub_vector(text, dim=None):
+    dim = dim or DIM
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in re.findall(r'[a-z0-9]+', text.lower()):
+        h = int.from_bytes(hashlib.md5(tok.encode('utf-8')).digest()[:8], 'little')
+        vec[h % dim] += 1.0 if (h >> 63) else -1.0
+    n = np.linalg.norm(vec)
+    return (vec / n if n else vec).tolist()
+
+
+async def simulate_upstream():
+    """Sleep the configured latency; returns an error response for injected failures."""
+    delay = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS))
+    if delay:
+        await asyncio.sleep(delay / 1000.0)
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        stats['errors'] += 1
+        status = random.choice([500, 429])
+        return JSONResponse({'error': {'message': 'injected failure', 'type': 'server_error' if status == 500 else 'rate_limit_error'}}, status_code=status)
+    return None
+
+
+def rerank_reply(messages):
+    """A rerank answer ranking the prompt's candidates in the order given."""
+    names = []
+    for m in messages:
+        if m.get('role') != 'user':
+            continue
+        try:
+            names = [c.get('name') for c in json.loads(m.get('content') or '{}').get('candidates', [])]
+        except (ValueError, AttributeError):
+            names = []
+    top = [{'name': n, 'score': max(0, 95 - 5 * i), 'reason': 'Stub ranking.'} for i, n in enumerate(names[:9])]
+    return json.dumps({'top_k': top}, indent=1)
+
+
+@app.post('/v1/embeddings')
+async def embeddings(request: Request):
+    body = await request.json()
+    failed = await simulate_upstream()
+    if failed is not None:
+        return failed
+    inputs = body.get('input')
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    stats['embedding_calls'] += 1
+    stats['embedding_inputs'] += len(inputs)
+    return {
+        'object': 'list',
+        'model': body.get('model', 'stub'),
+        'data': [{'object': 'embedding', 'index': i, 'embedding': stub_vector(t)} for i, t in enumerate(inputs)],
+        'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+    }
+
+
+@app.post('/v1/chat/completions')
+async def chat_completions(request: Request):
+    body = await request.json()
+    failed = await simulate_upstream()
+    if failed is not None:
+        return failed
+    stats['chat_calls'] += 1
+    content = rerank_reply(body.get('messages') or [])
+    model = body.get('model', 'stub')
+    cid, created = f'chatcmpl-stub{stats["chat_calls"]}', int(time.time())
+    if not body.get('stream'):
+        return {
+            'id': cid, 'object': 'chat.completion', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
+    stats['chat_streams'] += 1
+
+    def chunk(delta, finish=None):
+        return 'data: ' + json.dumps({'id': cid, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                                      'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}]}) + '\n\n'
+
+    async def events():
+        yield chunk({'role': 'assistant', 'content': ''})
+        for i in range(0, len(content), 24):
+            yield chunk({'content': content[i:i + 24]})
+            await asyncio.sleep(0)
+        yield chunk({}, 'stop')
+        yield 'data: [DONE]\n\n'
+
+    return StreamingResponse(events(), media_type='text/event-stream')
+
+
+@app.get('/stats')
+def get_stats():
+    return stats
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--dim', type=int, default=DIM)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='added to every call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform +/- around the latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls failed with 500/429')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(sys.argv[1:])
+    DIM, LATENCY_MS, JITTER_MS, ERROR_RATE = args.dim, args.latency_ms, args.jitter_ms, args.error_rate
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Upload a file larger than RAM and check the server's memory stays flat.
+
+Starts the FastAPI server in a subprocess (its uploads and data go to a temp directory),
+streams a generated multipart body of ``--size-mb`` (default: 1.1x the
+machine's RAM) with chunked transfer encoding, then compares the server's
+peak RSS (VmHWM) to ``--max-rss-mb`` and the returned SHA-256 to the one
+computed while sending. Uploading the same bytes a second time checks that
+the file is stored once. Needs that much free disk space; Linux only.
+
+Usage: python scripts/test_upload_memory.py [--size-mb N] [--max-rss-mb 400] [--port 8765]
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+VSP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOUNDARY = 'vsp-upload-memory-test'
+CHUNK = 1 << 20
+
+
+def mem_total_mb():
+    with open('/proc/meminfo') as f:
+        for line in f:
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1]) // 1024
+    raise RuntimeError('no MemTotal in /proc/meminfo')
+
+
+def peak_rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def multipart_body(size, digest):
+    """Yield a multipart form with one text field and one ``size``-byte file."""
+    yield (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="projectName"\r\n\r\n'
+           f'upload memory test\r\n--{BOUNDARY}\r\n'
+           'Content-Disposition: form-data; name="files"; filename="big.bin"\r\n'
+           'Content-Type: application/octet-stream\r\n\r\n').encode()
+    block = bytes(range(256)) * (CHUNK // 256)
+    sent = 0
+    while sent < size:
+        data = block[:min(CHUNK, size - sent)]
+        digest.update(data)
+        sent += len(data)
+        yield data
+    yield f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+def upload(url, size):
+    digest = hashlib.sha256()
+    t = time.time()
+    r = requests.post(f'{url}/api/requests', data=multipart_body(size, digest),
+                      headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}, timeout=None)
+    r.raise_for_status()
+    return r.json(), digest.hexdigest(), time.time() - t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=0, help='upload size (default: 1.1x RAM)')
+    parser.add_argument('--max-rss-mb', type=float, default=400)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    size_mb = args.size_mb or int(mem_total_mb() * 1.1)
+    work_dir = tempfile.mkdtemp(prefix='vsp-upload-test-')
+    # requests and audit records go here too, not into the real data/ directory
+    upload_dir, data_dir = os.path.join(work_dir, 'uploads'), os.path.join(work_dir, 'data')
+    if shutil.disk_usage(work_dir).free < size_mb * 2 * CHUNK:
+        print(f'need about {size_mb * 2} MB free disk under {work_dir}')
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return 2
+
+    env = dict(os.environ, VSP_UPLOAD_DIR=upload_dir, VSP_DATA_DIR=data_dir,
+               VSP_UPLOAD_MAX_FILE_MB=str(size_mb + 1), VSP_UPLOAD_MAX_REQUEST_MB=str(size_mb + 2))
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(args.port)],
+                              cwd=VSP_ROOT, env=env)
+    url = f'http://127.0.0.1:{args.port}'
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f'{url}/api/schemas', timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        baseline = peak_rss_mb(server.pid)
+        print(f'uploading {size_mb} MB (RAM {mem_total_mb()} MB), server RSS before: {baseline:.0f} MB')
+
+        out, sha, elapsed = upload(url, size_mb * CHUNK)
+        stored = out['entry']['files'][0]
+        peak = peak_rss_mb(server.pid)
+        print(f'stored {stored["size"]} bytes as {stored["sha256"]} in {elapsed:.1f}s ({size_mb / elapsed:.0f} MB/s)')
+        print(f'server peak RSS: {peak:.0f} MB (limit {args.max_rss_mb:.0f} MB)')
+
+        out2, _, _ = upload(url, size_mb * CHUNK)
+        blobs = [f for _, _, fs in os.walk(os.path.join(upload_dir, 'sha256')) for f in fs if f != '.lock']
+
+        ok = True
+        if stored['sha256'] != sha or stored['size'] != size_mb * CHUNK:
+            print('FAIL: stored hash/size does not match the uploaded bytes'); ok = False
+        if peak > args.max_rss_mb:
+            print('FAIL: server memory grew with the upload'); ok = False
+        if out2['entry']['files'][0]['sha256'] != sha or len(blobs) != 1:
+            print(f'FAIL: duplicate upload not deduplicated ({len(blobs)} blobs)'); ok = False
+        print('OK' if ok else 'FAILED')
+        return 0 if ok else 1
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
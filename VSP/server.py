@@ -1,36 +1,97 @@
 # NOTE: RFP routes moved below after `app = FastAPI(...)` so `app` is defined before decorators are applied.
 
 from fastapi import FastAPI, UploadFile, File, Form, Request
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
 import os
 import json
+import time
 import random
+import sqlite3
+import hashlib
+import itertools
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 import numpy as np
 import asyncio
-try:
-    import openai
-except Exception:
-    openai = None
+from contextlib import asynccontextmanager
 from datetime import datetime
+from request_store import RequestStore
+from audit_log import AuditLog
+from audit_stats import AuditStats, ALL as ALL_FACETS
+from vendor_vectors import VendorMatrix, save_store, convert_json_store, build_ann_for_store, build_codes_for_store
+from openai_client import client_available, get_client, close_client
+from embeddings import embed_texts, embed_model, embeddings_available, build_vendor_embeddings
+from vector_codes import VectorCodes
+from vendor_catalog import CatalogLoader, matches_service, validate_vendor
+from lexical import top_ids, reciprocal_rank_fusion
+from cache import TieredCache, DiskCache, cache_key, normalize_text
+from upload_store import UploadStore, UploadTooLarge, BadUpload, is_sha256
+from form_schemas import FormRegistry, FormError
+from documents import RfpStore, render_batch, stream_export, export_members
+from job_queue import JobQueue
+from http_cache import AssetDir, cached_bytes_response, compressed_variants, immutable_file_response, IMMUTABLE, REVALIDATE
+from metrics import registry, stage, MetricsMiddleware, SlowRequestProfiler, RERANKS, RERANK_FALLBACKS, UPSTREAM_ERRORS, AUDIT_FLUSH_SECONDS
+from resilience import CircuitBreaker, STATE_VALUES, hedged
+from single_flight import Flight, SingleFlight, request_key
 
 BASE_DIR = os.path.dirname(__file__)
-UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
-DATA_DIR = os.path.join(BASE_DIR, 'data')
+UPLOAD_DIR = os.getenv('VSP_UPLOAD_DIR') or os.path.join(BASE_DIR, 'uploads')
+DATA_DIR = os.getenv('VSP_DATA_DIR') or os.path.join(BASE_DIR, 'data')
 DATA_FILE = os.path.join(DATA_DIR, 'requests.json')
+REQUESTS_DB = os.path.join(DATA_DIR, 'requests.db')
 
 VENDORS_FILE = os.path.join(DATA_DIR, 'vendors.json')
 VENDORS_CATALOG_FILE = os.path.join(DATA_DIR, 'vendors_catalog.json')
+# legacy JSON embeddings; converted once into the binary store below
 VENDORS_EMBED_FILE = os.path.join(DATA_DIR, 'vendors_embeddings.json')
+VENDORS_EMBED_NPY = os.path.join(DATA_DIR, 'vendors_embeddings.npy')
+VENDORS_EMBED_MANIFEST = os.path.join(DATA_DIR, 'vendors_embeddings.manifest.json')
+VENDORS_EMBED_IVF = os.path.join(DATA_DIR, 'vendors_embeddings.ivf.npz')
+VENDORS_EMBED_CODES = os.path.join(DATA_DIR, 'vendors_embeddings.codes.npy')
+# vendors changed through /api/vendors since the last full build
+VENDORS_DELTA_NPY = os.path.join(DATA_DIR, 'vendors_embeddings.delta.npy')
+VENDORS_DELTA_MANIFEST = os.path.join(DATA_DIR, 'vendors_embeddings.delta.manifest.json')
+VENDORS_CHANGES_FILE = os.path.join(DATA_DIR, 'vendors_changes.jsonl')
+# approximate (IVF) retrieval only pays off for large catalogs; smaller ones stay exact
+ANN_MIN_VENDORS = int(os.getenv('VSP_ANN_MIN_VENDORS', '20000'))
+# 'float16', 'int8' or 'binary': score vendors through compact codes first and
+# rescore the best VSP_VECTOR_RESCORE of them from the float32 store
+VECTOR_CODES = os.getenv('VSP_VECTOR_CODES', '')
+VECTOR_RESCORE = int(os.getenv('VSP_VECTOR_RESCORE', '200'))
 VENDOR_AUDIT_FILE = os.path.join(DATA_DIR, 'selection_audit.json')
+AUDIT_DIR = os.path.join(DATA_DIR, 'audit')
+AUDIT_STATS_DB = os.path.join(DATA_DIR, 'audit_stats.db')
+PUBLIC_DIR = os.path.join(BASE_DIR, 'public')
+SCHEMAS_DIR = os.path.join(PUBLIC_DIR, 'formSchemas')
+FORM_SCHEMA_FILE = os.path.join(BASE_DIR, 'schema', 'form_schema.json')
+RFP_DIR = os.path.join(DATA_DIR, 'rfps')
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f)
+
+REQUESTS_PAGE_SIZE = int(os.getenv('VSP_REQUESTS_PAGE_SIZE', '50'))
+REQUESTS_MAX_PAGE_SIZE = int(os.getenv('VSP_REQUESTS_MAX_PAGE_SIZE', '500'))
+
+# uploads are streamed to disk and stored once per SHA-256
+upload_store = UploadStore(
+    UPLOAD_DIR,
+    max_file_bytes=int(float(os.getenv('VSP_UPLOAD_MAX_FILE_MB', '1024')) * 1024 * 1024),
+    max_request_bytes=int(float(os.getenv('VSP_UPLOAD_MAX_REQUEST_MB', '2048')) * 1024 * 1024),
+)
+
+# requests live in sqlite; an existing requests.json is imported once on first open
+request_store = RequestStore(REQUESTS_DB, legacy_json=DATA_FILE)
+
+# form schemas compiled into validators and one versioned bundle, recompiled when a
+# file changes; submitted requests are checked against them (VSP_FORM_STRICT=1 also
+# rejects fields no form defines)
+form_registry = FormRegistry(SCHEMAS_DIR, [FORM_SCHEMA_FILE])
+FORM_STRICT = os.getenv('VSP_FORM_STRICT') == '1'
 
 # Create a default vendors.json if not present
 if not os.path.exists(VENDORS_FILE):
@@ -48,189 +109,499 @@ if not os.path.exists(VENDORS_FILE):
             "Precision Analytics"
         ], f)
 
-# ensure an audit log file exists
-if not os.path.exists(VENDOR_AUDIT_FILE):
-    with open(VENDOR_AUDIT_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f)
-
-app = FastAPI(title='VSP Step1 - Python')
+# selection audit trail: append-only JSONL segments under data/audit/, written by a
+# background task; the old selection_audit.json history is imported once at startup
+audit_log = AuditLog(
+    AUDIT_DIR,
+    segment_bytes=int(os.getenv('VSP_AUDIT_SEGMENT_MB', '64')) * 1024 * 1024,
+    segment_seconds=float(os.getenv('VSP_AUDIT_SEGMENT_HOURS', '24')) * 3600,
+    fsync=os.getenv('VSP_AUDIT_FSYNC', '1') != '0',
+)
+# per-vendor / per-day / per-service aggregates and a record index, updated with
+# every group commit (see audit_stats.py); /api/audit/stats never scans the history
+audit_stats = AuditStats(AUDIT_STATS_DB, AUDIT_DIR)
+audit_log.on_commit = audit_stats.on_commit
+
+# query embeddings (keyed by model + normalized query) and LLM rerank results
+# (keyed by model, query, candidate set and catalog version); set
+# VSP_CACHE_DISK=1 to add a sqlite tier shared by all workers
+_cache_disk = DiskCache(os.path.join(DATA_DIR, 'cache.db'), ttl=float(os.getenv('VSP_CACHE_TTL', '3600'))) if os.getenv('VSP_CACHE_DISK') == '1' else None
+query_embed_cache = TieredCache('query_embedding', int(os.getenv('VSP_CACHE_SIZE', '1024')), float(os.getenv('VSP_CACHE_TTL', '3600')), _cache_disk)
+rerank_cache = TieredCache('rerank', int(os.getenv('VSP_CACHE_SIZE', '1024')), float(os.getenv('VSP_CACHE_TTL', '3600')), _cache_disk)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    audit_log.import_legacy(VENDOR_AUDIT_FILE)
+    await audit_log.start()
+    # catalog, indexes, vectors, static assets and the OpenAI client load in the
+    # background; requests are served meanwhile and /api/ready reports progress
+    warmup_task = asyncio.create_task(warm_up())
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        for task in (warmup_task, _embedding_build['task'], _embedding_sync['task']):
+            if task is not None:
+                task.cancel()
+        await job_queue.stop()
+        # flush queued audit records so nothing is lost on shutdown
+        await audit_log.stop()
+        await close_client()
+
+
+app = FastAPI(title='VSP Step1 - Python', lifespan=lifespan)
+
+# vendor catalog parsed once and indexed; reloaded only when the file changes, and
+# changes from /api/vendors are replayed from data/vendors_changes.jsonl; the log is
+# folded back into the catalog file past VSP_CATALOG_COMPACT_MB or once
+# VSP_CATALOG_COMPACT_RATIO of the catalog's ids are tombstones
+catalog_loader = CatalogLoader(VENDORS_CATALOG_FILE, fallback_names_path=VENDORS_FILE, changes_path=VENDORS_CHANGES_FILE,
+                               compact_bytes=int(float(os.getenv('VSP_CATALOG_COMPACT_MB', '32')) * (1 << 20)),
+                               compact_ratio=float(os.getenv('VSP_CATALOG_COMPACT_RATIO', '0.25')))
+
+# retrieval: 'hybrid' fuses embedding and BM25 rankings (reciprocal rank fusion),
+# 'embedding' / 'lexical' force one retriever; lexical is used whenever vectors are missing
+RETRIEVAL_MODE = os.getenv('VSP_RETRIEVAL_MODE', 'hybrid')
+RETRIEVAL_TOP_K = 20
+FUSION_DEPTH = int(os.getenv('VSP_FUSION_DEPTH', '100'))
+RRF_K = int(os.getenv('VSP_RRF_K', '60'))
+BATCH_MAX_ITEMS = int(os.getenv('VSP_BATCH_MAX_ITEMS', '1000'))
+# a selection gets VSP_SELECT_BUDGET_MS in total; the LLM rerank uses what is left and
+# the local ranking is served when it runs out. VSP_RERANK_ATTEMPTS > 1 retries failed
+# calls, VSP_RERANK_HEDGE_MS also starts a duplicate call when one is that slow
+SELECT_BUDGET = float(os.getenv('VSP_SELECT_BUDGET_MS', '10000')) / 1000.0
+RERANK_ATTEMPTS = max(1, int(os.getenv('VSP_RERANK_ATTEMPTS', '1')))
+RERANK_HEDGE = float(os.getenv('VSP_RERANK_HEDGE_MS', '0')) / 1000.0
+# after VSP_LLM_BREAKER_FAILURES consecutive failures or timeouts, skip the LLM for
+# VSP_LLM_BREAKER_COOLDOWN_S seconds (per worker process; 0 failures disables it)
+llm_breaker = CircuitBreaker('llm', threshold=int(os.getenv('VSP_LLM_BREAKER_FAILURES', '5')),
+                             cooldown=float(os.getenv('VSP_LLM_BREAKER_COOLDOWN_S', '30')))
+# identical /api/select_vendors bodies arriving while one is in flight share its
+# retrieval, rerank and audit record (VSP_SINGLE_FLIGHT=0 disables it);
+# VSP_SINGLE_FLIGHT_SHARED=1 also coalesces across workers via lock files
+SINGLE_FLIGHT = os.getenv('VSP_SINGLE_FLIGHT', '1') != '0'
+selection_flights = SingleFlight(os.path.join(DATA_DIR, 'flights') if os.getenv('VSP_SINGLE_FLIGHT_SHARED') == '1' else None,
+                                 max_wait=SELECT_BUDGET + 5)
+# lexical score = text * bm25 (scaled to the best match) + service/market/capacity boosts
+LEXICAL_WEIGHTS = {
+    'text': float(os.getenv('VSP_WEIGHT_TEXT', '40')),
+    'service': float(os.getenv('VSP_WEIGHT_SERVICE', '40')),
+    'market': float(os.getenv('VSP_WEIGHT_MARKET', '25')),
+    'capacity': float(os.getenv('VSP_WEIGHT_CAPACITY', '20')),
+}
 
 # allow the tiny demo to be used from any origin
 app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
 
-# mount static files (frontend) under /static to avoid shadowing /api routes
-# we'll still serve index.html at root with an explicit handler
-app.mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'public')), name='static')
-app.mount('/formSchemas', StaticFiles(directory=os.path.join(BASE_DIR, 'public', 'formSchemas')), name='formSchemas')
-app.mount('/uploads', StaticFiles(directory=UPLOAD_DIR), name='uploads')
-
-
-def read_all_requests():
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        # if file is missing/corrupt, return empty list rather than crashing
-        return []
+# per-stage timings (Server-Timing header + /metrics); VSP_PROFILE_SLOW_MS turns on
+# stack sampling and writes a profile for every request slower than that
+PROFILE_SLOW_MS = float(os.getenv('VSP_PROFILE_SLOW_MS', '0'))
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS / 1000.0, os.path.join(DATA_DIR, 'profiles')) if PROFILE_SLOW_MS > 0 else None
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+audit_log.on_batch = lambda count, seconds: AUDIT_FLUSH_SECONDS.observe(seconds)
+
+
+def _cache_events():
+    for name, cache in (('query_embedding', query_embed_cache), ('rerank', rerank_cache)):
+        for event, value in cache.counters.items():
+            yield (name, event), value
+
+
+registry.collector('vsp_cache_events_total', 'Cache lookups by outcome (memory_hits, disk_hits, misses) and invalidations.',
+                   'counter', ('cache', 'event'), _cache_events)
+registry.collector('vsp_cache_entries', 'Entries held in the in-memory cache tier.', 'gauge', ('cache',),
+                   lambda: [(('query_embedding',), len(query_embed_cache.memory)), (('rerank',), len(rerank_cache.memory))])
+registry.collector('vsp_circuit_state', 'Upstream circuit breaker state (0 closed, 1 open, 2 half-open).', 'gauge', ('upstream',),
+                   lambda: [((llm_breaker.name,), STATE_VALUES[llm_breaker.state])])
+registry.collector('vsp_circuit_opened_total', 'Times the upstream circuit breaker opened.', 'counter', ('upstream',),
+                   lambda: [((llm_breaker.name,), llm_breaker.opened)])
+registry.collector('vsp_single_flight_total', 'Selections by single-flight role: leaders ran the pipeline, coalesced joined one in flight, shared reused a result from another worker.',
+                   'counter', ('role',), lambda: [((role,), value) for role, value in selection_flights.counters.items()])
+registry.collector('vsp_single_flight_inflight', 'Selection pipelines currently in flight.', 'gauge', (),
+                   lambda: [((), len(selection_flights.flights))])
+
+# frontend, form schemas, RFPs and legacy uploads: ETag/304 validation and
+# precompressed gzip/brotli variants (see http_cache.py); files are served
+# under /static to avoid shadowing /api routes, index.html from an explicit handler
+static_assets = AssetDir(PUBLIC_DIR)
+# one RFP per request: served from disk by stat rather than held in memory
+rfp_assets = AssetDir(RFP_DIR, max_bytes=0)
+legacy_uploads = AssetDir(UPLOAD_DIR, max_bytes=0)
+_schema_listing = {'stamp': None, 'content': None}
+_schema_bundle = {'version': None}
+_index_page = {'key': None}
 
 
 def read_vendor_catalog():
-    try:
-        with open(VENDORS_CATALOG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        # fallback to simple vendor names list
-        try:
-            with open(VENDORS_FILE, 'r', encoding='utf-8') as f:
-                names = json.load(f)
-                return [{'name': n, 'description': n, 'services': [], 'countries': []} for n in names]
-        except Exception:
-            return []
+    return catalog_loader.get().live()
 
 
-def write_vendor_embeddings(mapping):
-    tmp = VENDORS_EMBED_FILE + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(mapping, f)
-    os.replace(tmp, VENDORS_EMBED_FILE)
+def write_vendor_embeddings(names, vectors, hashes=None):
+    save_store(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, names, vectors, embed_model(), hashes)
 
 
-def read_vendor_embeddings():
+def convert_legacy_embeddings():
+    """Convert data/vendors_embeddings.json into the binary store if that is all we have."""
+    if os.path.exists(VENDORS_EMBED_MANIFEST) or not os.path.exists(VENDORS_EMBED_FILE):
+        return False
     try:
-        with open(VENDORS_EMBED_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return None
+        convert_json_store(VENDORS_EMBED_FILE, VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST,
+                           embed_model(), read_vendor_catalog())
+        print('Converted', VENDORS_EMBED_FILE, 'to', VENDORS_EMBED_NPY)
+        return True
+    except Exception as e:
+        print('Embeddings conversion failed:', str(e))
+        return False
+
 
- 
 def write_audit(record):
-    a = []
-    try:
-        with open(VENDOR_AUDIT_FILE, 'r', encoding='utf-8') as f:
-            a = json.load(f)
-    except Exception:
-        a = []
-    a.append(record)
-    tmp = VENDOR_AUDIT_FILE + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        json.dump(a, f, indent=2, default=str)
-    os.replace(tmp, VENDOR_AUDIT_FILE)
+    # only enqueues; the background writer group-commits to data/audit/*.jsonl
+    audit_log.append(record)
+
+
+def write_audits(records):
+    # all records land in the same group commit
+    audit_log.append_many(records)
 
 
 async def get_embedding(text: str):
     """Return embedding vector for text using OpenAI if configured, otherwise None."""
-    if not openai or not os.getenv('OPENAI_API_KEY'):
+    if not embeddings_available():
         return None
-    model = os.getenv('OPENAI_EMBED_MODEL', 'text-embedding-3-small')
+    key = cache_key(embed_model(), normalize_text(text))
+    vec = await query_embed_cache.aget(key)
+    if vec is not None:
+        return vec
     try:
-        # OpenAI Embeddings API is blocking; call via thread
-        resp = await asyncio.to_thread(openai.Embeddings.create, model=model, input=text)
-        vec = resp['data'][0]['embedding']
+        vec = (await embed_texts([text]))[0]
+        await query_embed_cache.aset(key, vec)
         return vec
     except Exception as e:
+        UPSTREAM_ERRORS.inc(upstream='embeddings')
         print('Embedding failed:', str(e))
         return None
 
 
-def vector_cosine(a, b):
-    a = np.array(a, dtype=float)
-    b = np.array(b, dtype=float)
-    if a.size == 0 or b.size == 0:
-        return 0.0
-    denom = (np.linalg.norm(a) * np.linalg.norm(b))
-    if denom == 0:
-        return 0.0
-    return float(np.dot(a, b) / denom)
+def catalog_version():
+    """Token that changes whenever the vendor catalog or the embeddings store changes."""
+    stamps = []
+    for path in (VENDORS_EMBED_MANIFEST, VENDORS_DELTA_MANIFEST):
+        try:
+            st = os.stat(path)
+            stamps.append(f'{st.st_mtime_ns}:{st.st_size}')
+        except OSError:
+            stamps.append('-')
+    return f"{catalog_loader.get().version}|{'|'.join(stamps)}"
+
+
+async def get_embeddings(texts):
+    """Embed many query texts with one API call (cache-aware); None for any that failed."""
+    out = [None] * len(texts)
+    if not embeddings_available():
+        return out
+    keys = [cache_key(embed_model(), normalize_text(t)) for t in texts]
+    missing = {}
+    out = await query_embed_cache.aget_many(keys)
+    for i, key in enumerate(keys):
+        if out[i] is None:
+            missing.setdefault(key, []).append(i)
+    if missing:
+        todo = list(missing)
+        try:
+            # the embeddings API takes up to 2048 inputs per call
+            vecs = []
+            for j in range(0, len(todo), 2048):
+                vecs.extend(await embed_texts([texts[missing[k][0]] for k in todo[j:j + 2048]]))
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(upstream='embeddings')
+            print('Embedding failed:', str(e))
+            return out
+        for key, vec in zip(todo, vecs):
+            await query_embed_cache.aset(key, vec)
+            for i in missing[key]:
+                out[i] = vec
+    return out
+
+
+# memory-mapped vendor matrix, reopened only when the manifest changes; the delta
+# store (if any) is layered on top and reopened on its own when only it changes
+_vendor_matrix = {'mtime': None, 'base': None, 'delta_mtime': None, 'matrix': None}
+
 
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
-async def ensure_vendor_embeddings(force_refresh: bool = False):
-    """Ensure embeddings exist for vendor catalog; build them if missing and OpenAI present."""
-    emb = read_vendor_embeddings()
-    if emb and not force_refresh:
-        return emb
 
-    # Only attempt to build embeddings when OpenAI is available
-    if not openai or not os.getenv('OPENAI_API_KEY'):
+def open_delta_store(base):
+    """The delta VendorMatrix if it matches ``base``'s model and dimension, else None."""
+    delta = VendorMatrix.open(VENDORS_DELTA_NPY, VENDORS_DELTA_MANIFEST)
+    if delta is None or base is None or not len(delta):
         return None
+    if delta.manifest.get('model') != base.manifest.get('model') or delta.dim != base.dim:
+        return None
+    return delta
 
-    catalog = read_vendor_catalog()
-    mapping = {}
-    for v in catalog:
-        name = v.get('name')
-        # build a short text blob describing the vendor
-        blob = f"{name}. Services: {', '.join(v.get('services', []))}. Countries: {', '.join(v.get('countries', []))}. Description: {v.get('description', '')}"
-        vec = await get_embedding(blob)
-        if vec:
-            mapping[name] = vec
-    if mapping:
-        write_vendor_embeddings(mapping)
-        return mapping
-    return None
-
-
-def write_all_requests(data):
-    # write to a temp file then atomically replace to avoid partial writes
-    tmp = DATA_FILE + '.tmp'
-    with open(tmp, 'w', encoding='utf-8') as f:
-        # use default=str to avoid issues if some non-serializable types sneak in during demo
-        json.dump(data, f, indent=2, default=str)
-    os.replace(tmp, DATA_FILE)
 
+def load_vendor_matrix():
+    convert_legacy_embeddings()
+    mtime = _mtime(VENDORS_EMBED_MANIFEST)
+    if mtime is None:
+        return None
+    delta_mtime = _mtime(VENDORS_DELTA_MANIFEST)
+    if _vendor_matrix['mtime'] != mtime:
+        vm = VendorMatrix.open(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST)
+        if vm and len(vm) >= ANN_MIN_VENDORS:
+            vm.attach_ann(VENDORS_EMBED_IVF, nprobe=int(os.getenv('VSP_ANN_NPROBE', '8')))
+        if vm and VECTOR_CODES:
+            vm.attach_codes(VENDORS_EMBED_CODES, VECTOR_CODES, VECTOR_RESCORE)
+        _vendor_matrix['base'] = vm if vm and len(vm) else None
+        _vendor_matrix['mtime'] = mtime
+        _vendor_matrix['delta_mtime'] = False
+    if _vendor_matrix['delta_mtime'] != delta_mtime:
+        base = _vendor_matrix['base']
+        delta = open_delta_store(base) if delta_mtime is not None else None
+        _vendor_matrix['matrix'] = base.with_delta(delta) if base is not None else None
+        _vendor_matrix['delta_mtime'] = delta_mtime
+    return _vendor_matrix['matrix']
+
+
+def remove_delta_store():
+    # manifest first: readers key on it
+    for path in (VENDORS_DELTA_MANIFEST, VENDORS_DELTA_NPY):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-# --- AGENTIC VENDOR SELECTION ENDPOINT ---
-@app.post('/api/select_vendors')
-async def select_vendors(request: Request):
-    """
-    Accepts a completed request (JSON body) and returns 7-9 best vendors (placeholder AI logic).
-    """
-    try:
-        req_data = await request.json()
-    except Exception:
-        return JSONResponse({'error': 'Invalid JSON'}, status_code=400)
 
-    # Load vendor list
+async def rebuild_vendor_embeddings(force: bool = False):
+    """Incrementally (re)build the vendor embedding store; returns embedded/reused/failed counts."""
+    names, vectors, hashes, stats = await build_vendor_embeddings(
+        read_vendor_catalog(),
+        existing=load_vendor_matrix(),
+        batch_size=int(os.getenv('VSP_EMBED_BATCH_SIZE', '64')),
+        concurrency=int(os.getenv('VSP_EMBED_CONCURRENCY', '4')),
+        retries=int(os.getenv('VSP_EMBED_RETRIES', '3')),
+        force=force,
+    )
+    if names:
+        write_vendor_embeddings(names, vectors, hashes)
+        # the delta's vectors were reused above and are now part of the store
+        remove_delta_store()
+        # k-means over a large matrix is CPU-bound; keep it off the event loop
+        await asyncio.to_thread(build_ann_for_store, VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, VENDORS_EMBED_IVF,
+                                ANN_MIN_VENDORS, int(os.getenv('VSP_ANN_NLIST', '0')) or None)
+        if VECTOR_CODES:
+            await asyncio.to_thread(build_codes_for_store, VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, VENDORS_EMBED_CODES, VECTOR_CODES)
+    stats['count'] = len(names)
+    return stats
+
+
+# one embedding build at a time: a single background task per process, and a file
+# lock so several workers sharing data/ do not build the same store concurrently
+EMBED_BUILD_LOCK = os.path.join(DATA_DIR, 'vendors_embeddings.lock')
+EMBED_BUILD_RETRY_S = float(os.getenv('VSP_EMBED_BUILD_RETRY_S', '60'))
+_embedding_build = {'task': None, 'state': 'idle', 'started_at': None, 'finished_at': None, 'stats': None, 'error': None, 'retry_at': 0.0}
+
+
+def _lock_embedding_build():
+    fh = open(EMBED_BUILD_LOCK, 'a')
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+    return fh
+
+
+async def _run_embedding_build(force, if_missing):
+    b = _embedding_build
+    b.update(state='waiting', started_at=datetime.utcnow().isoformat() + 'Z', finished_at=None, error=None)
+    lock = await asyncio.to_thread(_lock_embedding_build)
+    b['state'] = 'building'
     try:
-        with open(VENDORS_FILE, 'r', encoding='utf-8') as f:
-            vendors = json.load(f)
-    except Exception:
-        vendors = []
+        vm = load_vendor_matrix() if if_missing else None
+        if vm is not None:
+            # another worker built the store while we waited for the lock
+            stats = {'embedded': 0, 'reused': len(vm), 'failed': 0, 'count': len(vm)}
+        else:
+            stats = await rebuild_vendor_embeddings(force)
+            # reopen the new store (and map catalog rows to it) before requests need it
+            await asyncio.to_thread(_warm_vectors)
+        if not stats['count']:
+            b['error'] = 'no embeddings built'
+    except Exception as e:
+        print('Embedding build failed:', str(e))
+        stats = {'embedded': 0, 'reused': 0, 'failed': 0, 'count': 0}
+        b['error'] = str(e)
+    finally:
+        lock.close()
+        b['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+    b['stats'] = stats
+    b['state'] = 'ready' if stats['count'] else 'failed'
+    if not stats['count']:
+        b['retry_at'] = time.monotonic() + EMBED_BUILD_RETRY_S
+    return stats
+
+
+def start_embedding_build(force=False, if_missing=False):
+    """Start the background embedding build unless one is already running; returns its task."""
+    task = _embedding_build['task']
+    if task is None or task.done():
+        task = _embedding_build['task'] = asyncio.create_task(_run_embedding_build(force, if_missing))
+    return task
+
+
+def ensure_vendor_embeddings():
+    """The vendor VendorMatrix, or None while there is none.
+
+    A missing store is built by the background task (failed builds are retried
+    after VSP_EMBED_BUILD_RETRY_S); until it is ready selection is lexical.
+    """
+    vm = load_vendor_matrix()
+    if vm is None and embeddings_available() and time.monotonic() >= _embedding_build['retry_at']:
+        start_embedding_build(if_missing=True)
+    return vm
+
+
+# vendors changed through /api/vendors are re-embedded in the background and written
+# to the delta store; past VSP_EMBED_DELTA_MAX rows a full build folds it into the store
+EMBED_DELTA_MAX = int(os.getenv('VSP_EMBED_DELTA_MAX', '5000'))
+_embedding_sync = {'pending': set(), 'task': None, 'stats': None}
+
+
+def schedule_embedding_sync(names):
+    """Queue vendors whose vectors may be stale; one background task works through them."""
+    _embedding_sync['pending'].update(names)
+    task = _embedding_sync['task']
+    if embeddings_available() and (task is None or task.done()):
+        _embedding_sync['task'] = asyncio.create_task(_run_embedding_sync())
 
-    # --- RAG retrieval + re-rank pipeline ---
-    catalog = read_vendor_catalog()
-
-    # deterministic pre-filtering: services and target markets
-    def matches_service(v, service_needed):
-        if not service_needed:
-            return True
-        sv = v.get('services', [])
-        # support matching case-insensitive variants
-        return any(service_needed.lower() in s.lower() or s.lower() in service_needed.lower() for s in sv)
-
-    def matches_market(v, target_markets):
-        if not target_markets:
-            return True
-        v_markets = [c.lower() for c in v.get('countries', [])]
-        for tm in (target_markets if isinstance(target_markets, list) else [target_markets]):
-            if any(tm.lower() in vm or vm in tm.lower() for vm in v_markets):
-                return True
-        return False
 
+async def _run_embedding_sync():
+    sync = _embedding_sync
+    while sync['pending']:
+        names, sync['pending'] = sync['pending'], set()
+        lock = await asyncio.to_thread(_lock_embedding_build)
+        fold = False
+        try:
+            vm = load_vendor_matrix()
+            if vm is None:
+                # no store yet: the full build embeds everything
+                continue
+            catalog = catalog_loader.get()
+            vendors = [v for v in map(catalog.vendor, sorted(names)) if v is not None]
+            new_names, vectors, hashes, stats = await build_vendor_embeddings(
+                vendors, existing=vm,
+                batch_size=int(os.getenv('VSP_EMBED_BATCH_SIZE', '64')),
+                concurrency=int(os.getenv('VSP_EMBED_CONCURRENCY', '4')),
+                retries=int(os.getenv('VSP_EMBED_RETRIES', '3')),
+            )
+            changed = {n: (vec, h) for n, vec, h in zip(new_names, vectors, hashes) if vm.hash_of(n) != h}
+            if changed:
+                # merge with the delta on disk (another worker may have written it) and drop deleted vendors
+                rows = {}
+                delta = open_delta_store(_vendor_matrix['base'])
+                if delta is not None:
+                    rows = {n: (delta.vector(n), delta.hash_of(n)) for n in delta.names if n in catalog.by_name}
+                rows.update(changed)
+                await asyncio.to_thread(save_store, VENDORS_DELTA_NPY, VENDORS_DELTA_MANIFEST, list(rows),
+                                        [v for v, _ in rows.values()], embed_model(), [h for _, h in rows.values()])
+                fold = len(rows) > EMBED_DELTA_MAX
+            stats['delta'] = len(changed)
+            sync['stats'] = stats
+        except Exception as e:
+            print('Embedding sync failed:', str(e))
+        finally:
+            lock.close()
+        await asyncio.to_thread(_warm_vectors)
+        if fold:
+            start_embedding_build()
+
+
+# startup warm-up progress, reported by /api/ready; _warming holds the step futures
+warmup = {'state': 'starting', 'started_at': None, 'ready_at': None, 'steps_ms': {}, 'errors': {}}
+_warming = {}
+
+
+def _warm_vectors():
+    vm = load_vendor_matrix()
+    if vm is not None and VECTOR_CODES and vm.codes is None:
+        # codes missing or built for an older store (or written after the store was opened)
+        if VectorCodes.load(VENDORS_EMBED_CODES, VECTOR_CODES, vm.manifest.get('matrix_sha256')) is None:
+            build_codes_for_store(VENDORS_EMBED_NPY, VENDORS_EMBED_MANIFEST, VENDORS_EMBED_CODES, VECTOR_CODES)
+        _vendor_matrix['mtime'] = None
+        vm = load_vendor_matrix()
+    if vm is not None:
+        catalog_loader.get().matrix_rows(vm)
+
+
+async def warm_up():
+    """Load the catalog and its indexes, the vector store, static assets and the OpenAI client once."""
+    warmup['started_at'] = datetime.utcnow().isoformat() + 'Z'
+    steps = [
+        # parsing the catalog and building BM25 / the inverted indexes are the slow parts
+        ('catalog', lambda: catalog_loader.get().bm25),
+        ('vectors', _warm_vectors),
+        ('static', static_assets.warm),
+        ('form_schemas', form_registry.get),
+        ('openai_client', get_client),
+        # segments not indexed yet: the imported legacy history, or records a crash kept from the index
+        ('audit_index', lambda: audit_stats.catch_up(audit_log.segments())),
+    ]
+    for name, fn in steps:
+        t = time.perf_counter()
+        try:
+            _warming[name] = asyncio.ensure_future(asyncio.to_thread(fn))
+            await _warming[name]
+        except Exception as e:
+            print(f'Warm-up step {name} failed:', str(e))
+            warmup['errors'][name] = str(e)
+        warmup['steps_ms'][name] = round((time.perf_counter() - t) * 1000, 1)
+    warmup['state'] = 'ready'
+    warmup['ready_at'] = datetime.utcnow().isoformat() + 'Z'
+    print('Warm-up finished:', warmup['steps_ms'])
+    ensure_vendor_embeddings()
+
+
+async def current_catalog():
+    """The vendor catalog; while the warm-up is still indexing it, wait for that instead of doing it again."""
+    pending = _warming.get('catalog')
+    if pending is not None and not pending.done():
+        try:
+            await asyncio.shield(pending)
+        except Exception:
+            pass  # reported by the warm-up; load it here instead
+    return catalog_loader.get()
+
+
+def lexical_scores(catalog, query_text, requested_service, requested_markets):
+    """BM25 relevance plus the configurable service/market/capacity boosts, for every vendor."""
+    w = LEXICAL_WEIGHTS
+    bm25 = catalog.text_scores(query_text)
+    best = float(bm25.max()) if bm25.size else 0.0
+    scores = w['text'] * (bm25 / best if best > 0 else bm25).astype(np.float64)
+    if requested_service:
+        scores += w['service'] * catalog.service_mask(requested_service)
+    if requested_markets:
+        scores += w['market'] * catalog.market_text_mask(requested_markets)
+    # normalize capacity into a small boost (1M units/month or more = full weight)
+    scores += w['capacity'] * np.minimum(1.0, np.maximum(catalog.capacity, 0) / 1000000)
+    return scores
+
+
+def plan_selection(req_data, catalog):
+    """Pull the service/market filters and the retrieval query text out of a request body."""
     requested_service = req_data.get('services_needed') or req_data.get('service')
     requested_markets = req_data.get('target_markets') or req_data.get('targetMarkets') or req_data.get('markets')
 
-    # candidate pool after filters (if any vendor must match service, otherwise all)
-    cand = []
-    for v in catalog:
-        if requested_service and not matches_service(v, requested_service):
-            continue
-        if requested_markets and not matches_market(v, requested_markets):
-            # allow vendors that don't match markets but keep them lower-ranked
-            pass
-        cand.append(v)
-
-    if not cand:
+    # deterministic pre-filtering on services via the inverted index; markets are
+    # not a hard filter (vendors outside them are only ranked lower)
+    cand_mask = catalog.service_mask(requested_service) if requested_service else catalog.all_mask()
+    if not cand_mask.any():
         # fallback to all catalog if no candidate matches
-        cand = catalog.copy()
+        cand_mask = catalog.all_mask()
 
     # Build a short query text from the request to retrieve via embeddings
     parts = []
@@ -243,280 +614,1109 @@ async def select_vendors(request: Request):
                 parts.append(str(v))
     query_text = '\n'.join(parts) or json.dumps(req_data)
 
-    # ensure vendor embeddings exist if OpenAI available
-    embeddings_map = await ensure_vendor_embeddings()
-
-    candidates = []
-    if embeddings_map:
-        # compute query embedding
-        qvec = await get_embedding(query_text)
-        if qvec:
-            for v in cand:
-                name = v.get('name')
-                vec = embeddings_map.get(name)
-                if not vec:
-                    continue
-                sim = vector_cosine(qvec, vec)
-                candidates.append({'vendor': v, 'score': float(sim)})
-            # sort desc
-            candidates.sort(key=lambda x: x['score'], reverse=True)
-    else:
-        # naive keyword scoring when embeddings unavailable
-        qlower = query_text.lower()
-        for v in cand:
-            score = 0
-            # service match
-            svs = [s.lower() for s in v.get('services', [])]
-            if requested_service and any(requested_service.lower() in s or s in requested_service.lower() for s in svs):
-                score += 40
-            # market match
-            vm = ' '.join(v.get('countries', [])).lower()
-            if requested_markets:
-                if isinstance(requested_markets, list):
-                    found = any(tm.lower() in vm for tm in requested_markets)
-                else:
-                    found = requested_markets.lower() in vm
-                if found:
-                    score += 25
-            # keyword match in description
-            desc = v.get('description', '').lower()
-            if any(word in qlower for word in desc.split()[:6]):
-                score += 15
-            # normalize capacity into a small boost
-            cap = v.get('capacity_per_month') or 0
-            if cap > 0:
-                score += min(20, (cap / 1000000) * 20)
-            candidates.append({'vendor': v, 'score': float(score)})
-        candidates.sort(key=lambda x: x['score'], reverse=True)
-
-    # keep top N as retrieval candidate set for re-ranking
-    retrieval_top = [c for c in candidates[:20]] if candidates else []
-
-    # Next: re-rank candidates with LLM (if available) using a concise candidates list to avoid token bloat
+    return {
+        'request': req_data,
+        'service': requested_service,
+        'markets': requested_markets,
+        'cand_mask': cand_mask,
+        'query_text': query_text,
+    }
+
+
+def use_embeddings(vendor_matrix):
+    return bool(vendor_matrix) and RETRIEVAL_MODE != 'lexical'
+
+
+def embedding_depth():
+    return RETRIEVAL_TOP_K if RETRIEVAL_MODE == 'embedding' else FUSION_DEPTH
+
+
+def embedding_mask(catalog, cand_mask, vendor_matrix):
+    """The catalog pre-filter translated into a row mask over the vendor matrix."""
+    rows = catalog.matrix_rows(vendor_matrix)[cand_mask]
+    mask = np.zeros(len(vendor_matrix), dtype=bool)
+    mask[rows[rows >= 0]] = True
+    return mask
+
+
+def retrieve(catalog, plan, emb_hits=None):
+    """Return (top candidates, retrieval method) for a plan.
+
+    ``emb_hits`` is the vendor matrix's [(name, cosine)] ranking of the
+    pre-filtered vendors, or None when no query vector is available.
+    """
+    cand_mask = plan['cand_mask']
+    if emb_hits is not None:
+        emb_hits = [(catalog.by_name[name], sim) for name, sim in emb_hits if name in catalog.by_name]
+        if RETRIEVAL_MODE == 'embedding':
+            return [{'vendor': catalog.vendors[i], 'score': sim} for i, sim in emb_hits[:RETRIEVAL_TOP_K]], 'embedding'
+
+    lex = lexical_scores(catalog, plan['query_text'], plan['service'], plan['markets'])
+    lex_top = top_ids(lex, np.flatnonzero(cand_mask), FUSION_DEPTH if emb_hits is not None else RETRIEVAL_TOP_K)
+    if emb_hits is None:
+        return [{'vendor': catalog.vendors[i], 'score': float(lex[i])} for i in lex_top], 'lexical'
+
+    fused = reciprocal_rank_fusion([[i for i, _ in emb_hits], lex_top.tolist()], RRF_K)
+    order = sorted(fused, key=lambda i: -fused[i])[:RETRIEVAL_TOP_K]
+    # report fused scores relative to the best possible (rank 1 in both lists)
+    best = 2.0 / (RRF_K + 1)
+    return [{'vendor': catalog.vendors[i], 'score': fused[i] / best} for i in order], 'hybrid'
+
+
+RERANK_KEYS = ('top_k', 'vendors', 'results')
+
+
+def rerank_items(top):
     final_list = []
-    used_llm = False
-    api_key = os.getenv('OPENAI_API_KEY')
-    model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
-    if api_key and openai and retrieval_top:
+    for v in top[:9]:
+        if isinstance(v, str):
+            final_list.append({'name': v})
+        elif isinstance(v, dict):
+            final_list.append({'name': v.get('name'), 'score': v.get('score'), 'reason': v.get('reason')})
+    return final_list
+
+
+def parse_rerank(txt):
+    """The ranked list from a complete LLM reply ([] if it has none; ValueError if it is not JSON)."""
+    parsed = None
+    try:
+        parsed = json.loads(txt)
+    except Exception:
+        # try to extract JSON substring
+        start = txt.find('{')
+        if start >= 0:
+            parsed = json.loads(txt[start:])
+    if isinstance(parsed, dict):
+        top = parsed.get('top_k') or parsed.get('vendors') or parsed.get('results')
+        if isinstance(top, list) and top:
+            return rerank_items(top)
+    return []
+
+
+def parse_partial_rerank(txt):
+    """The complete items of a ranked list that is still being streamed."""
+    start = -1
+    for key in RERANK_KEYS:
+        at = txt.find(f'"{key}"')
+        if at >= 0:
+            start = txt.find('[', at)
+            break
+    if start < 0:
+        return []
+    decoder = json.JSONDecoder()
+    items, pos = [], start + 1
+    while True:
+        while pos < len(txt) and txt[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(txt) or txt[pos] == ']':
+            break
         try:
-            openai.api_key = api_key
-            # build a concise candidate summary to include in the prompt
-            cand_summaries = []
-            for c in retrieval_top:
-                v = c['vendor']
-                cand_summaries.append({
-                    'name': v.get('name'),
-                    'services': v.get('services'),
-                    'countries': v.get('countries'),
-                    'short_description': v.get('description')[:300]
-                })
-
-            system = (
-                "You are a careful procurement assistant. Given a user request and a short list of candidate vendor profiles, produce a ranked top-7 to top-9 list. "
-                "Each returned item must be JSON object with: name (string), score (0-100 integer), reason (1-2 sentences). Return a single JSON object with key 'top_k'."
-            )
+            item, pos = decoder.raw_decode(txt, pos)
+        except ValueError:
+            # the item is not complete yet
+            break
+        items.append(item)
+    return rerank_items(items)
 
-            user_obj = {
-                'request_summary': query_text,
-                'candidates': cand_summaries,
-                'requirements_notes': 'Prioritize exact service match, regulatory coverage for target markets, capacity and track record. Keep output concise and factual.'
-            }
 
-            messages = [
-                {'role': 'system', 'content': system},
-                {'role': 'user', 'content': json.dumps(user_obj, indent=2, default=str)}
-            ]
+LLM_OUTCOMES = ('llm', 'cached')
 
-            resp = await asyncio.to_thread(openai.ChatCompletion.create, model=model, messages=messages, temperature=0.0, max_tokens=900)
-            txt = resp.choices[0].message.content
 
-            # parse JSON
-            parsed = None
-            try:
-                parsed = json.loads(txt)
-            except Exception:
-                # try to extract JSON substring
-                start = txt.find('{')
-                if start >= 0:
-                    parsed = json.loads(txt[start:])
-
-            if parsed:
-                top = parsed.get('top_k') or parsed.get('vendors') or parsed.get('results')
-                if isinstance(top, list) and top:
-                    used_llm = True
-                    for v in top[:9]:
-                        if isinstance(v, str):
-                            final_list.append({'name': v})
-                        else:
-                            final_list.append({'name': v.get('name'), 'score': v.get('score'), 'reason': v.get('reason')})
+async def llm_rerank(query_text, retrieval_top, on_partial=None, deadline=None):
+    """Re-rank the shortlist with the LLM; returns (final_list, outcome).
+
+    ``outcome`` is 'llm' or 'cached' when the list came from the model, else
+    why it did not: 'unavailable', 'circuit_open', 'timeout', 'error' or
+    'unparsed' (and the list is empty). The call must finish by ``deadline``
+    (a time.monotonic() value; default the selection budget from now).
 
+    With ``on_partial`` the completion is streamed and the callback gets the
+    ranked items parsed so far every time another one is complete.
+    """
+    model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+    if not (client_available() and retrieval_top):
+        return [], 'unavailable'
+
+    # identical resubmits (draft -> submit, retries) reuse the previous rerank
+    rerank_cache.ensure_version(catalog_version())
+    rerank_key = cache_key(model, normalize_text(query_text), sorted(c['vendor'].get('name') for c in retrieval_top), rerank_cache.version)
+    cached = await rerank_cache.aget(rerank_key)
+    if cached:
+        return cached, 'cached'
+
+    timeout = (deadline if deadline is not None else time.monotonic() + SELECT_BUDGET) - time.monotonic()
+    if timeout <= 0:
+        return [], 'timeout'
+    if not llm_breaker.allow():
+        return [], 'circuit_open'
+
+    succeeded = None
+    try:
+        # build a concise candidate summary to include in the prompt
+        cand_summaries = []
+        for c in retrieval_top:
+            v = c['vendor']
+            cand_summaries.append({
+                'name': v.get('name'),
+                'services': v.get('services'),
+                'countries': v.get('countries'),
+                'short_description': str(v.get('description') or '')[:300]
+            })
+
+        system = (
+            "You are a careful procurement assistant. Given a user request and a short list of candidate vendor profiles, produce a ranked top-7 to top-9 list. "
+            "Each returned item must be JSON object with: name (string), score (0-100 integer), reason (1-2 sentences). Return a single JSON object with key 'top_k'."
+        )
+
+        user_obj = {
+            'request_summary': query_text,
+            'candidates': cand_summaries,
+            'requirements_notes': 'Prioritize exact service match, regulatory coverage for target markets, capacity and track record. Keep output concise and factual.'
+        }
+
+        messages = [
+            {'role': 'system', 'content': system},
+            {'role': 'user', 'content': json.dumps(user_obj, indent=2, default=str)}
+        ]
+
+        # retries are governed by VSP_RERANK_ATTEMPTS inside the budget, not by the SDK
+        client = get_client().with_options(max_retries=0, timeout=timeout)
+
+        async def complete():
+            resp = await client.chat.completions.create(model=model, messages=messages, temperature=0.0, max_tokens=900)
+            return resp.choices[0].message.content
+
+        async def complete_streamed():
+            stream = await client.chat.completions.create(model=model, messages=messages, temperature=0.0, max_tokens=900, stream=True)
+            txt, seen = '', 0
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    txt += chunk.choices[0].delta.content or ''
+                    partial = parse_partial_rerank(txt)
+                    if len(partial) > seen:
+                        seen = len(partial)
+                        on_partial(partial)
+            finally:
+                # a cancelled or abandoned stream gives its connection back to the pool
+                await stream.close()
+            return txt
+
+        with stage('llm_rerank'):
+            if on_partial is None:
+                txt = await hedged(complete, timeout, RERANK_ATTEMPTS, RERANK_HEDGE)
+            else:
+                # two streams would interleave their partial lists: retry, never hedge
+                txt = await hedged(complete_streamed, timeout, RERANK_ATTEMPTS)
+    except asyncio.TimeoutError:
+        succeeded = False
+        print(f'Re-rank LLM call timed out after {timeout * 1000:.0f} ms; using local ranking')
+        return [], 'timeout'
+    except Exception as e:
+        succeeded = False
+        UPSTREAM_ERRORS.inc(upstream='llm')
+        print('Re-rank LLM call failed:', str(e))
+        return [], 'error'
+    else:
+        try:
+            with stage('rerank_parse'):
+                final_list = parse_rerank(txt or '')
         except Exception as e:
-            print('Re-rank LLM call failed:', str(e))
+            print('Re-rank LLM reply could not be parsed:', str(e))
+            final_list = []
+        # a reply without a usable list counts against the upstream like an error
+        succeeded = bool(final_list)
+    finally:
+        if succeeded is None:
+            # cancelled (client went away): no verdict on the upstream
+            llm_breaker.release()
+        elif succeeded:
+            llm_breaker.record_success()
+        else:
+            llm_breaker.record_failure()
 
-    # If LLM didn't produce a final list, fallback to the retrieval order + simple local reasons
     if not final_list:
-        for i, c in enumerate(retrieval_top[:9]):
-            v = c['vendor']
-            score = int(min(100, c['score'] * 100 if embeddings_map else c['score']))
-            reason = 'Matched requested services and markets' if matches_service(v, requested_service) else 'Partial match - review details'
-            final_list.append({'name': v.get('name'), 'score': score, 'reason': reason})
+        return [], 'unparsed'
+    await rerank_cache.aset(rerank_key, final_list)
+    return final_list, 'llm'
 
-    # Write an audit record for traceability
-    audit = {
+
+def local_rerank(retrieval_top, retrieval_method, requested_service):
+    """Retrieval order + simple local reasons, used when the LLM gives no list."""
+    final_list = []
+    for c in retrieval_top[:9]:
+        v = c['vendor']
+        # embedding/hybrid scores are in [0, 1], lexical scores are already on a 0-100 scale
+        score = int(min(100, c['score'] * 100 if retrieval_method != 'lexical' else c['score']))
+        reason = 'Matched requested services and markets' if matches_service(v, requested_service) else 'Partial match - review details'
+        final_list.append({'name': v.get('name'), 'score': score, 'reason': reason})
+    return final_list
+
+
+def selection_audit(plan, retrieval_top, retrieval_method, final_list, outcome):
+    # audit record for traceability
+    return {
         'createdAt': datetime.utcnow().isoformat() + 'Z',
-        'request': req_data,
+        'request': plan['request'],
         'retrieval_candidates': [ {'name': c['vendor'].get('name'), 'score': c['score']} for c in retrieval_top ],
         'final_selection': final_list,
-        'method': 'rag_retrieval' + (':llm_rerank' if used_llm else ':local_rerank')
+        'method': 'rag_retrieval' + (':llm_rerank' if outcome in LLM_OUTCOMES else ':local_rerank'),
+        'retrieval': retrieval_method,
+        'rerank_cached': outcome == 'cached',
+        'rerank_outcome': outcome
     }
-    write_audit(audit)
 
-    return {'vendors': final_list, 'audit': {'id': audit['createdAt'], 'method': audit['method']}}
+
+def count_rerank(outcome):
+    if outcome in LLM_OUTCOMES:
+        RERANKS.inc(method='llm_cached' if outcome == 'cached' else 'llm')
+    else:
+        RERANKS.inc(method='local')
+        RERANK_FALLBACKS.inc(reason=outcome)
 
 
-@app.get('/api/schemas')
-def list_schemas():
-    schemas_dir = os.path.join(BASE_DIR, 'public', 'formSchemas')
+def audit_summary(audit):
+    return {'id': audit['createdAt'], 'method': audit['method'], 'rerank': audit['rerank_outcome']}
+
+
+async def finish_selection(plan, retrieval_top, retrieval_method, deadline=None):
+    """Re-rank a retrieved shortlist; returns (response body, audit record)."""
+    # the local ranking is ready up front, served if the LLM fails or runs out of time
+    with stage('local_rerank'):
+        local = local_rerank(retrieval_top, retrieval_method, plan['service'])
+    # re-rank candidates with LLM (if available) using a concise candidates list to avoid token bloat
+    final_list, outcome = await llm_rerank(plan['query_text'], retrieval_top, deadline=deadline)
+    if outcome not in LLM_OUTCOMES:
+        final_list = local
+    count_rerank(outcome)
+
+    audit = selection_audit(plan, retrieval_top, retrieval_method, final_list, outcome)
+    return {'vendors': final_list, 'audit': audit_summary(audit)}, audit
+
+
+async def stream_selection(plan, retrieval_top, retrieval_method, deadline=None, annotate=None):
+    """NDJSON events for one selection: the retrieval shortlist, rerank progress, then the audit id.
+
+    ``annotate(audit)`` may add fields to the audit record before it is written.
+    """
+    with stage('local_rerank'):
+        local = local_rerank(retrieval_top, retrieval_method, plan['service'])
+    yield json.dumps({'event': 'retrieval', 'retrieval': retrieval_method, 'vendors': local}, default=str) + '\n'
+
+    partials = asyncio.Queue()
+    rerank = asyncio.create_task(llm_rerank(plan['query_text'], retrieval_top, on_partial=partials.put_nowait, deadline=deadline))
+    try:
+        while True:
+            while not partials.empty():
+                yield json.dumps({'event': 'rerank', 'partial': True, 'vendors': partials.get_nowait()}, default=str) + '\n'
+            if rerank.done():
+                break
+            getter = asyncio.ensure_future(partials.get())
+            await asyncio.wait({getter, rerank}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield json.dumps({'event': 'rerank', 'partial': True, 'vendors': getter.result()}, default=str) + '\n'
+            else:
+                getter.cancel()
+        final_list, outcome = rerank.result()
+    finally:
+        rerank.cancel()
+
+    if outcome in LLM_OUTCOMES:
+        yield json.dumps({'event': 'rerank', 'partial': False, 'cached': outcome == 'cached', 'vendors': final_list}, default=str) + '\n'
+    else:
+        final_list = local
+    count_rerank(outcome)
+
+    audit = selection_audit(plan, retrieval_top, retrieval_method, final_list, outcome)
+    if annotate is not None:
+        annotate(audit)
+    with stage('audit_write'):
+        write_audit(audit)
+    yield json.dumps({'event': 'done', 'vendors': final_list, 'audit': audit_summary(audit)}, default=str) + '\n'
+
+
+def wants_stream(request):
+    if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'application/x-ndjson' in request.headers.get('accept', '')
+
+
+# --- AGENTIC VENDOR SELECTION ENDPOINT ---
+@app.post('/api/select_vendors')
+async def select_vendors(request: Request):
+    """
+    Accepts a completed request (JSON body) and returns 7-9 best vendors (placeholder AI logic).
+
+    With ``?stream=1`` (or ``Accept: application/x-ndjson``) the response is
+    NDJSON: a ``retrieval`` event with the shortlist as soon as it is known,
+    ``rerank`` events as the LLM ranking arrives, and a final ``done`` event.
+
+    Identical bodies that arrive while one is being processed wait for it and
+    get the same result; its audit record carries the ``coalesced`` count.
+    That count covers this worker only: requests that other workers answer
+    from the shared result (VSP_SINGLE_FLIGHT_SHARED=1) count as ``shared``
+    in their own worker's metrics.
+    """
+    deadline = time.monotonic() + SELECT_BUDGET
     try:
-        files = [f for f in os.listdir(schemas_dir) if f.endswith('.json')]
-        return [{'id': os.path.splitext(f)[0], 'file': f'/formSchemas/{f}'} for f in files]
+        req_data = await request.json()
     except Exception:
-        return []
+        return JSONResponse({'error': 'Invalid JSON'}, status_code=400)
+
+    # --- RAG retrieval + re-rank pipeline ---
+    with stage('catalog'):
+        catalog = await current_catalog()
+    streaming = wants_stream(request)
+
+    # the audit record counts every request the pipeline run answered
+    async def select_events(flight):
+        plan, retrieval_top, retrieval_method = await retrieve_selection(req_data, catalog)
+        async for line in stream_selection(plan, retrieval_top, retrieval_method, deadline,
+                                           lambda audit: audit.update(coalesced=flight.waiters)):
+            yield line
+
+    async def select_once(flight):
+        plan, retrieval_top, retrieval_method = await retrieve_selection(req_data, catalog)
+        result, audit = await finish_selection(plan, retrieval_top, retrieval_method, deadline)
+        audit['coalesced'] = flight.waiters
+        with stage('audit_write'):
+            write_audit(audit)
+        return result
+
+    if not SINGLE_FLIGHT:
+        if streaming:
+            return StreamingResponse(select_events(Flight(None)), media_type='application/x-ndjson')
+        return await select_once(Flight(None))
+
+    # identical bodies against the same catalog share one in-flight run
+    key = request_key(req_data, catalog_version(), 'stream' if streaming else 'json')
+    if streaming:
+        return StreamingResponse(selection_flights.stream(key, select_events), media_type='application/x-ndjson')
+    return await selection_flights.run(key, select_once)
+
+
+async def retrieve_selection(req_data, catalog):
+    """Prefilter, embed the query and score; returns (plan, retrieval shortlist, retrieval method)."""
+    with stage('prefilter'):
+        plan = plan_selection(req_data, catalog)
+
+    # ensure vendor embeddings exist if OpenAI available
+    with stage('ensure_embeddings'):
+        vendor_matrix = ensure_vendor_embeddings()
+
+    emb_hits = None
+    if use_embeddings(vendor_matrix):
+        with stage('query_embedding'):
+            qvec = await get_embedding(plan['query_text'])
+        if qvec is not None:
+            with stage('scoring'):
+                emb_hits = vendor_matrix.top_k(qvec, embedding_depth(), embedding_mask(catalog, plan['cand_mask'], vendor_matrix))
+    with stage('retrieve'):
+        retrieval_top, retrieval_method = retrieve(catalog, plan, emb_hits)
+    return plan, retrieval_top, retrieval_method
+
+
+@app.post('/api/select_vendors/batch')
+async def select_vendors_batch(request: Request):
+    """Run vendor selection for many request bodies at once.
+
+    Body: a JSON list of request objects, or {"requests": [...]}. All queries
+    are embedded in one call and scored with one matrix-matrix product; LLM
+    reranks run concurrently (VSP_RERANK_CONCURRENCY). Results stream back as
+    NDJSON lines {"index": i, "vendors": [...], "audit": {...}} in completion
+    order, and all audit records are written in a single group commit.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse({'error': 'Invalid JSON'}, status_code=400)
+    items = body.get('requests') if isinstance(body, dict) else body
+    if not isinstance(items, list) or not all(isinstance(r, dict) for r in items):
+        return JSONResponse({'error': 'expected a list of request objects'}, status_code=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return JSONResponse({'error': f'at most {BATCH_MAX_ITEMS} requests per batch'}, status_code=413)
+
+    with stage('catalog'):
+        catalog = await current_catalog()
+    with stage('prefilter'):
+        plans = [plan_selection(r, catalog) for r in items]
+    with stage('ensure_embeddings'):
+        vendor_matrix = ensure_vendor_embeddings()
+
+    hits = [None] * len(plans)
+    if use_embeddings(vendor_matrix) and plans:
+        with stage('query_embedding'):
+            qvecs = await get_embeddings([p['query_text'] for p in plans])
+        with stage('scoring'):
+            masks = [embedding_mask(catalog, p['cand_mask'], vendor_matrix) for p in plans]
+            ranked = vendor_matrix.top_k_batch(qvecs, embedding_depth(), masks)
+        hits = [r if q is not None else None for r, q in zip(ranked, qvecs)]
+
+    batch_id = f"BATCH-{int(datetime.utcnow().timestamp()*1000)}"
+    sem = asyncio.Semaphore(int(os.getenv('VSP_RERANK_CONCURRENCY', '8')))
+
+    async def run_one(i):
+        with stage('retrieve'):
+            retrieval_top, retrieval_method = retrieve(catalog, plans[i], hits[i])
+        async with sem:
+            # each item's budget starts once it gets a rerank slot
+            result, audit = await finish_selection(plans[i], retrieval_top, retrieval_method, time.monotonic() + SELECT_BUDGET)
+        audit['batch'] = {'id': batch_id, 'index': i}
+        return i, result, audit
+
+    async def stream():
+        audits = []
+        tasks = [asyncio.create_task(run_one(i)) for i in range(len(plans))]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                try:
+                    i, result, audit = await fut
+                except Exception as e:
+                    yield json.dumps({'error': str(e)}) + '\n'
+                    continue
+                audits.append(audit)
+                yield json.dumps({'index': i, **result}, default=str) + '\n'
+            yield json.dumps({'done': True, 'batch_id': batch_id, 'count': len(audits)}) + '\n'
+        finally:
+            for t in tasks:
+                t.cancel()
+            with stage('audit_write'):
+                write_audits(audits)
+
+    return StreamingResponse(stream(), media_type='application/x-ndjson')
+
+
+@app.get('/metrics')
+def metrics():
+    return Response(registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.get('/api/cache/stats')
+def cache_stats():
+    return {'query_embedding': query_embed_cache.stats(), 'rerank': rerank_cache.stats()}
+
+
+def query_limit(qp, default=None):
+    """The ``limit`` query parameter as a positive int (``default`` if absent); FormError if malformed."""
+    if 'limit' not in qp:
+        return default
+    try:
+        limit = int(qp['limit'])
+    except ValueError:
+        raise FormError({'limit': 'must be an integer'})
+    if limit < 1:
+        raise FormError({'limit': 'must be positive'})
+    return limit
+
+
+def audit_facets(qp):
+    return [f'service:{s.strip().lower()}' for s in qp.getlist('service') if s.strip()] + \
+           [f'market:{m.strip().lower()}' for m in qp.getlist('market') if m.strip()]
+
+
+@app.get('/api/audit/stats')
+def get_audit_stats(request: Request):
+    """Selection analytics from the incrementally maintained aggregates.
+
+    Query: from / to (days, YYYY-MM-DD), service or market (one facet), vendor,
+    group (day, service, market, method, outcome or retrieval) and limit (top
+    vendors). Returns totals with the method mix and how often the rerank kept
+    retrieval's order, one row per group, and the most shortlisted vendors with
+    their rank distribution and mean retrieval-to-final rank change.
+    """
+    qp = request.query_params
+    facets = audit_facets(qp)
+    if len(facets) > 1:
+        return JSONResponse({'error': 'filter on at most one service or market'}, status_code=400)
+    try:
+        body = audit_stats.stats(day_from=qp.get('from'), day_to=qp.get('to'), facet=facets[0] if facets else ALL_FACETS,
+                                 vendor=qp.get('vendor'), group=qp.get('group', 'day'),
+                                 limit=min(query_limit(qp, 50), REQUESTS_MAX_PAGE_SIZE))
+    except FormError as e:
+        return JSONResponse({'error': str(e), 'fields': e.errors}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    pending = _warming.get('audit_index')
+    # until the startup catch-up is done, older segments may be missing from the numbers
+    body['complete'] = pending is not None and pending.done()
+    return body
+
+
+@app.get('/api/audit')
+def get_audit(request: Request):
+    """Audit records, newest first, a page at a time.
+
+    Filters: vendor (retrieved or selected), service / market (repeatable, all
+    must match), from / to (ISO timestamps), method (llm_rerank or
+    local_rerank). Pages are {"items": [...], "next_cursor": ...}.
+    """
+    qp = request.query_params
+    try:
+        limit = query_limit(qp, REQUESTS_PAGE_SIZE)
+        items, next_cursor = audit_stats.query(vendor=qp.get('vendor'), facets=audit_facets(qp), created_from=qp.get('from'),
+                                               created_to=qp.get('to'), method=qp.get('method'), cursor=qp.get('cursor'),
+                                               limit=min(limit, REQUESTS_MAX_PAGE_SIZE))
+    except FormError as e:
+        return JSONResponse({'error': str(e), 'fields': e.errors}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+@app.get('/api/schemas')
+def list_schemas(request: Request):
+    # relisted only when the directory changes (a schema added, removed or renamed)
+    try:
+        st = os.stat(SCHEMAS_DIR)
+        stamp = (st.st_mtime_ns, st.st_ino)
+    except OSError:
+        stamp = None
+    if stamp != _schema_listing['stamp'] or _schema_listing['content'] is None:
+        try:
+            files = sorted(f for f in os.listdir(SCHEMAS_DIR) if f.endswith('.json'))
+        except Exception:
+            files = []
+        content = json.dumps([{'id': os.path.splitext(f)[0], 'file': f'/formSchemas/{f}'} for f in files]).encode()
+        _schema_listing.update(stamp=stamp, content=content, etag='"' + hashlib.sha256(content).hexdigest()[:32] + '"',
+                               variants=compressed_variants(content, 'schemas.json'))
+    return cached_bytes_response(request, _schema_listing['content'], _schema_listing['etag'], 'application/json',
+                                 variants=_schema_listing['variants'])
+
+
+@app.get('/api/schemas/bundle')
+def get_schema_bundle(request: Request):
+    """The main form and every subform in one response, versioned by a hash of their content.
+
+    ``?v=<version>`` (the bundle's ``version``) makes it cacheable forever.
+    """
+    forms = form_registry.get()
+    if _schema_bundle.get('version') != forms.version:
+        _schema_bundle.update(version=forms.version, etag=f'"{forms.version}"',
+                              variants=compressed_variants(forms.bundle, 'bundle.json'))
+    v = request.query_params.get('v')
+    return cached_bytes_response(request, forms.bundle, _schema_bundle['etag'], 'application/json',
+                                 IMMUTABLE if v == forms.version else REVALIDATE, variants=_schema_bundle['variants'])
 
 
 @app.post('/api/rebuild_embeddings')
-async def rebuild_embeddings():
-    """Force rebuild embeddings for vendor catalog (requires OPENAI_API_KEY)."""
-    if not openai or not os.getenv('OPENAI_API_KEY'):
+async def rebuild_embeddings(full: bool = False):
+    """Rebuild embeddings for vendor catalog (requires OPENAI_API_KEY).
+
+    Only vendors whose profile changed are re-embedded unless ``full=true``.
+    Joins the background build if one is running (a full rebuild starts after it).
+    """
+    if not embeddings_available():
         return JSONResponse({'error': 'OpenAI not configured'}, status_code=400)
-    emb = await ensure_vendor_embeddings(force_refresh=True)
-    if emb:
-        return {'success': True, 'count': len(emb)}
-    return JSONResponse({'error': 'failed to build embeddings'}, status_code=500)
+    running = _embedding_build['task']
+    if full and running is not None and not running.done():
+        await asyncio.shield(running)
+    # shielded: a client that disconnects does not cancel the build
+    stats = await asyncio.shield(start_embedding_build(force=full))
+    if stats['count']:
+        return {'success': True, **stats}
+    return JSONResponse({'error': 'failed to build embeddings', **stats}, status_code=500)
+
+
+@app.get('/api/ready')
+def ready():
+    """Readiness: 503 until the startup warm-up finished, then 200.
+
+    Vectors are not required: without them selection is served lexically, and
+    ``retrieval`` / ``embeddings`` show whether a build is still running.
+    """
+    vm = load_vendor_matrix()
+    build = _embedding_build
+    body = {
+        'ready': warmup['state'] == 'ready',
+        'warmup': {k: v for k, v in warmup.items()},
+        'retrieval': RETRIEVAL_MODE if use_embeddings(vm) else 'lexical',
+        'embeddings': {
+            'vendors': len(vm) if vm is not None else 0,
+            'delta': vm.manifest.get('delta', 0) if vm is not None else 0,
+            'codes': vm.codes.kind if vm is not None and vm.codes is not None else None,
+            'build': {k: build[k] for k in ('state', 'started_at', 'finished_at', 'stats', 'error')},
+            'sync': {'pending': len(_embedding_sync['pending']), 'stats': _embedding_sync['stats']},
+        },
+    }
+    return JSONResponse(body, status_code=200 if body['ready'] else 503)
+
+
+# --- VENDOR CATALOG ENDPOINTS ---
+VENDOR_IMPORT_CHUNK = int(os.getenv('VSP_VENDOR_IMPORT_CHUNK', '1000'))
+VENDOR_STATUS_CODES = {'created': 201, 'updated': 200, 'deleted': 200, 'not_found': 404, 'conflict': 409}
+
+
+def vendor_op(item, op=None, name=None):
+    """A CatalogLoader.commit op from a request object; returns (op, error message)."""
+    if not isinstance(item, dict):
+        return None, 'expected a JSON object'
+    item = dict(item)
+    op = item.pop('op', None) or op or 'upsert'
+    version = item.pop('version', None)
+    item.pop('updatedAt', None)
+    if op not in ('upsert', 'patch', 'delete'):
+        return None, f'unknown op {op!r}'
+    if version is not None and (isinstance(version, bool) or not isinstance(version, int)):
+        return None, 'version must be an integer'
+    if name is not None and item.setdefault('name', name) != name:
+        return None, 'vendors cannot be renamed; delete and re-create instead'
+    if not isinstance(item.get('name'), str) or not item['name'].strip():
+        return None, 'name is required'
+    if op == 'upsert' and item.get('description') is None:
+        # prompts and text features read the description as a string
+        item['description'] = ''
+    error = validate_vendor(item, partial=op == 'patch') if op != 'delete' else None
+    if error:
+        return None, error
+    return {'op': op, 'name': item['name'], 'vendor': item, 'version': version}, None
+
+
+async def commit_vendor_ops(ops):
+    """Apply ops to the catalog (file I/O off the event loop) and queue re-embedding of changed vendors."""
+    results = await asyncio.to_thread(catalog_loader.commit, ops)
+    changed = [r['name'] for r in results if r['status'] in ('created', 'updated')]
+    if changed:
+        schedule_embedding_sync(changed)
+    return results
+
+
+async def vendor_response(op):
+    result = (await commit_vendor_ops([op]))[0]
+    body = {'success': result['status'] in ('created', 'updated', 'deleted'), **result}
+    if result['status'] in ('created', 'updated'):
+        body['vendor'] = catalog_loader.get().vendor(result['name'])
+    return JSONResponse(body, status_code=VENDOR_STATUS_CODES[result['status']])
+
+
+@app.get('/api/vendors/{name:path}')
+def get_vendor(name: str):
+    vendor = catalog_loader.get().vendor(name)
+    if vendor is None:
+        return JSONResponse({'error': 'Vendor not found'}, status_code=404)
+    return {'version': 0, **vendor}
+
+
+@app.post('/api/vendors')
+async def upsert_vendors(request: Request):
+    """Create or replace one vendor (an object) or several (a list) by name.
+
+    A ``version`` field makes the write conditional: it must be the vendor's
+    current version (0 for a new one) or nothing is written and 409 returned.
+    """
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse({'error': 'Invalid JSON'}, status_code=400)
+    items = body if isinstance(body, list) else [body]
+    ops = []
+    for i, item in enumerate(items):
+        op, error = vendor_op(item, op='upsert')
+        if error:
+            return JSONResponse({'error': error, 'index': i}, status_code=400)
+        ops.append(op)
+    if not isinstance(body, list):
+        return await vendor_response(ops[0])
+    results = await commit_vendor_ops(ops)
+    return {'success': all(r['status'] in ('created', 'updated') for r in results), 'results': results,
+            'catalog_version': catalog_version()}
+
+
+@app.patch('/api/vendors/{name:path}')
+async def patch_vendor(name: str, request: Request):
+    """Update some fields of a vendor; ``version`` works as for POST."""
+    try:
+        body = await request.json()
+    except Exception:
+        return JSONResponse({'error': 'Invalid JSON'}, status_code=400)
+    op, error = vendor_op(body, op='patch', name=name)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+    return await vendor_response(op)
+
+
+@app.delete('/api/vendors/{name:path}')
+async def delete_vendor(name: str, version: Optional[int] = None):
+    return await vendor_response({'op': 'delete', 'name': name, 'vendor': {}, 'version': version})
+
+
+@app.post('/api/vendors/import')
+async def import_vendors(request: Request):
+    """Apply a feed of vendor changes sent as NDJSON.
+
+    Each line is a vendor object (upserted), or carries ``"op": "patch"`` /
+    ``"op": "delete"`` with the vendor ``name``; ``version`` works as for POST.
+    Lines are committed in chunks of VSP_VENDOR_IMPORT_CHUNK as they arrive.
+    Malformed lines, conflicts and unknown vendors are reported by line number
+    and do not stop the import.
+    """
+    counts = {}
+    errors = []
+    pending = []  # (line number, op)
+
+    async def flush():
+        results = await commit_vendor_ops([op for _, op in pending])
+        for (line_no, _), r in zip(pending, results):
+            counts[r['status']] = counts.get(r['status'], 0) + 1
+            if r['status'] in ('conflict', 'not_found'):
+                errors.append({'line': line_no, **r})
+        pending.clear()
+
+    def parse(line_no, line):
+        if not line.strip():
+            return
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        op, error = vendor_op(item) if item is not None else (None, 'invalid JSON')
+        if error:
+            counts['invalid'] = counts.get('invalid', 0) + 1
+            errors.append({'line': line_no, 'status': 'invalid', 'error': error})
+        else:
+            pending.append((line_no, op))
+
+    line_no, buf = 0, b''
+    async for chunk in request.stream():
+        *lines, buf = (buf + chunk).split(b'\n')
+        for line in lines:
+            line_no += 1
+            parse(line_no, line)
+        if len(pending) >= VENDOR_IMPORT_CHUNK:
+            await flush()
+    if buf.strip():
+        parse(line_no + 1, buf)
+    if pending:
+        await flush()
+    return {'success': not errors, 'counts': counts, 'errors': errors[:100], 'error_count': len(errors),
+            'catalog_version': catalog_version()}
+
+
+def request_filters(qp):
+    """Listing filters from the query string (see RequestStore.page)."""
+    fields = [f.strip() for f in qp.get('fields', '').split(',') if f.strip()]
+    return {
+        'status': qp.get('status'),
+        'request_type': qp.get('request_type'),
+        'services': qp.getlist('services_needed'),
+        'created_from': qp.get('created_from'),
+        'created_to': qp.get('created_to'),
+        'q': qp.get('q'),
+        'fields': fields or None,
+        'cursor': qp.get('cursor'),
+        'newest_first': qp.get('order', 'desc') != 'asc',
+    }
 
 
 @app.get('/api/requests')
-def get_requests():
-    return read_all_requests()
+def get_requests(request: Request):
+    """List requests, newest first, a page at a time.
+
+    Filters: status, request_type, services_needed (repeatable), created_from /
+    created_to (ISO timestamps), q (full text). ``fields`` projects the entries
+    (e.g. ``fields=id,createdAt,status,body.projectName``). Pages are
+    {"items": [...], "next_cursor": ...}; pass ``cursor`` to continue. With
+    ``format=ndjson`` (or Accept: application/x-ndjson) every match is
+    streamed, one entry per line.
+    """
+    qp = request.query_params
+    filters = request_filters(qp)
+    try:
+        limit = query_limit(qp)
+        if qp.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('accept', ''):
+            rows = request_store.iter_rows(limit=limit, **filters)
+            # fail on bad filters now rather than halfway through the stream
+            first = next(rows, None)
+            body = ([first + '\n'] if first is not None else [])
+            return StreamingResponse(itertools.chain(body, (r + '\n' for r in rows)), media_type='application/x-ndjson')
+        rows, next_cursor = request_store.page(limit=min(limit or REQUESTS_PAGE_SIZE, REQUESTS_MAX_PAGE_SIZE), **filters)
+    except FormError as e:
+        return JSONResponse({'error': str(e), 'fields': e.errors}, status_code=400)
+    except (ValueError, sqlite3.OperationalError) as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    # rows are already JSON text; splice them instead of re-serializing
+    payload = '{"items": [' + ','.join(rows) + '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+    return Response(payload, media_type='application/json')
+
+
+@app.get('/api/requests/{request_id}')
+def get_request(request_id: str):
+    entry = request_store.get(request_id)
+    if entry is None:
+        return JSONResponse({'error': 'Request not found'}, status_code=404)
+    return entry
 
 
 @app.post('/api/requests')
 async def create_request(request: Request):
-    # Read form data generically; starlette's FormData exposes files as UploadFile objects
-    form = await request.form()
-    body = {}
-    # collect form values and files (handle single or multiple file parts)
-    saved_files = []
-    for key, value in form.multi_items():
-        # if this is a file field (has filename & file), save it
-        if getattr(value, 'filename', None):
-            f = value
-            safe_name = ''.join([c if c.isalnum() or c in '._-' else '_' for c in f.filename])
-            dest_name = f"{int(datetime.utcnow().timestamp()*1000)}_{safe_name}"
-            dest_path = os.path.join(UPLOAD_DIR, dest_name)
-            contents = await f.read()
-            with open(dest_path, 'wb') as out:
-                out.write(contents)
-            saved_files.append({'originalname': f.filename, 'path': f'/uploads/{dest_name}', 'size': os.path.getsize(dest_path)})
-        else:
-            # non-file form values (if multiple entries for same key we keep last value)
-            body[key] = value
+    # Stream the form: file parts go to the content-addressed upload store chunk by chunk
+    forms = form_registry.get()
 
-    data = read_all_requests()
+    def check_fields(fields):
+        # the fields before the first file: bad values are rejected before any upload is stored
+        forms.validate(dict(fields), partial=True, allow_unknown=not FORM_STRICT)
+
+    created = []
+    try:
+        fields, saved_files = await upload_store.parse_form(request, check_fields, created)
+    except UploadTooLarge as e:
+        return JSONResponse({'error': str(e)}, status_code=413)
+    except BadUpload as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except FormError as e:
+        return JSONResponse({'error': str(e), 'fields': e.errors}, status_code=400)
+    body = {}
+    for key, value in fields:
+        # non-file form values (if multiple entries for same key we keep last value)
+        body[key] = value
 
     # If originalId provided, update existing request instead of creating a new one
     original_id = body.pop('originalId', None) or body.pop('original_id', None)
     status = body.pop('status', None)
+    try:
+        # drafts may be incomplete; anything else needs every required field. The
+        # body is stored as submitted (checkbox lists stay JSON-encoded strings);
+        # the coerced values are only used for the checks
+        forms.validate(body, partial=True, allow_unknown=not FORM_STRICT)
+        if original_id:
+            existing = request_store.get(original_id)
+            if existing is None:
+                await asyncio.to_thread(upload_store.discard, created, request_store.uses_file)
+                return JSONResponse({'error': 'originalId not found'}, status_code=404)
+            missing = forms.missing({**existing.get('body', {}), **body})
+        else:
+            missing = forms.missing(body)
+        if missing and status != 'draft':
+            raise FormError({name: 'is required' for name in missing})
+    except FormError as e:
+        # files this rejected request added to the store
+        await asyncio.to_thread(upload_store.discard, created, request_store.uses_file)
+        return JSONResponse({'error': str(e), 'fields': e.errors}, status_code=400)
     if original_id:
-        # find entry
-        for e in data:
-            if e.get('id') == original_id:
-                # merge body (existing keys overwritten)
-                e_body = e.setdefault('body', {})
-                e_body.update(body)
-                # append any new files
-                if saved_files:
-                    e.setdefault('files', []).extend(saved_files)
-                # update status if provided
-                if status:
-                    e['status'] = status
-                e['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
-                write_all_requests(data)
-                return {'success': True, 'id': e['id'], 'entry': e}
-        # not found
-        return JSONResponse({'error': 'originalId not found'}, status_code=404)
-
-    new_id = f"REQ-{int(datetime.utcnow().timestamp()*1000)}"
-    entry = {'id': new_id, 'createdAt': datetime.utcnow().isoformat() + 'Z', 'body': body, 'files': saved_files}
-    if status:
-        entry['status'] = status
+        # merge body (existing keys overwritten), append new files, update status if provided
+        e = request_store.update(original_id, body, saved_files, status)
+        if e is None:
+            await asyncio.to_thread(upload_store.discard, created, request_store.uses_file)
+            return JSONResponse({'error': 'originalId not found'}, status_code=404)
+        return {'success': True, 'id': e['id'], 'entry': e}
+
+    entry = request_store.create(body, saved_files, status)
     # debug log for demo: show what we're saving
     print('create_request -> body keys:', list(body.keys()), 'files count:', len(saved_files))
-    data.append(entry)
-    write_all_requests(data)
-    return {'success': True, 'id': new_id, 'entry': entry}
+    return {'success': True, 'id': entry['id'], 'entry': entry}
 
 
 # --- RFP DOCUMENT GENERATION ENDPOINT ---
+# RFPs are rendered once per request body (see documents.py); an unchanged
+# request reuses its stored file
+rfp_store = RfpStore(RFP_DIR)
+
+
 @app.post('/api/generate_rfp/{request_id}')
 def generate_rfp(request_id: str):
     """Generate a simple RFP document (txt) from request data and return download link."""
-    data = read_all_requests()
-    req = next((r for r in data if r.get('id') == request_id), None)
+    req = request_store.get(request_id)
     if not req:
         return JSONResponse({'error': 'Request not found'}, status_code=404)
-    body = req.get('body', {})
-    # Compose RFP text
-    lines = [
-        f"Request for Proposal (RFP)",
-        f"Request ID: {request_id}",
-        f"Project Name: {body.get('projectName','')}",
-        f"Description: {body.get('description','')}",
-        f"Company: {body.get('company_name','')}",
-        f"Primary Contact: {body.get('primary_contact','')}",
-        f"Email: {body.get('email','')}",
-        f"Request Type: {body.get('request_type','')}",
-        f"Services Needed: {body.get('services_needed','')}",
-        f"Target Markets: {body.get('target_markets','')}",
-        f"Budget: {body.get('budget','')}",
-        f"Decision Deadline: {body.get('decisionDeadline','')}",
-        f"Additional Info: {body.get('additional_info','')}",
-        f"Key Criteria: {body.get('keyCriteria','')}",
-        '',
-        'Thank you for considering this RFP.'
-    ]
-    rfp_text = '\n'.join(lines)
-    # Save to file
-    rfp_dir = os.path.join(DATA_DIR, 'rfps')
-    os.makedirs(rfp_dir, exist_ok=True)
-    rfp_path = os.path.join(rfp_dir, f"{request_id}_rfp.txt")
-    with open(rfp_path, 'w', encoding='utf-8') as f:
-        f.write(rfp_text)
+    _, reused = rfp_store.ensure(request_id, req.get('body', {}))
     # Return download link (match frontend expected key)
-    return {'success': True, 'download_url': f"/data/rfps/{request_id}_rfp.txt"}
+    return {'success': True, 'download_url': rfp_store.url(request_id), 'reused': reused}
+
+
+# --- BACKGROUND JOBS: bulk RFPs and exports ---
+JOB_MAX_ITEMS = int(os.getenv('VSP_JOB_MAX_ITEMS', '10000'))
+JOB_CHUNK = int(os.getenv('VSP_JOB_CHUNK', '50'))
+
+
+def job_entries(job):
+    """The requests a job covers: ``ids`` or a listing ``filter`` (as /api/requests takes)."""
+    params = job.params
+    if params.get('ids'):
+        entries = []
+        for request_id in params['ids'][:JOB_MAX_ITEMS]:
+            e = request_store.get(request_id)
+            if e is None:
+                job.errors.append(f'{request_id}: not found')
+            else:
+                entries.append(e)
+        return entries
+    filters = dict(params.get('filter') or {})
+    if 'services_needed' in filters:
+        filters['services'] = filters.pop('services_needed')
+    if isinstance(filters.get('services'), str):
+        filters['services'] = [filters['services']]
+    filters = {k: v for k, v in filters.items() if k in ('status', 'request_type', 'services', 'created_from', 'created_to', 'q')}
+    return [json.loads(row) for row in request_store.iter_rows(limit=JOB_MAX_ITEMS, **filters)]
+
+
+async def ensure_rfps(job, entries):
+    """Render (or reuse) the RFP of every entry, JOB_CHUNK at a time; returns the reused count."""
+    reused = 0
+    job.progress(done=0, total=len(entries), stage='rfps')
+    for i in range(0, len(entries), JOB_CHUNK):
+        pairs = [(e['id'], e.get('body', {})) for e in entries[i:i + JOB_CHUNK]]
+        done = await job_queue.run_blocking(render_batch, RFP_DIR, pairs)
+        reused += sum(1 for _, r in done if r)
+        job.progress(advance=len(done))
+    return reused
+
+
+async def run_rfp_job(job):
+    entries = await asyncio.to_thread(job_entries, job)
+    reused = await ensure_rfps(job, entries)
+    job.result = {'count': len(entries), 'reused': reused, 'rendered': len(entries) - reused,
+                  'rfps': [{'id': e['id'], 'download_url': rfp_store.url(e['id'])} for e in entries]}
+
+
+def upload_path(f):
+    """Path on disk of an uploaded file, or None if it is gone."""
+    digest = f.get('sha256')
+    path = upload_store.path_for(digest) if is_sha256(digest or '') else \
+        os.path.join(UPLOAD_DIR, os.path.basename(f.get('path') or f.get('filename') or ''))
+    return path if os.path.isfile(path) else None
+
+
+def count_members(entries, missing):
+    return sum(1 for _ in export_members(((e, rfp_store.path(e['id'])) for e in entries), upload_path, missing))
+
+
+async def run_export_job(job):
+    """Prepare an export: render its RFPs and check its attachments; the zip is built while it downloads."""
+    entries = await asyncio.to_thread(job_entries, job)
+    reused = await ensure_rfps(job, entries)
+    job.progress(stage='attachments')
+    missing = []
+    members = await asyncio.to_thread(count_members, entries, missing)
+    job.errors.extend(f"{m['id']}: attachment {m['file']!r} is missing" for m in missing)
+    job.result = {'count': len(entries), 'reused': reused, 'members': members, 'ids': [e['id'] for e in entries],
+                  'download_url': f'/api/jobs/{job.id}/download'}
+
+
+def job_view(job):
+    # the owning pid stays server-side
+    return {k: v for k, v in job.items() if k != 'pid'}
+
+
+# bulk work runs on VSP_JOB_WORKERS asyncio workers; VSP_JOB_PROCESSES > 0 moves
+# RFP rendering into a process pool. Job state is kept as JSON under data/jobs/ so
+# any worker can answer a poll; finished jobs are removed after VSP_JOB_KEEP_HOURS
+job_queue = JobQueue(
+    JOBS_DIR,
+    {'rfp': run_rfp_job, 'export': run_export_job},
+    workers=int(os.getenv('VSP_JOB_WORKERS', '2')),
+    processes=int(os.getenv('VSP_JOB_PROCESSES', '0')),
+    keep_seconds=float(os.getenv('VSP_JOB_KEEP_HOURS', '24')) * 3600,
+)
+registry.collector('vsp_jobs_total', 'Background jobs by outcome (submitted, succeeded, failed).', 'counter', ('outcome',),
+                   lambda: [((k,), v) for k, v in job_queue.counters.items()])
+registry.collector('vsp_jobs_pending', 'Background jobs queued or running in this worker.', 'gauge', (),
+                   lambda: [((), job_queue.pending())])
+
+
+@app.post('/api/jobs')
+async def create_job(request: Request):
+    """Queue a bulk job: {"type": "rfp" | "export", "ids": [...]} or {"type": ..., "filter": {...}}."""
+    try:
+        params = await request.json()
+    except ValueError:
+        return JSONResponse({'error': 'expected a JSON body'}, status_code=400)
+    if not isinstance(params, dict):
+        return JSONResponse({'error': 'expected a JSON object'}, status_code=400)
+    ids, filters = params.get('ids'), params.get('filter')
+    if ids is not None and not (isinstance(ids, list) and all(isinstance(i, str) for i in ids)):
+        return JSONResponse({'error': 'ids must be a list of request ids'}, status_code=400)
+    if filters is not None and not isinstance(filters, dict):
+        return JSONResponse({'error': 'filter must be an object'}, status_code=400)
+    if not ids and filters is None:
+        return JSONResponse({'error': 'give ids or a filter ({} selects every request)'}, status_code=400)
+    try:
+        job = job_queue.submit(params.get('type'), {'ids': ids} if ids else {'filter': filters})
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    return JSONResponse({**job_view(job.to_dict()), 'status_url': f'/api/jobs/{job.id}'}, status_code=202)
+
+
+@app.get('/api/jobs/{job_id}')
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse({'error': 'job not found'}, status_code=404)
+    return job_view(job)
+
+
+@app.get('/api/jobs/{job_id}/download')
+def download_job(job_id: str):
+    """Stream a finished export job's zip.
+
+    The archive is never stored: it is zipped while it is sent, a member at a
+    time, from the requests the job selected. RFPs are the ones the job
+    rendered, re-rendered only if a request changed since.
+    """
+    job = job_queue.get(job_id)
+    if job is None or job.get('kind') != 'export':
+        return JSONResponse({'error': 'job not found'}, status_code=404)
+    if job.get('state') != 'succeeded':
+        return JSONResponse({'error': f"job is {job.get('state')}"}, status_code=409)
+
+    def entries():
+        for request_id in job['result'].get('ids') or []:
+            e = request_store.get(request_id)
+            if e is not None:
+                yield e, rfp_store.ensure(request_id, e.get('body', {}))[0]
+
+    return StreamingResponse(stream_export(export_members(entries(), upload_path)), media_type='application/zip',
+                             headers={'Content-Disposition': f'attachment; filename="export-{job_id}.zip"'})
 
 
 @app.get('/data/rfps/{filename}')
-def get_rfp_file(filename: str):
-    rfp_dir = os.path.join(DATA_DIR, 'rfps')
-    rfp_path = os.path.join(rfp_dir, filename)
-    if os.path.exists(rfp_path):
-        return FileResponse(rfp_path, media_type='text/plain', filename=filename)
+def get_rfp_file(filename: str, request: Request):
+    response = rfp_assets.response(request, filename, media_type='text/plain', filename=filename)
+    return response or JSONResponse({'error': 'not found'}, status_code=404)
+
+
+@app.get('/uploads/{digest}/{filename}')
+def get_stored_upload(digest: str, filename: str, request: Request):
+    path = upload_store.path_for(digest) if is_sha256(digest) else None
+    if path and os.path.exists(path):
+        # content-addressed: the URL changes whenever the bytes do
+        return immutable_file_response(request, path, digest, filename=filename)
     return JSONResponse({'error': 'not found'}, status_code=404)
 
 
 @app.get('/uploads/{filename}')
-def get_upload(filename: str):
-    path = os.path.join(UPLOAD_DIR, filename)
-    if os.path.exists(path):
-        return FileResponse(path)
-    return JSONResponse({'error': 'not found'}, status_code=404)
- 
-  
+def get_upload(filename: str, request: Request):
+    # files uploaded before content addressing
+    response = legacy_uploads.response(request, os.path.basename(filename))
+    return response or JSONResponse({'error': 'not found'}, status_code=404)
+
+
+@app.get('/static/{path:path}')
+def get_static(path: str, request: Request):
+    response = static_assets.response(request, path)
+    return response or JSONResponse({'error': 'not found'}, status_code=404)
+
+
+@app.get('/formSchemas/{path:path}')
+def get_form_schema(path: str, request: Request):
+    response = static_assets.response(request, os.path.join('formSchemas', path))
+    return response or JSONResponse({'error': 'not found'}, status_code=404)
+
+
 @app.get('/')
-def index():
-    index_file = os.path.join(BASE_DIR, 'public', 'index.html')
-    if os.path.exists(index_file):
-        return FileResponse(index_file, media_type='text/html')
-    return HTMLResponse('<html><body><h1>VSP Step34</h1></body></html>')
+def index(request: Request):
+    page = static_assets.asset('index.html')
+    if page is None:
+        return HTMLResponse('<html><body><h1>VSP Step34</h1></body></html>')
+    # point the page at versioned asset URLs so browsers can cache them forever
+    assets = ('app.js', 'style.css')
+    key = (page.etag,) + tuple(static_assets.etag(a) for a in assets)
+    if _index_page['key'] != key:
+        html = page.content.decode('utf-8')
+        for a in assets:
+            html = html.replace(f'"/static/{a}"', f'"{static_assets.versioned_url("/static", a)}"')
+        content = html.encode('utf-8')
+        _index_page.update(key=key, content=content, etag='"' + hashlib.sha256(content).hexdigest()[:32] + '"',
+                           variants=compressed_variants(content, 'index.html'))
+    return cached_bytes_response(request, _index_page['content'], _index_page['etag'], 'text/html; charset=utf-8',
+                                 variants=_index_page['variants'])
 
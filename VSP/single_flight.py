@@ -0,0 +1,208 @@
+"""Coalescing of concurrent identical requests ("single flight").
+
+``SingleFlight.run(key, fn)`` runs ``fn(flight)`` once per key at a time.
+Callers that arrive while it runs await the same task and get the same
+result. ``SingleFlight.stream(key, gen_fn)`` does the same for an async
+generator, and every subscriber receives all items from the first one. The
+work runs in its own task, so a caller that disconnects does not cancel it
+for the others. ``flight.waiters`` counts the callers served by it.
+
+With ``shared_dir`` the in-process leader also takes a per-key lock file.
+An identical request on another worker then waits for that result, which is
+stored next to the lock, instead of computing it again. Such requests are
+counted in the ``shared`` counter of their own worker; ``flight.waiters``
+only covers callers in the leader's process.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def request_key(body, *parts):
+    """Canonical hash of a JSON body plus any extra key parts (e.g. catalog version)."""
+    canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    h = hashlib.sha256(canonical.encode('utf-8'))
+    for p in parts:
+        h.update(b'\0' + str(p).encode('utf-8'))
+    return h.hexdigest()
+
+
+class Flight:
+    def __init__(self, key):
+        self.key = key
+        self.waiters = 1
+        self.items = []
+        self.finished = False
+        self.task = None
+        self.changed = asyncio.Event()
+
+    def publish(self, item=None, finished=False):
+        if item is not None:
+            self.items.append(item)
+        self.finished = self.finished or finished
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    def __init__(self, shared_dir=None, poll=0.05, max_wait=60.0, keep_files=300.0):
+        self.flights = {}
+        self.shared_dir = shared_dir if fcntl is not None else None
+        self.poll = poll
+        self.max_wait = max_wait
+        self.keep_files = keep_files
+        self.counters = {'leaders': 0, 'coalesced': 0, 'shared': 0}
+        self._swept = 0.0
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def _join(self, key, lead):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = Flight(key)
+            flight.task = asyncio.create_task(self._lead(flight, lead))
+            # every caller may have gone away; don't log the error as never retrieved
+            flight.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            flight.waiters += 1
+            self.counters['coalesced'] += 1
+        return flight
+
+    async def run(self, key, fn):
+        """The result of ``fn(flight)``, shared with concurrent callers of the same key."""
+        async def lead(flight):
+            return await fn(flight)
+        return await asyncio.shield(self._join(key, lead).task)
+
+    async def stream(self, key, gen_fn):
+        """Every item of ``gen_fn(flight)``; concurrent callers of the same key share one run."""
+        async def lead(flight):
+            async for item in gen_fn(flight):
+                flight.publish(item)
+            return flight.items
+
+        flight = self._join(key, lead)
+        i = 0
+        while True:
+            changed = flight.changed
+            while i < len(flight.items):
+                yield flight.items[i]
+                i += 1
+            if flight.finished:
+                break
+            await changed.wait()
+        # surface the leader's error (if any) to every subscriber
+        await asyncio.shield(flight.task)
+
+    async def _lead(self, flight, lead):
+        lock = None
+        try:
+            if self.shared_dir:
+                lock, stored = await self._shared_lock(flight.key)
+                if stored is not None:
+                    self.counters['shared'] += 1
+                    value = stored['value']
+                    if isinstance(value, list):
+                        for item in value:
+                            flight.publish(item)
+                    return value
+            self.counters['leaders'] += 1
+            value = await lead(flight)
+            if lock is not None:
+                self._store(flight.key, value)
+            return value
+        finally:
+            if lock is not None:
+                lock.close()
+            flight.publish(finished=True)
+            self.flights.pop(flight.key, None)
+
+    # --- cross-worker coordination ---
+
+    def _path(self, key, ext):
+        return os.path.join(self.shared_dir, key + ext)
+
+    async def _shared_lock(self, key):
+        """(open lock file, None) when this worker leads, else (None, stored result) once another worker finished."""
+        self._sweep()
+        path = self._path(key, '.lock')
+        fh = open(path, 'a')
+        started, waited = time.time(), False
+        while True:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if self._same_file(fh, path):
+                    break
+                # swept while we waited: the others lock the new file now
+                fh.close()
+                fh = open(path, 'a')
+                continue
+            except BlockingIOError:
+                waited = True
+                if time.time() - started > self.max_wait:
+                    # the other worker is stuck; compute it here without the lock
+                    fh.close()
+                    return None, None
+                await asyncio.sleep(self.poll)
+        if waited:
+            try:
+                path = self._path(key, '.json')
+                if os.stat(path).st_mtime >= started - 1:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        stored = json.load(f)
+                    fh.close()
+                    return None, stored
+            except (OSError, ValueError):
+                pass  # the leader failed; run it ourselves while holding the lock
+        return fh, None
+
+    def _store(self, key, value):
+        path = self._path(key, '.json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'value': value}, f, default=str)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            print('Single-flight result not shared:', str(e))
+
+    @staticmethod
+    def _same_file(fh, path):
+        try:
+            return os.stat(path).st_ino == os.fstat(fh.fileno()).st_ino
+        except OSError:
+            return False
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._swept < 60:
+            return
+        self._swept = now
+        try:
+            for name in os.listdir(self.shared_dir):
+                path = os.path.join(self.shared_dir, name)
+                try:
+                    if now - os.stat(path).st_mtime <= self.keep_files:
+                        continue
+                    if not name.endswith('.lock'):
+                        os.unlink(path)
+                        continue
+                    # a lock file goes only while nobody holds it; a worker that
+                    # opened it meanwhile notices the unlink and reopens it
+                    with open(path, 'a') as fh:
+                        try:
+                            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except BlockingIOError:
+                            continue
+                        os.unlink(path)
+                except OSError:
+                    pass
+        except OSError:
+            pass
@@ -0,0 +1,61 @@
+import os
+import json
+import asyncio
+
+from audit_log import AuditLog, LEGACY_SEGMENT
+
+
+def test_legacy_import_runs_once(tmp_path):
+    legacy = tmp_path / 'selection_audit.json'
+    legacy.write_text(json.dumps([{'n': 1}, {'n': 2}]))
+    log = AuditLog(str(tmp_path / 'audit'), fsync=False)
+    assert log.import_legacy(str(legacy)) == 2
+    assert log.import_legacy(str(legacy)) == 0
+    assert AuditLog(str(tmp_path / 'audit')).import_legacy(str(legacy)) == 0
+    assert [r['n'] for r in log.iter_records()] == [1, 2]
+    assert os.path.basename(log.segments()[0]) == LEGACY_SEGMENT
+
+
+def test_unreadable_legacy_file_is_retried(tmp_path):
+    legacy = tmp_path / 'selection_audit.json'
+    legacy.write_text('[{"n": 1}, {"n"')
+    log = AuditLog(str(tmp_path / 'audit'), fsync=False)
+    assert log.import_legacy(str(legacy)) == 0
+    assert not os.path.exists(tmp_path / 'audit' / '.legacy_imported')
+    assert log.segments() == []
+    legacy.write_text(json.dumps([{'n': 1}]))
+    assert log.import_legacy(str(legacy)) == 1
+    assert log.import_legacy(str(tmp_path / 'missing.json')) == 0
+
+
+def test_stop_flushes_queued_records(tmp_path):
+    log = AuditLog(str(tmp_path), fsync=False, batch_size=3)
+    batches, commits = [], []
+    log.on_batch = lambda count, seconds: batches.append(count)
+    log.on_commit = lambda path, offset, records, sizes: commits.append((offset, len(records), sum(sizes)))
+
+    async def main():
+        await log.start()
+        for i in range(5):
+            log.append({'n': i})
+        log.append_many([{'n': 5}, {'n': 6}])
+        await log.stop()
+
+    asyncio.run(main())
+    assert [r['n'] for r in log.iter_records()] == list(range(7))
+    # group commits of up to batch_size records (a list is never split)
+    assert sum(batches) == 7 and len(batches) < 7
+    # each commit starts where the previous one ended
+    offsets = [c[0] for c in commits]
+    assert offsets == [0] + [sum(c[2] for c in commits[:i]) for i in range(1, len(commits))]
+
+
+def test_without_a_writer_records_are_written_at_once(tmp_path):
+    log = AuditLog(str(tmp_path), fsync=False)
+    log.append({'n': 1})
+    log.append_many([])
+    with open(log.segments()[0], 'a', encoding='utf-8') as f:
+        # a torn line from a crash is skipped when reading
+        f.write('{"n": ')
+    assert list(log.iter_records()) == [{'n': 1}]
+
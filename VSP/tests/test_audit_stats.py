@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from audit_log import AuditLog
+from audit_stats import AuditStats, ALL, GROUPS, record_facets
+
+VENDORS = [f'Vendor {c}' for c in 'ABCDEFGH']
+
+
+def selection(rng, i):
+    retrieved = rng.sample(VENDORS, 6)
+    final = retrieved[:3] if rng.random() < 0.5 else rng.sample(retrieved, 3)
+    llm = rng.random() < 0.6
+    return {
+        'createdAt': f'2026-03-{1 + i % 5:02d}T10:00:{i % 60:02d}.{i:06d}Z',
+        'request': {'services_needed': rng.choice(['["Packaging"]', ['Manufacturing', 'Packaging'], 'Testing']),
+                    'target_markets': rng.choice([['US'], '["EU", "Japan"]', None])},
+        'retrieval_candidates': [{'name': n, 'score': 1 - j / 10} for j, n in enumerate(retrieved)],
+        'final_selection': [{'name': n} for n in final],
+        'method': 'rag_retrieval:' + ('llm_rerank' if llm else 'local_rerank'),
+        'rerank_outcome': 'llm' if llm else rng.choice(['timeout', 'unavailable']),
+        'retrieval': rng.choice(['embedding', 'lexical']),
+        'coalesced': rng.choice([1, 1, 2]),
+    }
+
+
+def all_stats(stats):
+    out = []
+    for facet in (ALL, 'service:packaging', 'market:eu'):
+        for group in GROUPS:
+            if group in ('service', 'market') and facet != ALL:
+                continue
+            out.append(stats.stats(facet=facet, group=group, limit=20))
+            if group not in ('outcome', 'retrieval'):
+                out.append(stats.stats(facet=facet, group=group, vendor='Vendor C'))
+    out.append(stats.stats(day_from='2026-03-02', day_to='2026-03-03'))
+    return out
+
+
+@pytest.fixture
+def written(tmp_path):
+    """120 selections written in batches through the log, indexed as they are committed."""
+    rng = random.Random(3)
+    records = [selection(rng, i) for i in range(120)]
+    log = AuditLog(str(tmp_path / 'audit'), fsync=False)
+    stats = AuditStats(str(tmp_path / 'live.db'), log.directory)
+    log.on_commit = stats.on_commit
+    i = 0
+    while i < len(records):
+        n = rng.randint(1, 9)
+        log.write_batch(records[i:i + n])
+        i += n
+    return log, stats, records
+
+
+def test_incremental_stats_match_a_full_recompute(written, tmp_path):
+    log, live, records = written
+    rebuilt = AuditStats(str(tmp_path / 'rebuilt.db'), log.directory)
+    assert rebuilt.catch_up(log.segments()) == len(records)
+    assert live.catch_up(log.segments()) == 0
+    assert all_stats(live) == all_stats(rebuilt)
+
+    totals = live.stats()['totals']
+    assert totals['selections'] == len(records)
+    assert totals['requests'] == sum(r['coalesced'] for r in records)
+    top1 = sum(r['final_selection'][0]['name'] == r['retrieval_candidates'][0]['name'] for r in records)
+    assert totals['top1_agreement'] == round(top1 / len(records), 4)
+    packaging = live.stats(facet='service:packaging')['totals']['selections']
+    assert packaging == sum('service:packaging' in record_facets(r) for r in records)
+
+
+def test_missed_batches_and_torn_lines_are_caught_up(written, tmp_path):
+    log, live, records = written
+    log.on_commit = None
+    log.write_batch([selection(random.Random(9), 200)])
+    with open(log.segments()[-1], 'ab') as f:
+        f.write(b'{"createdAt": "2026-03-0')
+    assert live.indexed() == len(records)
+    # catch-up indexes the missed batch; the torn line waits for its newline
+    assert live.catch_up(log.segments()) == 1
+    with open(log.segments()[-1], 'ab') as f:
+        f.write(b'1T00:00:00Z"}\n')
+    assert live.catch_up(log.segments()) == 1
+    rebuilt = AuditStats(str(tmp_path / 'rebuilt.db'), log.directory)
+    rebuilt.catch_up(log.segments())
+    assert all_stats(live) == all_stats(rebuilt)
+
+
+def test_query_reads_matching_records_a_page_at_a_time(written):
+    log, live, records = written
+    expected = sorted((r for r in records if any(c['name'] == 'Vendor C' for c in r['retrieval_candidates'])
+                       and 'market:us' in record_facets(r)), key=lambda r: r['createdAt'], reverse=True)
+    got, cursor = [], None
+    while True:
+        page, cursor = live.query(vendor='Vendor C', facets=['market:us'], cursor=cursor, limit=4)
+        got.extend(page)
+        if cursor is None:
+            break
+    assert got == expected
+    local = live.query(method='local_rerank', created_from='2026-03-02', created_to='2026-03-02', limit=500)[0]
+    assert local and all(r['method'].endswith('local_rerank') and r['createdAt'].startswith('2026-03-02') for r in local)
+    with pytest.raises(ValueError):
+        live.stats(group='weekday')
@@ -0,0 +1,84 @@
+import time
+import asyncio
+import sqlite3
+
+from cache import LRUCache, DiskCache, TieredCache, cache_key, normalize_text
+
+
+def test_keys_normalize_the_query():
+    assert normalize_text('  Sterile   FILL\nfinish ') == 'sterile fill finish'
+    assert cache_key('m', normalize_text('A  b')) == cache_key('m', normalize_text('a b'))
+    assert cache_key('m', 'a') != cache_key('m2', 'a')
+
+
+def test_lru_evicts_and_expires(monkeypatch):
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # b was the least recently used
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert cache.get('a') is None and len(cache) == 1
+
+
+def test_disk_entries_expire_and_are_purged(tmp_path, monkeypatch):
+    disk = DiskCache(str(tmp_path / 'cache.db'), ttl=10, purge_interval=0)
+    disk.set('ns', 'old', [1, 2])
+    assert disk.get('ns', 'old') == [1, 2]
+    assert disk.get('other', 'old') is None
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert disk.get('ns', 'old') is None
+    # the next write purges the expired row
+    disk.set('ns', 'new', 'v')
+    rows = sqlite3.connect(str(tmp_path / 'cache.db')).execute('SELECT key FROM cache').fetchall()
+    assert rows == [('new',)]
+    assert disk.purge() == 0
+
+
+def test_tiers_and_counters(tmp_path):
+    disk = DiskCache(str(tmp_path / 'cache.db'))
+    writer = TieredCache('rerank', disk=disk)
+    reader = TieredCache('rerank', disk=disk)
+    writer.set('k', {'top': ['A']})
+    assert writer.get('k') == {'top': ['A']}
+    # another worker finds it on disk, then in its own memory
+    assert reader.get('k') == {'top': ['A']}
+    assert reader.get('k') == {'top': ['A']}
+    assert reader.get('missing') is None
+    assert reader.counters == {'memory_hits': 1, 'disk_hits': 1, 'misses': 1, 'invalidations': 0}
+    assert reader.stats()['hit_rate'] == round(2 / 3, 4)
+
+    reader.ensure_version('v1')
+    reader.ensure_version('v2')
+    assert reader.counters['invalidations'] == 1 and len(reader.memory) == 0
+
+
+def test_async_access_matches_sync(tmp_path):
+    disk = DiskCache(str(tmp_path / 'cache.db'))
+    TieredCache('emb', disk=disk).set('a', [0.1])
+    cache = TieredCache('emb', disk=disk)
+
+    async def main():
+        await cache.aset('b', [0.2])
+        return await cache.aget_many(['a', 'b', 'c']), await cache.aget('a')
+
+    assert asyncio.run(main()) == ([[0.1], [0.2], None], [0.1])
+    assert cache.counters == {'memory_hits': 2, 'disk_hits': 1, 'misses': 1, 'invalidations': 0}
+
+
+def test_a_broken_disk_tier_misses(tmp_path):
+    class Broken:
+        def get(self, ns, key, *value):
+            raise sqlite3.OperationalError('database is locked')
+
+        set = get
+
+    cache = TieredCache('emb', disk=Broken())
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert asyncio.run(cache.aget_many(['b'])) == [None]
@@ -0,0 +1,38 @@
+import io
+import json
+import zipfile
+
+from documents import RfpStore, export_members, stream_export
+
+
+def test_rfps_are_reused_until_the_body_changes(tmp_path):
+    store = RfpStore(str(tmp_path))
+    path, reused = store.ensure('REQ-1', {'projectName': 'Demo'})
+    assert not reused and 'REQ-1' in open(path, encoding='utf-8').read()
+    assert store.ensure('REQ-1', {'projectName': 'Demo'}) == (path, True)
+    assert store.ensure('REQ-1', {'projectName': 'Renamed'}) == (path, False)
+
+
+def test_streamed_export_is_a_valid_zip(tmp_path):
+    rfp = tmp_path / 'rfp.txt'
+    rfp.write_text('RFP\n' * 1000)
+    scan = tmp_path / 'scan.pdf'
+    scan.write_bytes(bytes(range(256)) * 8192)
+    entry = {'id': 'REQ-1', 'files': [
+        {'originalname': 'scan.pdf', 'path': str(scan)},
+        {'originalname': 'scan.pdf', 'path': str(scan)},
+        {'originalname': 'gone.doc', 'path': None},
+    ]}
+    missing = []
+    members = export_members([(entry, str(rfp))], lambda f: f['path'], missing)
+    chunks = list(stream_export(members))
+    assert len(chunks) > 2
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['REQ-1/rfp.txt', 'REQ-1/request.json', 'REQ-1/files/scan.pdf', 'REQ-1/files/scan (2).pdf']
+        assert zf.getinfo('REQ-1/files/scan.pdf').compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo('REQ-1/rfp.txt').compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read('REQ-1/files/scan (2).pdf') == scan.read_bytes()
+        assert json.loads(zf.read('REQ-1/request.json'))['id'] == 'REQ-1'
+    assert missing == [{'id': 'REQ-1', 'file': 'gone.doc'}]
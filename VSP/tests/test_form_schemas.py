@@ -0,0 +1,102 @@
+import os
+import json
+
+import pytest
+
+from form_schemas import FormError, FormRegistry, form_id
+
+MAIN = {'fields': [
+    {'name': 'projectName', 'type': 'text', 'required': True, 'maxLength': 20},
+    {'name': 'email', 'type': 'email'},
+    {'name': 'budget', 'type': 'number', 'min': 0},
+    {'name': 'decisionDeadline', 'type': 'date'},
+    {'name': 'request_type', 'type': 'select', 'options': ['Clinical', 'Commercial']},
+    {'name': 'services_needed', 'type': 'select', 'options': ['Packaging', 'Testing/Analytical']},
+    {'name': 'keyCriteria', 'type': 'checkbox', 'options': ['Price', 'Quality']},
+]}
+SUBFORM = {'fields': [{'name': 'batch_size', 'type': 'number', 'required': True}]}
+EXTRA = {'fields': [{'name': 'phone', 'type': 'text', 'pattern': r'\+?[0-9 ]+'}]}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    schemas = tmp_path / 'formSchemas'
+    schemas.mkdir()
+    (schemas / 'new_request.json').write_text(json.dumps(MAIN))
+    (schemas / 'Clinical_TestingAnalytical.json').write_text(json.dumps(SUBFORM))
+    extra = tmp_path / 'form_schema.json'
+    extra.write_text(json.dumps(EXTRA))
+    return FormRegistry(str(schemas), [str(extra)], check_interval=0)
+
+
+def test_form_id_matches_the_ui():
+    assert form_id('Clinical', 'Testing/Analytical') == 'Clinical_TestingAnalytical'
+    assert form_id('Clinical', 'Cold Chain') == 'Clinical_Cold_Chain'
+
+
+def test_values_are_coerced(registry):
+    clean = registry.get().validate({
+        'projectName': 'P', 'email': 'a@b.co', 'budget': '1,500', 'decisionDeadline': '2026-01-31 ',
+        'request_type': 'clinical', 'services_needed': 'Testing/Analytical', 'batch_size': '10',
+        'keyCriteria': '["quality", "Price", "Quality"]', 'unknown': 'kept',
+    })
+    assert clean['budget'] == 1500 and clean['batch_size'] == 10
+    assert clean['request_type'] == 'Clinical'
+    assert clean['decisionDeadline'] == '2026-01-31'
+    assert clean['keyCriteria'] == ['Quality', 'Price']
+    assert clean['unknown'] == 'kept'
+
+
+def test_errors_are_reported_per_field(registry):
+    with pytest.raises(FormError) as e:
+        registry.get().validate({
+            'projectName': 'x' * 21, 'email': 'nope', 'budget': '-1', 'decisionDeadline': '31/01/2026',
+            'request_type': 'Other', 'keyCriteria': '["Speed"]', 'phone': 'call me',
+        })
+    assert set(e.value.errors) == {'projectName', 'email', 'budget', 'decisionDeadline', 'request_type', 'keyCriteria', 'phone'}
+
+
+def test_required_fields_include_the_subform(registry):
+    forms = registry.get()
+    body = {'projectName': 'P', 'request_type': 'Clinical', 'services_needed': 'Testing/Analytical'}
+    assert forms.missing(body) == ['batch_size']
+    with pytest.raises(FormError) as e:
+        forms.validate(body)
+    assert e.value.errors == {'batch_size': 'is required'}
+    # drafts skip the required check
+    assert forms.validate(body, partial=True)['projectName'] == 'P'
+    assert forms.missing({'projectName': 'P', 'request_type': 'Commercial', 'services_needed': 'Packaging'}) == []
+
+
+def test_strict_mode_rejects_unknown_fields(registry):
+    with pytest.raises(FormError) as e:
+        registry.get().validate({'projectName': 'P', 'surprise': 1}, allow_unknown=False)
+    assert e.value.errors == {'surprise': 'is not a field of this form'}
+
+
+def test_bundle_version_follows_the_files(registry, tmp_path):
+    forms = registry.get()
+    bundle = json.loads(forms.bundle)
+    assert bundle['version'] == forms.version
+    assert bundle['subforms'] == {'Clinical': {'Testing/Analytical': 'Clinical_TestingAnalytical'}}
+    assert registry.get() is forms
+
+    path = tmp_path / 'formSchemas' / 'Clinical_TestingAnalytical.json'
+    path.write_text(json.dumps({'fields': []}))
+    os.utime(path, ns=(1, 1))
+    assert registry.get().version != forms.version
+
+
+def test_a_broken_schema_is_skipped(registry, tmp_path):
+    (tmp_path / 'formSchemas' / 'Commercial_Packaging.json').write_text(json.dumps({'fields': [{'name': 'x', 'pattern': '('}]}))
+    forms = registry.get()
+    assert 'Commercial_Packaging.json' in registry.errors
+    assert 'Commercial_Packaging' not in forms.forms
+
+
+def test_repository_schemas_accept_a_ui_submission():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    forms = FormRegistry(os.path.join(root, 'public', 'formSchemas'), [os.path.join(root, 'schema', 'form_schema.json')]).get()
+    assert forms.main is not None and forms.subforms
+    forms.validate({'projectName': 'Demo', 'request_type': 'Clinical', 'services_needed': 'Packaging',
+                    'target_markets': '["Japan (PMDA)"]', 'keyCriteria': '[]'}, partial=True)
@@ -0,0 +1,84 @@
+import os
+import gzip
+
+from starlette.requests import Request
+
+from http_cache import AssetDir, IMMUTABLE, REVALIDATE, brotli, compressed_variants, etag_matches, version_token
+
+SCRIPT = ('function hello() { return "hello, vendor selection"; }\n' * 40).encode()
+
+
+def make_request(headers=None, query=b''):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': query,
+                    'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]})
+
+
+def asset_dir(tmp_path, **kwargs):
+    (tmp_path / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'logo.png').write_bytes(os.urandom(2048))
+    return AssetDir(str(tmp_path), **kwargs)
+
+
+def test_etag_matching():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"b"', '"b"')
+    assert etag_matches('*', '"b"')
+    assert not etag_matches('"a"', '"b"') and not etag_matches(None, '"b"')
+
+
+def test_unchanged_files_answer_304(tmp_path):
+    assets = asset_dir(tmp_path)
+    first = assets.response(make_request(), 'app.js')
+    etag = first.headers['etag']
+    assert first.status_code == 200 and first.body == SCRIPT
+    assert first.headers['cache-control'] == REVALIDATE and first.headers['vary'] == 'Accept-Encoding'
+
+    again = assets.response(make_request({'If-None-Match': etag}), 'app.js')
+    assert again.status_code == 304 and again.body == b'' and again.headers['etag'] == etag
+    since = assets.response(make_request({'If-Modified-Since': first.headers['last-modified']}), 'app.js')
+    assert since.status_code == 304
+
+    (tmp_path / 'app.js').write_bytes(SCRIPT + b'// changed\n')
+    changed = assets.response(make_request({'If-None-Match': etag}), 'app.js')
+    assert changed.status_code == 200 and changed.headers['etag'] != etag
+
+
+def test_precompressed_variant_follows_accept_encoding(tmp_path):
+    assets = asset_dir(tmp_path)
+    gz = assets.response(make_request({'Accept-Encoding': 'gzip, deflate'}), 'app.js')
+    assert gz.headers['content-encoding'] == 'gzip' and gzip.decompress(gz.body) == SCRIPT
+    refused = assets.response(make_request({'Accept-Encoding': 'gzip;q=0, identity'}), 'app.js')
+    assert 'content-encoding' not in refused.headers and refused.body == SCRIPT
+    if brotli is not None:
+        br = assets.response(make_request({'Accept-Encoding': 'gzip, br'}), 'app.js')
+        assert br.headers['content-encoding'] == 'br' and brotli.decompress(br.body) == SCRIPT
+    # images are not worth compressing again
+    png = assets.response(make_request({'Accept-Encoding': 'gzip, br'}), 'logo.png')
+    assert 'content-encoding' not in png.headers
+    assert compressed_variants(b'x' * 100, 'small.js') == {}
+
+
+def test_only_the_current_version_is_immutable(tmp_path):
+    assets = asset_dir(tmp_path)
+    url = assets.versioned_url('/static', 'app.js')
+    token = url.split('?v=')[1]
+    assert token == version_token(assets.etag('app.js'))
+    assert assets.response(make_request(query=f'v={token}'.encode()), 'app.js').headers['cache-control'] == IMMUTABLE
+    for stale in (token[:6], token + 'x', 'old'):
+        assert assets.response(make_request(query=f'v={stale}'.encode()), 'app.js').headers['cache-control'] == REVALIDATE
+
+
+def test_large_files_are_streamed_and_validated_by_stat(tmp_path):
+    assets = asset_dir(tmp_path, max_bytes=0)
+    first = assets.response(make_request(), 'app.js', filename='app.js')
+    assert first.status_code == 200 and 'content-disposition' in first.headers
+    assert not hasattr(first, 'body')
+    assert assets.response(make_request({'If-None-Match': first.headers['etag']}), 'app.js').status_code == 304
+
+
+def test_paths_outside_the_directory_are_refused(tmp_path):
+    (tmp_path / 'secret.txt').write_text('no')
+    (tmp_path / 'public').mkdir()
+    assets = AssetDir(str(tmp_path / 'public'))
+    assert assets.response(make_request(), '../secret.txt') is None
+    assert assets.response(make_request(), 'missing.js') is None
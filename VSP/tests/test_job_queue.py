@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import asyncio
+
+import pytest
+
+from job_queue import JobQueue
+
+
+async def _wait(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while queue.get(job_id)['state'] in ('queued', 'running'):
+        assert time.monotonic() < deadline, 'job did not finish'
+        await asyncio.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_a_job_runs_to_completion(tmp_path):
+    async def render(job):
+        job.progress(total=3, stage='render')
+        for _ in range(3):
+            await job.queue.run_blocking(time.sleep, 0.01)
+            job.progress(advance=1)
+        job.result = {'count': job.done}
+
+    async def main():
+        queue = JobQueue(str(tmp_path), {'render': render}, workers=1, save_interval=0)
+        await queue.start()
+        job = queue.submit('render', {'ids': [1, 2, 3]})
+        assert queue.get(job.id)['state'] == 'queued'
+        done = await _wait(queue, job.id)
+        await queue.stop()
+        return queue, done
+
+    queue, done = asyncio.run(main())
+    assert done['state'] == 'succeeded' and done['stage'] == 'render'
+    assert (done['done'], done['total'], done['result']) == (3, 3, {'count': 3})
+    assert done['started_at'] and done['finished_at']
+    assert queue.counters == {'submitted': 1, 'succeeded': 1, 'failed': 0}
+    # finished jobs are answered from the state file
+    assert not queue.jobs and queue.pending() == 0
+
+
+def test_failures_are_recorded(tmp_path):
+    async def broken(job):
+        raise RuntimeError('renderer exploded')
+
+    async def main():
+        queue = JobQueue(str(tmp_path), {'broken': broken}, workers=1)
+        await queue.start()
+        with pytest.raises(ValueError):
+            queue.submit('missing', {})
+        done = await _wait(queue, queue.submit('broken', {}).id)
+        await queue.stop()
+        return queue, done
+
+    queue, done = asyncio.run(main())
+    assert done['state'] == 'failed' and done['errors'] == ['renderer exploded']
+    assert queue.counters == {'submitted': 1, 'succeeded': 0, 'failed': 1}
+
+
+def test_a_job_cancelled_at_shutdown_counts_as_failed(tmp_path):
+    started = []
+
+    async def slow(job):
+        started.append(job.id)
+        await asyncio.sleep(60)
+
+    async def main():
+        queue = JobQueue(str(tmp_path), {'slow': slow}, workers=1)
+        await queue.start()
+        job = queue.submit('slow', {})
+        while not started:
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return queue, job
+
+    queue, job = asyncio.run(main())
+    with open(queue.path(job.id), 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    assert saved['state'] == 'failed' and saved['errors'] == ['cancelled: the server shut down']
+    assert queue.counters['failed'] == 1
+
+
+def test_submit_needs_a_running_queue(tmp_path):
+    queue = JobQueue(str(tmp_path), {'noop': None})
+    with pytest.raises(RuntimeError):
+        queue.submit('noop', {})
+
+
+def test_state_files_written_elsewhere(tmp_path):
+    queue = JobQueue(str(tmp_path), {})
+    (tmp_path / 'JOB-live.json').write_text(json.dumps({'id': 'JOB-live', 'state': 'running', 'pid': os.getpid(), 'errors': []}))
+    (tmp_path / 'JOB-dead.json').write_text(json.dumps({'id': 'JOB-dead', 'state': 'running', 'pid': 2 ** 22 + 1, 'errors': []}))
+    assert queue.get('JOB-live')['state'] == 'running'
+    dead = queue.get('JOB-dead')
+    assert dead['state'] == 'failed' and dead['errors'] == ['interrupted: the worker running it exited']
+    assert queue.get('JOB-unknown') is None
+    assert queue.get('../JOB-live') is None
+
+
+def test_sweep_removes_old_finished_jobs(tmp_path):
+    queue = JobQueue(str(tmp_path), {}, keep_seconds=60)
+    old = time.time() - 120
+    for name, state, pid in (('old-done', 'succeeded', 0), ('old-live', 'running', os.getpid()), ('new-done', 'succeeded', 0)):
+        path = tmp_path / f'{name}.json'
+        path.write_text(json.dumps({'state': state, 'pid': pid}))
+        if name.startswith('old'):
+            os.utime(path, (old, old))
+    queue._sweep()
+    assert sorted(os.listdir(tmp_path)) == ['new-done.json', 'old-live.json']
@@ -0,0 +1,41 @@
+import numpy as np
+
+from lexical import BM25Index, top_ids, reciprocal_rank_fusion
+
+DOCS = [
+    'acme sterile packaging united states',
+    'beta biologics manufacturing europe',
+    'gamma analytical testing packaging japan',
+    'delta serialization china',
+]
+
+
+def test_scores_rank_matching_documents():
+    index = BM25Index(DOCS)
+    scores = index.scores('packaging japan')
+    assert list(top_ids(scores, np.arange(len(DOCS)), 2)) == [2, 0]
+    assert scores[1] == 0 and scores[3] == 0
+
+
+def test_incremental_changes_match_a_rebuild():
+    index = BM25Index(DOCS)
+    # slot 0 is replaced by slot 4, slot 3 is deleted; callers mask removed slots out
+    changed = index.with_changes(6, added=[(4, 'acme sterile packaging canada'), (5, 'epsilon cold chain packaging')],
+                                 removed=[DOCS[0], DOCS[3]])
+    rebuilt = BM25Index([None, DOCS[1], DOCS[2], None, 'acme sterile packaging canada', 'epsilon cold chain packaging'])
+    assert changed.n == rebuilt.n == 4
+    assert {t: d for t, d in changed.df.items() if d} == rebuilt.df
+
+    live = np.asarray([1, 2, 4, 5])
+    for query in ('packaging', 'acme', 'serialization china', 'cold chain'):
+        got, want = changed.scores(query)[live], rebuilt.scores(query)[live]
+        # new documents keep the old average length, so only the ranking is compared
+        assert list(got > 0) == list(want > 0)
+        assert np.argmax(got) == np.argmax(want)
+    # the parent index is unchanged
+    assert index.n == 4 and index.size == 4
+
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 1, 4]])
+    assert fused[1] == fused[2] > fused[3] > 0 and fused[4] == fused[3]
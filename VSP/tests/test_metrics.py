@@ -0,0 +1,77 @@
+import time
+
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from metrics import Registry, MetricsMiddleware, SlowRequestProfiler, begin_request, server_timing, stage, HTTP_SECONDS
+
+
+def test_prometheus_text_format():
+    reg = Registry()
+    hits = reg.counter('t_hits_total', 'Hits.', ('method',))
+    latency = reg.histogram('t_seconds', 'Latency.', buckets=(0.1, 1.0))
+    reg.collector('t_size', 'Size.', 'gauge', ('cache',), lambda: [(('rerank',), 3)])
+    hits.inc(method='llm')
+    hits.inc(2, method='llm')
+    hits.inc(method='say "hi"')
+    for v in (0.05, 0.5, 5):
+        latency.observe(v)
+    text = reg.render()
+    assert '# TYPE t_hits_total counter' in text
+    assert 't_hits_total{method="llm"} 3' in text
+    assert 't_hits_total{method="say \\"hi\\""} 1' in text
+    # buckets are cumulative
+    assert 't_seconds_bucket{le="0.1"} 1' in text and 't_seconds_bucket{le="1.0"} 2' in text
+    assert 't_seconds_bucket{le="+Inf"} 3' in text and 't_seconds_count 3' in text
+    assert 't_size{cache="rerank"} 3' in text
+
+
+def test_a_failing_collector_does_not_break_the_scrape():
+    reg = Registry()
+    reg.collector('t_broken', 'Broken.', 'gauge', (), lambda: 1 / 0)
+    assert reg.render().splitlines() == ['# HELP t_broken Broken.', '# TYPE t_broken gauge']
+
+
+def test_stages_feed_the_histogram_and_server_timing():
+    timings = begin_request()
+    for _ in range(2):
+        with stage('t_embed'):
+            pass
+    with stage('t_rerank'):
+        time.sleep(0.002)
+    assert [name for name, _ in timings] == ['t_embed', 't_embed', 't_rerank']
+    header = server_timing(timings)
+    assert header.startswith('t_embed;dur=') and ', t_rerank;dur=' in header
+    assert float(header.split('t_rerank;dur=')[1]) >= 2
+
+
+def test_middleware_times_requests_by_route():
+    def select(request):
+        with stage('t_retrieval'):
+            pass
+        return PlainTextResponse('ok')
+
+    app = MetricsMiddleware(Starlette(routes=[Route('/t_select/{id}', select)]))
+    with TestClient(app) as client:
+        response = client.get('/t_select/42')
+        client.get('/t_select/43')
+    assert response.headers['server-timing'].startswith('t_retrieval;dur=')
+    # labelled by the route template, not the raw path
+    counts, _ = HTTP_SECONDS.values[('GET', '/t_select/{id}', 200)]
+    assert sum(counts) == 2
+
+
+def test_slow_requests_leave_a_profile(tmp_path):
+    profiler = SlowRequestProfiler(threshold=0.01, directory=str(tmp_path), interval=0.001)
+    fast = profiler.start()
+    profiler.stop(fast, 0.001, 'GET /fast')
+    slow = profiler.start()
+    time.sleep(0.05)
+    profiler.stop(slow, 0.05, 'GET /api/select_vendors')
+    [profile] = [p.name for p in tmp_path.iterdir()]
+    assert profile.endswith('-50ms-GET__api_select_vendors.folded')
+    # collapsed stacks: "thread;frame;... count"
+    line = (tmp_path / profile).read_text().splitlines()[0]
+    assert line.rsplit(' ', 1)[1].isdigit() and ';' in line
@@ -0,0 +1,82 @@
+import json
+import sqlite3
+
+import pytest
+
+from request_store import RequestStore, SCHEMA, encode_cursor, decode_cursor
+
+
+def make_store(tmp_path, n=25):
+    store = RequestStore(str(tmp_path / 'requests.db'))
+    for i in range(n):
+        store.create({
+            'projectName': f'project {i}',
+            'request_type': 'Clinical' if i % 2 else 'Commercial',
+            'services_needed': 'Packaging' if i % 3 == 0 else 'Manufacturing',
+            'description': 'sterile fill' if i == 7 else 'generic',
+        }, [], status='draft' if i % 5 == 0 else 'submitted')
+    return store
+
+
+def page_through(store, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = store.page(cursor=cursor, limit=limit, **filters)
+        ids.extend(json.loads(r)['id'] for r in rows)
+        if not cursor:
+            return ids
+
+
+def test_cursor_pages_cover_every_row_once(tmp_path):
+    store = make_store(tmp_path)
+    everything = [e['id'] for e in store.all()]
+    newest_first = page_through(store, 4)
+    assert newest_first == everything[::-1]
+    assert page_through(store, 7, newest_first=False) == everything
+    assert list(json.loads(r)['id'] for r in store.iter_rows(page_size=3)) == newest_first
+    assert len(list(store.iter_rows(page_size=3, limit=5))) == 5
+
+
+def test_filters_and_projection(tmp_path):
+    store = make_store(tmp_path)
+    drafts = page_through(store, 2, status='draft')
+    assert len(drafts) == 5
+    assert all(store.get(i)['status'] == 'draft' for i in drafts)
+    packaging = page_through(store, 3, services=['packaging'], request_type='Commercial')
+    assert packaging and all(store.get(i)['body']['services_needed'] == 'Packaging' for i in packaging)
+    assert [store.get(i)['body']['projectName'] for i in page_through(store, 10, q='sterile')] == ['project 7']
+
+    rows, _ = store.page(fields=['id', 'body.projectName'], limit=1)
+    row = json.loads(rows[0])
+    assert set(row) == {'id', 'body'} and set(row['body']) == {'projectName'}
+    with pytest.raises(ValueError):
+        store.page(fields=['nope'])
+
+
+def test_bad_cursor():
+    assert decode_cursor(encode_cursor(42)) == 42
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor!')
+
+
+def test_version_0_database_is_migrated_and_backfilled(tmp_path):
+    path = str(tmp_path / 'requests.db')
+    conn = sqlite3.connect(path)
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+    entry = {'id': 'REQ-1', 'createdAt': '2024-01-01T00:00:00Z', 'status': 'submitted',
+             'body': {'request_type': 'Clinical', 'services_needed': '["Packaging", "Testing/Analytical"]', 'description': 'lyophilized'},
+             'files': [{'originalname': 'spec.pdf'}]}
+    conn.execute('INSERT INTO requests (id, created_at, status, entry) VALUES (?, ?, ?, ?)',
+                 (entry['id'], entry['createdAt'], entry['status'], json.dumps(entry)))
+    conn.commit()
+    conn.close()
+
+    store = RequestStore(path)
+    assert store._conn().execute('PRAGMA user_version').fetchone()[0] == 1
+    found = lambda **f: [json.loads(r)['id'] for r in store.page(**f)[0]]
+    assert found(request_type='Clinical') == ['REQ-1']
+    assert found(services=['testing/analytical', 'packaging']) == ['REQ-1']
+    assert found(q='lyophilized') == ['REQ-1']
+    assert found(q='spec') == ['REQ-1']
+    assert found(services=['manufacturing']) == []
@@ -0,0 +1,50 @@
+import json
+
+from request_store import RequestStore
+
+
+def write_legacy(tmp_path, entries):
+    path = tmp_path / 'requests.json'
+    path.write_text(json.dumps(entries), encoding='utf-8')
+    return str(path)
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = write_legacy(tmp_path, [
+        {'id': 'REQ-1', 'createdAt': '2024-01-01T00:00:00Z', 'body': {'projectName': 'a'}, 'files': []},
+        {'id': 'REQ-2', 'createdAt': '2024-01-02T00:00:00Z', 'status': 'draft', 'body': {}, 'files': []},
+        {'no': 'id'},
+    ])
+    store = RequestStore(str(tmp_path / 'requests.db'), legacy_json=legacy)
+    assert [e['id'] for e in store.all()] == ['REQ-1', 'REQ-2']
+    assert store.get('REQ-2')['status'] == 'draft'
+
+    # a later edit of the old file is not imported again
+    write_legacy(tmp_path, [{'id': 'REQ-3', 'body': {}}])
+    store = RequestStore(str(tmp_path / 'requests.db'), legacy_json=legacy)
+    assert store.get('REQ-3') is None
+
+
+def test_unreadable_legacy_json_is_retried(tmp_path):
+    legacy = tmp_path / 'requests.json'
+    legacy.write_text('[{"id": "REQ-1"', encoding='utf-8')
+    store = RequestStore(str(tmp_path / 'requests.db'), legacy_json=str(legacy))
+    assert store.all() == []
+
+    legacy.write_text('[{"id": "REQ-1", "body": {}}]', encoding='utf-8')
+    store = RequestStore(str(tmp_path / 'requests.db'), legacy_json=str(legacy))
+    assert store.get('REQ-1') is not None
+
+
+def test_create_update_and_get(tmp_path):
+    store = RequestStore(str(tmp_path / 'requests.db'))
+    a = store.create({'projectName': 'a'}, [{'originalname': 'x.pdf', 'sha256': 'ab' * 32}], status='draft')
+    b = store.create({'projectName': 'b'}, [])
+    assert a['id'] != b['id']
+
+    e = store.update(a['id'], {'budget': '10'}, [{'originalname': 'x.pdf', 'sha256': 'ab' * 32}], status='submitted')
+    assert e['body'] == {'projectName': 'a', 'budget': '10'}
+    # the same document uploaded again is listed once
+    assert len(e['files']) == 1
+    assert store.get(a['id'])['status'] == 'submitted'
+    assert store.update('REQ-missing', {}, []) is None
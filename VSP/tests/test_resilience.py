@@ -0,0 +1,104 @@
+import time
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, hedged
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker('t', threshold=2, cooldown=10)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.opened == 1
+    assert not breaker.allow()
+
+    now[0] += 10
+    # one probe at a time once the cooldown is over
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.opened == 2 and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0 and breaker.allow()
+
+
+def test_a_probe_without_a_verdict_frees_the_slot(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker('t', threshold=1, cooldown=1)
+    breaker.record_failure()
+    now[0] += 1
+    assert breaker.allow() and not breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN and breaker.allow()
+
+
+def test_threshold_zero_disables_the_breaker():
+    breaker = CircuitBreaker('t', threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def attempts(*plan):
+    """A call factory whose n-th attempt sleeps plan[n][0] seconds, then returns or raises plan[n][1]."""
+    started = []
+
+    async def call():
+        delay, outcome = plan[len(started)]
+        started.append(delay)
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call, started
+
+
+def test_failed_attempts_are_retried():
+    call, started = attempts((0, ValueError('boom')), (0, 'second'))
+    assert asyncio.run(hedged(call, 1.0, attempts=2)) == 'second'
+    assert len(started) == 2
+
+    call, started = attempts((0, ValueError('first')), (0, KeyError('last')))
+    with pytest.raises(KeyError):
+        asyncio.run(hedged(call, 1.0, attempts=2))
+
+
+def test_a_slow_attempt_is_hedged():
+    call, started = attempts((1.0, 'slow'), (0.01, 'hedge'))
+    t = time.perf_counter()
+    assert asyncio.run(hedged(call, 2.0, attempts=2, hedge_after=0.05)) == 'hedge'
+    assert time.perf_counter() - t < 0.5 and len(started) == 2
+
+    # without hedging the second attempt never starts
+    call, started = attempts((0.05, 'only'), (0, 'unused'))
+    assert asyncio.run(hedged(call, 1.0, attempts=2)) == 'only'
+    assert len(started) == 1
+
+
+def test_the_deadline_cancels_pending_attempts():
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await hedged(call, 0.05, attempts=3, hedge_after=0.01)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert len(cancelled) == 3
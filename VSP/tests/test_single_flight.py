@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight, request_key, fcntl
+
+
+def test_request_key_is_canonical():
+    assert request_key({'a': 1, 'b': [1, 2]}, 'v1') == request_key({'b': [1, 2], 'a': 1}, 'v1')
+    assert request_key({'a': 1}, 'v1') != request_key({'a': 1}, 'v2')
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def work(flight):
+        calls.append(flight.key)
+        await asyncio.sleep(0.05)
+        return {'waiters': flight.waiters}
+
+    async def main():
+        sf = SingleFlight()
+        results = await asyncio.gather(*[sf.run('k', work) for _ in range(5)], sf.run('other', work))
+        return sf, results
+
+    sf, results = asyncio.run(main())
+    assert sorted(calls) == ['k', 'other']
+    # every caller got the leader's result, which saw all five waiters
+    assert results[:5] == [{'waiters': 5}] * 5
+    assert sf.counters == {'leaders': 2, 'coalesced': 4, 'shared': 0}
+    assert not sf.flights
+
+
+def test_stream_subscribers_get_every_item():
+    async def events(flight):
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def collect(sf):
+        return [item async for item in sf.stream('k', events)]
+
+    async def main():
+        sf = SingleFlight()
+        first = asyncio.create_task(collect(sf))
+        await asyncio.sleep(0.015)
+        # joins after the first item was published and still gets it
+        return await asyncio.gather(first, collect(sf))
+
+    assert asyncio.run(main()) == [[0, 1, 2], [0, 1, 2]]
+
+
+def test_errors_reach_every_caller_and_the_key_is_released():
+    async def fail(flight):
+        await asyncio.sleep(0.01)
+        raise RuntimeError('upstream down')
+
+    async def main():
+        sf = SingleFlight()
+        results = await asyncio.gather(sf.run('k', fail), sf.run('k', fail), return_exceptions=True)
+        return sf, results
+
+    sf, results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert 'k' not in sf.flights
+
+
+needs_flock = pytest.mark.skipif(fcntl is None, reason='cross-worker flights need fcntl')
+
+
+@needs_flock
+def test_other_workers_reuse_the_stored_result(tmp_path):
+    calls = []
+
+    async def work(flight):
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return ['a', 'b']
+
+    async def main():
+        # two instances stand in for two workers: their lock files are separate open files
+        a, b = SingleFlight(str(tmp_path), poll=0.01), SingleFlight(str(tmp_path), poll=0.01)
+        first = asyncio.create_task(a.run('k', work))
+        await asyncio.sleep(0.02)
+        return a, b, await asyncio.gather(first, b.run('k', work))
+
+    a, b, results = asyncio.run(main())
+    assert results == [['a', 'b'], ['a', 'b']]
+    assert len(calls) == 1
+    assert a.counters['leaders'] == 1 and b.counters['shared'] == 1
+
+
+@needs_flock
+def test_sweep_keeps_held_lock_files(tmp_path):
+    sf = SingleFlight(str(tmp_path), keep_files=0)
+    held = open(tmp_path / 'busy.lock', 'a')
+    fcntl.flock(held.fileno(), fcntl.LOCK_EX)
+    (tmp_path / 'idle.lock').touch()
+    (tmp_path / 'old.json').touch()
+    time.sleep(0.01)
+    sf._sweep()
+    held.close()
+    assert os.listdir(tmp_path) == ['busy.lock']
+
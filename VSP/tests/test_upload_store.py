@@ -0,0 +1,108 @@
+import os
+import asyncio
+import hashlib
+
+import pytest
+
+from request_store import RequestStore
+from upload_store import UploadStore, UploadTooLarge, BadUpload, PendingFile
+
+BOUNDARY = 'vspboundary'
+
+
+class FormRequest:
+    """Just enough of a starlette Request for parse_form: headers and a chunked body stream."""
+
+    def __init__(self, parts, chunk=7):
+        body = b''
+        for name, value, filename in parts:
+            body += f'--{BOUNDARY}\r\n'.encode()
+            if filename is None:
+                body += f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode() + value + b'\r\n'
+            else:
+                body += (f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                         'Content-Type: application/pdf\r\n\r\n').encode() + value + b'\r\n'
+        self.body = body + f'--{BOUNDARY}--\r\n'.encode()
+        self.chunk = chunk
+        self.headers = {'content-type': f'multipart/form-data; boundary={BOUNDARY}', 'content-length': str(len(self.body))}
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+
+def parse(store, parts, check_fields=None, created=None):
+    return asyncio.run(store.parse_form(FormRequest(parts), check_fields, created))
+
+
+def stored(store):
+    return sorted(name for _, _, names in os.walk(os.path.join(store.directory, 'sha256')) for name in names if name != '.lock')
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'), max_file_bytes=64, max_request_bytes=1024, chunk_size=16)
+
+
+def test_files_are_stored_once_per_content(store):
+    created = []
+    fields, files = parse(store, [('projectName', b'Demo', None), ('files', b'%PDF spec', 'spec.pdf'),
+                                  ('files', b'%PDF spec', 'copy.pdf'), ('files', b'', '')], created=created)
+    digest = hashlib.sha256(b'%PDF spec').hexdigest()
+    assert fields == [('projectName', 'Demo')]
+    assert [f['originalname'] for f in files] == ['spec.pdf', 'copy.pdf']
+    assert files[0]['sha256'] == digest and files[0]['size'] == 9 and files[0]['path'] == f'/uploads/{digest}/spec.pdf'
+    assert stored(store) == [digest]
+    # only the first part added the file
+    assert [d for d, _ in created] == [digest]
+    with open(store.path_for(digest), 'rb') as f:
+        assert f.read() == b'%PDF spec'
+
+
+def test_size_limits(store):
+    with pytest.raises(UploadTooLarge):
+        parse(store, [('files', b'small', 'a.pdf'), ('files', b'x' * 65, 'big.pdf')])
+    with pytest.raises(UploadTooLarge):
+        parse(store, [('files', b'y' * 60, f'{i}.pdf') for i in range(20)])
+    # the files of a rejected form are removed, and no temp files are left
+    assert stored(store) == []
+
+
+def test_fields_are_checked_before_the_first_file(store):
+    def check_fields(fields):
+        if dict(fields).get('projectName') != 'ok':
+            raise BadUpload('bad project')
+
+    with pytest.raises(BadUpload):
+        parse(store, [('projectName', b'nope', None), ('files', b'data', 'a.pdf')], check_fields)
+    assert stored(store) == []
+    assert len(parse(store, [('projectName', b'ok', None), ('files', b'data', 'a.pdf')], check_fields)[1]) == 1
+
+
+def test_discard_keeps_files_another_request_uses(store, tmp_path):
+    requests = RequestStore(str(tmp_path / 'requests.db'))
+    first, second, third = [], [], []
+    files_a = parse(store, [('files', b'shared', 'a.pdf')], created=first)[1]
+    parse(store, [('files', b'only mine', 'b.pdf')], created=second)
+    # another request stores the same content before the first one is rejected
+    parse(store, [('files', b'shared', 'c.pdf')], created=third)
+    assert third == []
+
+    store.discard(first, requests.uses_file)
+    store.discard(second, requests.uses_file)
+    assert stored(store) == [files_a[0]['sha256']]
+
+    # a saved request keeps its file even if nobody stored it again
+    created = []
+    files = parse(store, [('files', b'saved', 'd.pdf')], created=created)[1]
+    requests.create({'projectName': 'Saved'}, files)
+    assert requests.uses_file(files[0]['sha256'])
+    store.discard(created, requests.uses_file)
+    assert os.path.exists(store.path_for(files[0]['sha256']))
+
+
+def test_pending_file_abort_leaves_nothing(store):
+    f = PendingFile(store, 'x.pdf', 'application/pdf')
+    f.write(b'partial')
+    f.abort()
+    assert os.listdir(store.tmp_dir) == []
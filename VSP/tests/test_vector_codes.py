@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_codes import VectorCodes, KINDS
+from vendor_vectors import VendorMatrix, save_store, build_codes_for_store
+
+
+def clustered(n=2000, dim=64, seed=7):
+    """Unit rows around a few centres, so near neighbours are close calls for the codes."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((20, dim))
+    m = centres[rng.integers(0, 20, n)] + 0.3 * rng.standard_normal((n, dim))
+    return (m / np.linalg.norm(m, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize('kind,ratio,error', [('float16', 2, 0.002), ('int8', 4, 0.05), ('binary', 32, None)])
+def test_codes_are_small_and_close(kind, ratio, error):
+    m = clustered()
+    codes = VectorCodes.build(m, kind, chunk=300)
+    assert codes.nbytes * ratio == m.nbytes
+    q = m[5]
+    approx = codes.scores(q)
+    if error is not None:
+        assert np.abs(approx - m @ q).max() < error
+    # the query's own row scores best under every code
+    assert np.argmax(approx) == 5
+    assert np.allclose(codes.scores(q, rows=np.array([5, 9])), approx[[5, 9]])
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        VectorCodes.build(clustered(10), 'int4')
+
+
+@pytest.mark.parametrize('kind', KINDS)
+def test_rescored_search_is_exact(tmp_path, kind):
+    m = clustered()
+    names = [f'V{i}' for i in range(len(m))]
+    npy, manifest, codes_path = (str(tmp_path / f) for f in ('v.npy', 'v.manifest.json', 'v.codes.npy'))
+    save_store(npy, manifest, names, m, 'test-model')
+    build_codes_for_store(npy, manifest, codes_path, kind)
+    vm = VendorMatrix.open(npy, manifest)
+    assert vm.attach_codes(codes_path, kind, rescore=100)
+
+    rng = np.random.default_rng(1)
+    recalled = 0
+    for q in m[rng.integers(0, len(m), 20)] + 0.1 * rng.standard_normal((20, m.shape[1])).astype(np.float32):
+        got = vm.top_k(q, k=10)
+        exact = vm.top_k(q, k=10, exact=True)
+        # returned scores are the float32 cosines, not the code scores
+        for name, score in got:
+            assert score == pytest.approx(float(vm.vector(name) @ (q / np.linalg.norm(q))), abs=1e-5)
+        recalled += len({n for n, _ in got} & {n for n, _ in exact})
+    assert recalled / 200 >= (0.95 if kind != 'binary' else 0.8)
+
+    mask = vm.mask_for(names[:50])
+    assert all(int(n[1:]) < 50 for n, _ in vm.top_k(m[3], k=5, mask=mask))
+
+
+def test_codes_for_another_matrix_are_not_used(tmp_path):
+    m = clustered(100)
+    codes = VectorCodes.build(m, 'int8', matrix_sha256='abc')
+    path = str(tmp_path / 'v.codes.npy')
+    codes.save(path)
+    assert os.path.exists(str(tmp_path / 'v.codes.json'))
+    loaded = VectorCodes.load(path, 'int8', 'abc')
+    assert np.array_equal(loaded.codes, codes.codes) and np.allclose(loaded.scale, codes.scale)
+    assert VectorCodes.load(path, 'int8', 'other') is None
+    assert VectorCodes.load(path, 'binary') is None
+    assert VectorCodes.load(str(tmp_path / 'missing.npy')) is None
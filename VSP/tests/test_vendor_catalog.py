@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+
+from vendor_catalog import CatalogLoader, VendorCatalog, matches_service
+
+
+def vendor(name, services, countries=(), description=''):
+    return {'name': name, 'services': list(services), 'countries': list(countries), 'description': description}
+
+
+BASE = [
+    vendor('Acme', ['Packaging'], ['United States (FDA)']),
+    vendor('Beta', ['Manufacturing'], ['European Union (EMA)']),
+    vendor('Gamma', ['Testing/Analytical', 'Packaging'], ['Japan (PMDA)']),
+]
+
+
+def names(catalog, mask):
+    return sorted(catalog.vendors[i]['name'] for i in np.flatnonzero(mask))
+
+
+def same_answers(a, b):
+    for service in ('packaging', 'manufacturing', 'testing', 'serialization'):
+        assert names(a, a.service_mask(service)) == names(b, b.service_mask(service))
+    for market in ('united states', 'japan', 'china'):
+        assert names(a, a.market_mask(market)) == names(b, b.market_mask(market))
+        assert names(a, a.market_text_mask(market)) == names(b, b.market_text_mask(market))
+
+
+def test_non_string_request_values_are_skipped():
+    catalog = VendorCatalog(BASE + [{'name': 'Odd', 'services': ['Packaging', 7], 'countries': None}])
+    assert names(catalog, catalog.service_mask(['Packaging', 3])) == ['Acme', 'Gamma', 'Odd']
+    assert names(catalog, catalog.market_mask(['Japan', None, {'a': 1}])) == ['Gamma']
+    assert names(catalog, catalog.market_text_mask([['japan']])) == []
+    # nothing usable requested: no filter
+    assert names(catalog, catalog.service_mask([3])) == ['Acme', 'Beta', 'Gamma', 'Odd']
+    assert matches_service(catalog.vendor('Odd'), ['packaging', 3])
+
+
+def test_changes_match_a_rebuilt_catalog():
+    catalog = VendorCatalog(BASE)
+    changed = catalog.with_changes([
+        {'op': 'upsert', 'vendor': vendor('Delta', ['Serialization'], ['China (NMPA)'])},
+        {'op': 'upsert', 'vendor': vendor('Acme', ['Manufacturing'], ['Japan (PMDA)'])},
+        {'op': 'delete', 'name': 'Beta'},
+    ])
+    assert changed.tombstones == 2
+    assert [v['name'] for v in changed.live()] == ['Gamma', 'Delta', 'Acme']
+    assert changed.vendor('Acme')['services'] == ['Manufacturing']
+    same_answers(changed, VendorCatalog(changed.live()))
+    # the parent is untouched for readers still using it
+    assert catalog.vendor('Beta') is not None and not catalog.tombstones
+
+
+def test_text_scores_skip_tombstones():
+    catalog = VendorCatalog(BASE)
+    catalog.bm25
+    changed = catalog.with_changes([{'op': 'delete', 'name': 'Acme'}])
+    scores = changed.text_scores('packaging')
+    assert scores[catalog.by_name['Acme']] == 0
+    assert scores[changed.by_name['Gamma']] > 0
+
+
+def make_loader(tmp_path, **kw):
+    path = tmp_path / 'vendors_catalog.json'
+    if not path.exists():
+        path.write_text(json.dumps(BASE), encoding='utf-8')
+    return CatalogLoader(str(path), changes_path=str(tmp_path / 'vendors_changes.jsonl'), **kw)
+
+
+def test_commit_is_replayed_by_other_loaders(tmp_path):
+    writer, reader = make_loader(tmp_path), make_loader(tmp_path)
+    assert reader.get().vendor('Delta') is None
+    results = writer.commit([
+        {'op': 'upsert', 'name': 'Delta', 'vendor': {'services': ['Serialization']}},
+        {'op': 'patch', 'name': 'Acme', 'vendor': {'countries': ['China (NMPA)']}},
+        {'op': 'delete', 'name': 'Missing'},
+    ])
+    assert [(r['status'], r['version']) for r in results] == [('created', 1), ('updated', 1), ('not_found', 0)]
+
+    catalog = reader.get()
+    assert catalog.vendor('Delta')['services'] == ['Serialization']
+    assert catalog.vendor('Acme')['countries'] == ['China (NMPA)']
+    assert catalog.vendor('Acme')['services'] == ['Packaging']
+    assert names(catalog, catalog.market_mask('china')) == ['Acme']
+
+
+def test_version_conflicts(tmp_path):
+    loader = make_loader(tmp_path)
+    loader.commit([{'op': 'patch', 'name': 'Beta', 'vendor': {'description': 'v1'}}])
+    stale = loader.commit([{'op': 'patch', 'name': 'Beta', 'vendor': {'description': 'v2'}, 'version': 0}])
+    assert stale == [{'name': 'Beta', 'status': 'conflict', 'version': 1}]
+    ok = loader.commit([{'op': 'patch', 'name': 'Beta', 'vendor': {'description': 'v2'}, 'version': 1}])
+    assert ok[0]['status'] == 'updated' and loader.get().vendor('Beta')['description'] == 'v2'
+
+
+def test_compaction_rewrites_the_catalog_and_empties_the_log(tmp_path):
+    loader = make_loader(tmp_path, compact_ratio=0.4)
+    loader.commit([{'op': 'delete', 'name': 'Beta'}])
+    assert (tmp_path / 'vendors_changes.jsonl').stat().st_size > 0
+    loader.commit([{'op': 'delete', 'name': 'Gamma'}, {'op': 'upsert', 'name': 'Delta', 'vendor': {'services': ['Packaging']}}])
+
+    assert (tmp_path / 'vendors_changes.jsonl').stat().st_size == 0
+    on_disk = json.loads((tmp_path / 'vendors_catalog.json').read_text(encoding='utf-8'))
+    assert [v['name'] for v in on_disk] == ['Acme', 'Delta']
+    assert loader.get().tombstones == 0
+    fresh = make_loader(tmp_path).get()
+    assert [v['name'] for v in fresh.live()] == ['Acme', 'Delta']
+    same_answers(fresh, loader.get())
@@ -0,0 +1,284 @@
+"""Streaming, content-addressed storage for uploaded request files.
+
+The multipart body is parsed straight off the request stream: file parts are
+written to a temp file in fixed-size chunks while their SHA-256 is computed,
+then moved to ``sha256/<aa>/<hash>``. A file that is already stored (the same
+document uploaded at the draft and the submit step) is kept once. Per-file and
+per-request size limits are enforced while streaming, so an oversized upload
+is rejected without ever being buffered.
+
+A rejected request removes the files it added, unless another request has
+stored the same content since: re-storing an existing file touches it, and
+both happen under a lock file shared by all workers.
+"""
+import os
+import hashlib
+import asyncio
+import tempfile
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from urllib.parse import unquote_plus
+
+from multipart.multipart import MultipartParser, parse_options_header, QuerystringParser
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class BadUpload(Exception):
+    pass
+
+
+def safe_filename(name):
+    name = os.path.basename(str(name).replace('\\', '/'))
+    return ''.join([c if c.isalnum() or c in '._-' else '_' for c in name]) or 'file'
+
+
+def is_sha256(value):
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+
+class PendingFile:
+    """A file part being written; commit() moves it into the content-addressed store."""
+
+    def __init__(self, store, filename, content_type):
+        self.store = store
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        # mtime (ns) of the file this part added to the store; None if it was stored already
+        self.created = None
+        self.sha = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir, prefix='upload-')
+        self.fh = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.sha.update(data)
+        self.fh.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.fh.close()
+        digest = self.sha.hexdigest()
+        dest = self.store.path_for(digest)
+        with self.store.locked():
+            if os.path.exists(dest):
+                # already stored: keep the existing copy, touched so a rejected
+                # request that added it leaves it in place
+                os.utime(dest)
+                os.unlink(self.tmp_path)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(self.tmp_path, dest)
+                self.created = os.stat(dest).st_mtime_ns
+        return digest
+
+    def abort(self):
+        try:
+            self.fh.close()
+            os.unlink(self.tmp_path)
+        except OSError:
+            pass
+
+
+class UploadStore:
+    def __init__(self, directory, max_file_bytes, max_request_bytes, chunk_size=1 << 20, max_field_bytes=1 << 20):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.chunk_size = chunk_size
+        self.max_field_bytes = max_field_bytes
+        self.tmp_dir = os.path.join(directory, 'sha256', '.tmp')
+        self.lock_path = os.path.join(directory, 'sha256', '.lock')
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        """Serializes storing and discarding files across workers."""
+        with open(self.lock_path, 'a') as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            yield
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, 'sha256', digest[:2], digest)
+
+    def url_for(self, digest, filename):
+        return f'/uploads/{digest}/{safe_filename(filename)}'
+
+    def discard(self, created, in_use=None):
+        """Remove the files a rejected request added (parse_form's ``created``).
+
+        A file is kept if it was stored again since (its mtime changed) or if
+        ``in_use(digest)`` says a saved request refers to it.
+        """
+        for digest, mtime_ns in created:
+            path = self.path_for(digest)
+            with self.locked():
+                try:
+                    if os.stat(path).st_mtime_ns != mtime_ns or (in_use is not None and in_use(digest)):
+                        continue
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    async def parse_form(self, request, check_fields=None, created=None):
+        """Return (fields, files) for a form request, streaming file parts to the store.
+
+        ``fields`` is a list of (name, value) pairs in body order; ``files`` is
+        the metadata of every stored file. Raises UploadTooLarge / BadUpload.
+        ``check_fields(fields)`` is called with the fields read so far before
+        the first file is stored, so it can reject the form (by raising) early.
+        If the form is rejected while it is read, the files it added to the
+        store are removed again; otherwise (digest, mtime) pairs of the files
+        that were not stored before are appended to ``created``, for the caller
+        to ``discard`` if it rejects the request later.
+        """
+        content_type, params = parse_options_header(request.headers.get('content-type', ''))
+        declared = request.headers.get('content-length')
+        if declared and declared.isdigit() and int(declared) > self.max_request_bytes:
+            raise UploadTooLarge(f'request larger than {self.max_request_bytes} bytes')
+        if content_type == b'multipart/form-data':
+            boundary = params.get(b'boundary')
+            if not boundary:
+                raise BadUpload('missing multipart boundary')
+            return await self._parse_multipart(request, boundary, check_fields, created)
+        if content_type == b'application/x-www-form-urlencoded':
+            return await self._parse_urlencoded(request), []
+        raise BadUpload('expected a multipart or urlencoded form')
+
+    async def _stream(self, request):
+        total = 0
+        async for chunk in request.stream():
+            total += len(chunk)
+            if total > self.max_request_bytes:
+                raise UploadTooLarge(f'request larger than {self.max_request_bytes} bytes')
+            yield chunk
+
+    async def _parse_urlencoded(self, request):
+        fields = []
+        pending = {}
+
+        def on_field_name(data, start, end):
+            pending['name'] = pending.get('name', b'') + data[start:end]
+
+        def on_field_data(data, start, end):
+            pending['value'] = pending.get('value', b'') + data[start:end]
+
+        def on_field_end():
+            fields.append((unquote_plus(pending.pop('name', b'').decode('latin-1')), unquote_plus(pending.pop('value', b'').decode('latin-1'))))
+
+        parser = QuerystringParser({'on_field_name': on_field_name, 'on_field_data': on_field_data, 'on_field_end': on_field_end})
+        async for chunk in self._stream(request):
+            parser.write(chunk)
+        parser.finalize()
+        return fields
+
+    async def _parse_multipart(self, request, boundary, check_fields=None, created=None):
+        # the parser callbacks only record events; file I/O happens below, off the event loop
+        events = []
+        header = {'field': b'', 'value': b'', 'headers': {}}
+
+        def on_part_begin():
+            header['headers'] = {}
+
+        def on_header_field(data, start, end):
+            header['field'] += data[start:end]
+
+        def on_header_value(data, start, end):
+            header['value'] += data[start:end]
+
+        def on_header_end():
+            header['headers'][header['field'].lower()] = header['value']
+            header['field'] = header['value'] = b''
+
+        def on_headers_finished():
+            events.append(('begin', dict(header['headers'])))
+
+        def on_part_data(data, start, end):
+            events.append(('data', data[start:end]))
+
+        def on_part_end():
+            events.append(('end', None))
+
+        parser = MultipartParser(boundary, {
+            'on_part_begin': on_part_begin,
+            'on_header_field': on_header_field,
+            'on_header_value': on_header_value,
+            'on_header_end': on_header_end,
+            'on_headers_finished': on_headers_finished,
+            'on_part_data': on_part_data,
+            'on_part_end': on_part_end,
+        })
+
+        fields, files, added = [], [], []
+        part = None
+        buf = []
+        buffered = 0
+        try:
+            async for chunk in self._stream(request):
+                parser.write(chunk)
+                for kind, payload in events:
+                    if kind == 'begin':
+                        _, disposition = parse_options_header(payload.get(b'content-disposition', b''))
+                        name = disposition.get(b'name', b'').decode('utf-8', 'replace')
+                        if b'filename' in disposition:
+                            if check_fields is not None:
+                                check_fields(fields)
+                                check_fields = None
+                            filename = disposition[b'filename'].decode('utf-8', 'replace')
+                            ctype = payload.get(b'content-type', b'application/octet-stream').decode('latin-1')
+                            part = ('file', name, await asyncio.to_thread(PendingFile, self, filename, ctype))
+                        else:
+                            part = ('field', name, bytearray())
+                    elif kind == 'data':
+                        if part[0] == 'field':
+                            part[2].extend(payload)
+                            if len(part[2]) > self.max_field_bytes:
+                                raise UploadTooLarge(f'field {part[1]!r} larger than {self.max_field_bytes} bytes')
+                            continue
+                        if part[2].size + buffered + len(payload) > self.max_file_bytes:
+                            raise UploadTooLarge(f'file {part[2].filename!r} larger than {self.max_file_bytes} bytes')
+                        buf.append(payload)
+                        buffered += len(payload)
+                        if buffered >= self.chunk_size:
+                            await asyncio.to_thread(part[2].write, b''.join(buf))
+                            buf, buffered = [], 0
+                    elif kind == 'end':
+                        if part[0] == 'field':
+                            fields.append((part[1], part[2].decode('utf-8', 'replace')))
+                        else:
+                            pending = part[2]
+                            if buf:
+                                await asyncio.to_thread(pending.write, b''.join(buf))
+                                buf, buffered = [], 0
+                            if not pending.filename and not pending.size:
+                                # an empty file input still sends a part
+                                await asyncio.to_thread(pending.abort)
+                            else:
+                                digest = await asyncio.to_thread(pending.commit)
+                                if pending.created is not None:
+                                    added.append((digest, pending.created))
+                                files.append({
+                                    'originalname': pending.filename,
+                                    'path': self.url_for(digest, pending.filename),
+                                    'size': pending.size,
+                                    'sha256': digest,
+                                    'content_type': pending.content_type,
+                                })
+                        part = None
+                events.clear()
+            parser.finalize()
+        except BaseException:
+            if part is not None and part[0] == 'file':
+                await asyncio.to_thread(part[2].abort)
+            # earlier parts of the rejected form are already in the store
+            await asyncio.to_thread(self.discard, added)
+            raise
+        if created is not None:
+            created.extend(added)
+        return fields, files
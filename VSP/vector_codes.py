@@ -0,0 +1,116 @@
+"""Compact codes of the vendor matrix for a cheap first scoring pass.
+
+``float16`` halves the float32 matrix, ``int8`` (one scale per dimension)
+quarters it and ``binary`` keeps one sign bit per dimension (32x smaller).
+Codes only rank candidates: the best ``rescore`` rows by code score are
+scored again against the float32 matrix, so returned scores are exact and a
+result only changes when a true top-k row falls outside that shortlist. The
+float32 store stays memory-mapped, and only the shortlisted rows are read.
+
+Codes are written next to the store (``.codes.npy`` memory-mapped like it,
+plus a ``.codes.json`` with the kind, scales and the manifest's matrix hash
+they were built from).
+"""
+import os
+import json
+
+import numpy as np
+
+KINDS = ('float16', 'int8', 'binary')
+
+# popcount per byte, for numpy versions without np.bitwise_count
+_POPCOUNT = np.asarray([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(x):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x]
+
+
+class VectorCodes:
+    def __init__(self, kind, codes, dim, scale=None, matrix_sha256=None):
+        self.kind = kind
+        self.codes = codes
+        self.dim = dim
+        self.scale = scale
+        self.matrix_sha256 = matrix_sha256
+
+    @property
+    def nbytes(self):
+        return int(self.codes.nbytes)
+
+    @classmethod
+    def build(cls, matrix, kind, matrix_sha256=None, chunk=65536):
+        """Encode a normalized float32 matrix, reading it in chunks of rows."""
+        if kind not in KINDS:
+            raise ValueError(f'unknown vector code kind {kind!r}')
+        n, dim = matrix.shape
+        scale = None
+        if kind == 'float16':
+            codes = np.empty((n, dim), dtype=np.float16)
+        elif kind == 'int8':
+            peak = np.zeros(dim, dtype=np.float32)
+            for i in range(0, n, chunk):
+                peak = np.maximum(peak, np.abs(np.asarray(matrix[i:i + chunk])).max(axis=0))
+            scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            codes = np.empty((n, dim), dtype=np.int8)
+        else:
+            codes = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+        for i in range(0, n, chunk):
+            block = np.asarray(matrix[i:i + chunk], dtype=np.float32)
+            if kind == 'float16':
+                codes[i:i + chunk] = block
+            elif kind == 'int8':
+                codes[i:i + chunk] = np.clip(np.rint(block / scale), -127, 127)
+            else:
+                codes[i:i + chunk] = np.packbits(block > 0, axis=1)
+        return cls(kind, codes, dim, scale, matrix_sha256)
+
+    def scores(self, q, rows=None, chunk=None):
+        """Approximate scores of normalized query ``q`` for every row (or the given rows)."""
+        codes = self.codes if rows is None else self.codes[rows]
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        # small blocks keep the float32 copy of a block in cache
+        chunk = chunk or (16384 if self.kind == 'binary' else 1024)
+        if self.kind == 'binary':
+            qbits = np.packbits(np.asarray(q) > 0)
+            for i in range(0, codes.shape[0], chunk):
+                hamming = _popcount(np.bitwise_xor(codes[i:i + chunk], qbits)).sum(axis=1, dtype=np.int32)
+                out[i:i + chunk] = 1.0 - 2.0 * hamming / self.dim
+            return out
+        # int8 codes score against the query with the scales folded in
+        qs = (q * self.scale if self.kind == 'int8' else q).astype(np.float32)
+        for i in range(0, codes.shape[0], chunk):
+            out[i:i + chunk] = codes[i:i + chunk].astype(np.float32) @ qs
+        return out
+
+    def save(self, path):
+        """Write ``path`` (.npy codes) and ``path`` with a .json suffix; both atomically."""
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.codes))
+        os.replace(tmp, path)
+        meta = {'kind': self.kind, 'dim': self.dim, 'count': int(self.codes.shape[0]), 'matrix_sha256': self.matrix_sha256,
+                'scale': self.scale.tolist() if self.scale is not None else None}
+        meta_path = os.path.splitext(path)[0] + '.json'
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    @classmethod
+    def load(cls, path, kind=None, matrix_sha256=None):
+        """Memory-map saved codes; None if missing, of another kind or built for a different matrix."""
+        try:
+            with open(os.path.splitext(path)[0] + '.json', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (kind and meta.get('kind') != kind) or (matrix_sha256 and meta.get('matrix_sha256') != matrix_sha256):
+                return None
+            codes = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if codes.shape[0] != meta.get('count'):
+            # a writer replaced the codes but not yet their metadata
+            return None
+        scale = np.asarray(meta['scale'], dtype=np.float32) if meta.get('scale') is not None else None
+        return cls(meta['kind'], codes, meta['dim'], scale, meta.get('matrix_sha256'))
@@ -0,0 +1,372 @@
+"""In-memory vendor catalog with inverted indexes for pre-filtering.
+
+The catalog is parsed once and reparsed only when the file's mtime/size
+change. Every distinct normalized service, country and country-list string
+maps to the array of vendor ids that carry it, so filters are evaluated over
+the (small) vocabulary and combined as boolean masks instead of
+lower-casing and substring-comparing every vendor's lists per request.
+Substring semantics are the same as the old per-vendor checks.
+
+Vendors are changed through an append-only change log next to the catalog
+file (``CatalogLoader.commit``). Every worker replays new log records onto
+its catalog with ``VendorCatalog.with_changes``, which derives a new catalog
+that shares the parent's arrays. A replaced or deleted vendor keeps its id as
+a tombstone and new versions get new ids, so only the index keys a change
+touches are rebuilt. Once the log or the tombstones pass a threshold, the
+live vendors are written back to the catalog file and the log is truncated.
+"""
+import os
+import copy
+import json
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+from lexical import BM25Index, vendor_document
+
+
+def _as_list(value):
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _strings(value):
+    """The string items of a list field; anything else (a hand-edited catalog, a malformed request) is skipped."""
+    return [s for s in _as_list(value) if isinstance(s, str)]
+
+
+def matches_service(v, service_needed):
+    """Per-vendor check (kept for single vendors, e.g. building rerank reasons)."""
+    if not service_needed:
+        return True
+    needed = [n.lower() for n in _strings(service_needed)]
+    return any(n in s or s in n for n in needed for s in _services(v))
+
+
+def _build_index(keys_per_vendor, start=0):
+    index = {}
+    for i, keys in enumerate(keys_per_vendor, start):
+        for k in set(keys):
+            index.setdefault(k, []).append(i)
+    return {k: np.asarray(ids, dtype=np.int32) for k, ids in index.items()}
+
+
+def _extend_index(index, added):
+    """``index`` with the ids of ``added`` (a _build_index result) appended; untouched keys are shared."""
+    if not added:
+        return index
+    out = dict(index)
+    for k, ids in added.items():
+        out[k] = np.concatenate([index[k], ids]) if k in index else ids
+    return out
+
+
+def _services(v):
+    return [s.lower() for s in _strings(v.get('services'))]
+
+
+def _countries(v):
+    return [c.lower() for c in _strings(v.get('countries'))]
+
+
+def _country_list(v):
+    return [' '.join(_strings(v.get('countries'))).lower()]
+
+
+def validate_vendor(v, partial=False):
+    """An error message for a malformed vendor object, or None."""
+    if not isinstance(v, dict):
+        return 'vendor must be an object'
+    if not partial and (not isinstance(v.get('name'), str) or not v['name'].strip()):
+        return 'name is required'
+    for key in ('services', 'countries', 'certifications'):
+        if key in v and not (isinstance(v[key], list) and all(isinstance(x, str) for x in v[key])):
+            return f'{key} must be a list of strings'
+    if v.get('capacity_per_month') is not None and (isinstance(v['capacity_per_month'], bool) or not isinstance(v['capacity_per_month'], (int, float))):
+        return 'capacity_per_month must be a number'
+    if 'description' in v and not isinstance(v['description'], str):
+        return 'description must be a string'
+    return None
+
+
+class VendorCatalog:
+    def __init__(self, vendors, version=None):
+        self.vendors = [v for v in vendors if isinstance(v, dict)]
+        self.version = version
+        self.by_name = {v.get('name'): i for i, v in enumerate(self.vendors)}
+        # False for tombstoned ids (replaced or deleted vendors)
+        self.alive = np.ones(len(self.vendors), dtype=bool)
+        self.tombstones = 0
+        # normalized tokens -> vendor ids
+        self.service_index = _build_index(_services(v) for v in self.vendors)
+        self.country_index = _build_index(_countries(v) for v in self.vendors)
+        # the lexical market boost matches against the joined country list
+        self.country_list_index = _build_index(_country_list(v) for v in self.vendors)
+        self.capacity = np.asarray([v.get('capacity_per_month') or 0 for v in self.vendors], dtype=np.float64)
+        self._matrix_rows = (None, None)
+        self._bm25 = None
+
+    def __len__(self):
+        return len(self.vendors)
+
+    def live(self):
+        """The current vendors (without tombstones), in id order."""
+        if not self.tombstones:
+            return list(self.vendors)
+        return [v for v, a in zip(self.vendors, self.alive) if a]
+
+    def vendor(self, name):
+        i = self.by_name.get(name)
+        return None if i is None else self.vendors[i]
+
+    def with_changes(self, changes, version=None):
+        """A new catalog with ``changes`` applied in order; this one stays valid for readers using it.
+
+        Changes are {'op': 'upsert', 'vendor': {...}} or {'op': 'delete', 'name': ...}
+        records. New and replaced vendors are appended under new ids and the ids
+        they replace become tombstones.
+        """
+        new = copy.copy(self)
+        new.version = version
+        new.vendors = list(self.vendors)
+        new.by_name = dict(self.by_name)
+        dead = []
+        for c in changes:
+            name = c.get('name') or (c.get('vendor') or {}).get('name')
+            old = new.by_name.pop(name, None)
+            if old is not None:
+                dead.append(old)
+            if c.get('op') == 'upsert' and isinstance(c.get('vendor'), dict):
+                new.by_name[name] = len(new.vendors)
+                new.vendors.append(c['vendor'])
+        start = len(self.vendors)
+        new.alive = np.ones(len(new.vendors), dtype=bool)
+        new.alive[:start] = self.alive
+        new.alive[dead] = False
+        new.tombstones = int(len(new.vendors) - new.alive.sum())
+        # only ids still alive after the whole batch need index entries
+        added = [i for i in range(start, len(new.vendors)) if new.alive[i]]
+        fresh = [new.vendors[i] for i in added]
+        ids = np.asarray(added, dtype=np.int32)
+
+        def extend(index, keys):
+            grouped = _build_index([keys(v) for v in fresh])
+            return _extend_index(index, {k: ids[pos] for k, pos in grouped.items()})
+
+        new.service_index = extend(self.service_index, _services)
+        new.country_index = extend(self.country_index, _countries)
+        new.country_list_index = extend(self.country_list_index, _country_list)
+        new.capacity = np.concatenate([self.capacity, np.asarray([v.get('capacity_per_month') or 0 for v in new.vendors[start:]], dtype=np.float64)])
+        if self._bm25 is not None:
+            removed = [vendor_document(self.vendors[i]) for i in dead if i < start and self.alive[i]]
+            new._bm25 = self._bm25.with_changes(len(new.vendors), [(i, vendor_document(new.vendors[i])) for i in added], removed)
+        vm, rows = self._matrix_rows
+        if vm is not None:
+            extra = np.asarray([vm.rows.get(v.get('name'), -1) for v in new.vendors[start:]], dtype=np.int64)
+            new._matrix_rows = (vm, np.concatenate([rows, extra]))
+        return new
+
+    def _union(self, index, predicate):
+        mask = np.zeros(len(self.vendors), dtype=bool)
+        for key, ids in index.items():
+            if predicate(key):
+                mask[ids] = True
+        if self.tombstones:
+            mask &= self.alive
+        return mask
+
+    def all_mask(self):
+        return self.alive.copy()
+
+    def service_mask(self, service_needed):
+        """Vendors with a service s where needed in s or s in needed (case-insensitive)."""
+        needed = [n.lower() for n in _strings(service_needed)]
+        if not needed:
+            return self.all_mask()
+        return self._union(self.service_index, lambda s: any(n in s or s in n for n in needed))
+
+    def market_mask(self, target_markets):
+        """Vendors with a country c where market in c or c in market (case-insensitive)."""
+        markets = [m.lower() for m in _strings(target_markets)]
+        if not markets:
+            return self.all_mask()
+        return self._union(self.country_index, lambda c: any(m in c or c in m for m in markets))
+
+    def market_text_mask(self, target_markets):
+        """Vendors whose joined country list contains any of the markets."""
+        markets = [m.lower() for m in _strings(target_markets)]
+        return self._union(self.country_list_index, lambda joined: any(m in joined for m in markets))
+
+    @property
+    def bm25(self):
+        """BM25 index over the vendor profiles, built on first use for this catalog version."""
+        if self._bm25 is None:
+            self._bm25 = BM25Index([vendor_document(v) if a else None for v, a in zip(self.vendors, self.alive)])
+        return self._bm25
+
+    def text_scores(self, query):
+        """BM25 scores for every id (0 for tombstones)."""
+        scores = self.bm25.scores(query)
+        if self.tombstones:
+            scores[~self.alive] = 0
+        return scores
+
+    def matrix_rows(self, vendor_matrix):
+        """Map catalog ids to rows of ``vendor_matrix`` (-1 where a vendor has no vector)."""
+        cached_for, rows = self._matrix_rows
+        if cached_for is not vendor_matrix:
+            rows = np.asarray([vendor_matrix.rows.get(v.get('name'), -1) for v in self.vendors], dtype=np.int64)
+            self._matrix_rows = (vendor_matrix, rows)
+        return rows
+
+
+class CatalogLoader:
+    """Loads the catalog once, reloads it when the file changes and replays the change log onto it."""
+
+    def __init__(self, path, fallback_names_path=None, changes_path=None, compact_bytes=32 << 20, compact_ratio=0.25):
+        self.path = path
+        self.fallback_names_path = fallback_names_path
+        self.changes_path = changes_path
+        self.compact_bytes = compact_bytes
+        self.compact_ratio = compact_ratio
+        self._stamp = None
+        self._offset = 0
+        self._catalog = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return f'{st.st_mtime_ns}:{st.st_size}'
+        except OSError:
+            return None
+
+    def _log_size(self):
+        if not self.changes_path:
+            return 0
+        try:
+            return os.stat(self.changes_path).st_size
+        except OSError:
+            return 0
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            # fallback to simple vendor names list
+            try:
+                with open(self.fallback_names_path, 'r', encoding='utf-8') as f:
+                    names = json.load(f)
+                    return [{'name': n, 'description': n, 'services': [], 'countries': []} for n in names]
+            except Exception:
+                return []
+
+    def _read_changes(self, offset):
+        """Complete change records after ``offset``; returns (records, new offset)."""
+        try:
+            with open(self.changes_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return [], offset
+        # a record still being appended by another worker is picked up next time
+        end = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                print('Skipping malformed vendor change record')
+        return records, offset + end
+
+    def get(self):
+        stamp, size = self._stat(), self._log_size()
+        if self._catalog is None or stamp != self._stamp or size != self._offset:
+            # the startup warm-up loads it in a thread; do not parse it twice
+            with self._lock:
+                stamp, size = self._stat(), self._log_size()
+                catalog = self._catalog
+                if catalog is None or stamp != self._stamp or size < self._offset:
+                    catalog = VendorCatalog(self._read(), version=stamp or '-')
+                    self._stamp, self._offset = stamp, 0
+                if size > self._offset:
+                    records, offset = self._read_changes(self._offset)
+                    if records:
+                        catalog = catalog.with_changes(records, version=f'{stamp or "-"}+{offset}')
+                    self._offset = offset
+                self._catalog = catalog
+        return self._catalog
+
+    def commit(self, ops):
+        """Apply vendor changes as one batch, across workers; returns one result per op.
+
+        ``ops`` are dicts with ``op`` ('upsert', 'patch' or 'delete'), ``name``,
+        ``vendor`` (the full object or the fields to patch) and optionally
+        ``version``, the version the caller expects the vendor to have now.
+        Each vendor's version goes up by one per change. A result has the
+        vendor ``name``, a ``status`` (created, updated, deleted, not_found or
+        conflict) and the resulting ``version``.
+        """
+        with self._write_lock, open(self.changes_path, 'ab') as log:
+            if fcntl is not None:
+                fcntl.flock(log.fileno(), fcntl.LOCK_EX)
+            # catch up with changes other workers committed first
+            catalog = self.get()
+            now = datetime.utcnow().isoformat() + 'Z'
+            pending, records, results = {}, [], []
+            for op in ops:
+                name = op['name']
+                current = pending[name] if name in pending else catalog.vendor(name)
+                version = current.get('version', 0) if current is not None else 0
+                if op.get('version') is not None and op['version'] != version:
+                    results.append({'name': name, 'status': 'conflict', 'version': version})
+                    continue
+                if op['op'] in ('patch', 'delete') and current is None:
+                    results.append({'name': name, 'status': 'not_found', 'version': 0})
+                    continue
+                if op['op'] == 'delete':
+                    pending[name] = None
+                    records.append({'op': 'delete', 'name': name, 'version': version + 1, 'at': now})
+                    results.append({'name': name, 'status': 'deleted', 'version': version + 1})
+                    continue
+                vendor = dict(current) if op['op'] == 'patch' else {}
+                vendor.update(op['vendor'])
+                vendor.update(name=name, version=version + 1, updatedAt=now)
+                pending[name] = vendor
+                records.append({'op': 'upsert', 'name': name, 'vendor': vendor, 'at': now})
+                results.append({'name': name, 'status': 'created' if current is None else 'updated', 'version': version + 1})
+            if records:
+                log.write(b''.join(json.dumps(r, ensure_ascii=False).encode('utf-8') + b'\n' for r in records))
+                log.flush()
+                os.fsync(log.fileno())
+                catalog = self.get()
+                if self._offset > self.compact_bytes or catalog.tombstones > self.compact_ratio * len(catalog):
+                    self._compact(catalog, log)
+        return results
+
+    def _compact(self, catalog, log):
+        """Write the live vendors back to the catalog file and empty the log (caller holds the log lock)."""
+        vendors = catalog.live()
+        compacted = VendorCatalog(vendors)
+        # index it here rather than on the next request
+        compacted.bm25
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(vendors, f, ensure_ascii=False, indent=2)
+        # swap file, log and catalog together so get() never reparses what is already loaded
+        with self._lock:
+            os.replace(tmp, self.path)
+            log.truncate(0)
+            self._stamp, self._offset = self._stat(), 0
+            compacted.version = self._stamp or '-'
+            self._catalog = compacted
+        print(f'Compacted vendor catalog: {len(vendors)} vendors, {catalog.tombstones} tombstones dropped')
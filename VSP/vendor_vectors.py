@@ -0,0 +1,335 @@
+"""In-memory vendor embedding matrix used for retrieval.
+
+Vendor vectors are held as one L2-normalized float32 matrix plus a name -> row
+index, so scoring a query is a single matrix-vector product and the top-k
+comes from ``np.argpartition`` instead of a Python sort over all vendors.
+
+On disk the matrix is a raw float32 ``.npy`` file (already normalized) plus a
+JSON manifest with the row names, model, dimension and per-vendor content
+hashes. The server opens it with ``mmap_mode='r'`` so every uvicorn worker
+shares the same pages through the OS page cache.
+
+Optional compact codes (``vector_codes.py``: float16, int8 or binary) rank
+candidates first; only the best ``rescore`` rows are read from the float32
+matrix and scored exactly.
+
+Vendors changed since the store was built are embedded into a small delta
+store in the same format. ``LayeredMatrix`` scores the two together, so a
+change only costs its own rows until the next full build folds them in.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+import numpy as np
+
+from ann_index import IVFIndex, top_rows
+from vector_codes import VectorCodes
+
+STORE_FORMAT = 1
+
+
+def vendor_blob(v):
+    """Short text blob describing a vendor; this is what gets embedded."""
+    name = v.get('name')
+    return f"{name}. Services: {', '.join(v.get('services', []))}. Countries: {', '.join(v.get('countries', []))}. Description: {v.get('description', '')}"
+
+
+def blob_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalize_rows(vectors):
+    m = np.asarray(vectors, dtype=np.float32)
+    if m.ndim != 2:
+        m = m.reshape(m.shape[0] if m.ndim else 0, -1)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+class _RowSearch:
+    """Queries shared by VendorMatrix and LayeredMatrix.
+
+    Subclasses provide ``names``, ``rows``, ``manifest``, ``ann``, ``codes``,
+    ``dim``, ``vector()``, ``_scores()`` and ``_search()``.
+    """
+
+    def __len__(self):
+        return len(self.names)
+
+    def hash_of(self, name):
+        """Content hash the stored vector for ``name`` was built from (None if unknown)."""
+        row = self.rows.get(name)
+        hashes = self.manifest.get('hashes') or []
+        return hashes[row] if row is not None and row < len(hashes) else None
+
+    def with_delta(self, delta):
+        """This store with the rows of ``delta`` (another VendorMatrix) layered on top."""
+        return LayeredMatrix(self, delta) if delta is not None and len(delta) else self
+
+    def mask_for(self, names):
+        """Boolean row mask selecting the given vendor names (unknown names ignored)."""
+        mask = np.zeros(len(self.names), dtype=bool)
+        rows = [self.rows[n] for n in names if n in self.rows]
+        if rows:
+            mask[rows] = True
+        return mask
+
+    def normalize_query(self, qvec):
+        q = np.asarray(qvec, dtype=np.float32).ravel()
+        if q.size != self.dim:
+            return None
+        n = np.linalg.norm(q)
+        return q / n if n else None
+
+    def top_k(self, qvec, k=20, mask=None, exact=False):
+        """Return [(name, cosine)] for the k best rows, restricted to ``mask`` if given."""
+        q = self.normalize_query(qvec)
+        if q is None or not len(self.names):
+            return []
+        if (self.ann is not None or self.codes is not None) and not exact:
+            rows, scores = self._search(q, k, mask)
+            return [(self.names[i], float(sc)) for i, sc in zip(rows, scores)]
+        scores = self._scores(q)
+        return self._select(scores, k, mask)
+
+    def top_k_batch(self, qvecs, k=20, masks=None, max_block=1 << 25):
+        """top_k() for many queries: one matrix-matrix product per block of queries.
+
+        Blocks are sized so a block's score matrix stays under ``max_block``
+        floats. Queries that cannot be scored (None / wrong dimension) get [].
+        With an ANN index each query is searched on its own.
+        """
+        masks = masks if masks is not None else [None] * len(qvecs)
+        out = [[] for _ in qvecs]
+        normalized = [(i, self.normalize_query(q)) for i, q in enumerate(qvecs) if q is not None]
+        normalized = [(i, q) for i, q in normalized if q is not None]
+        if not normalized or not len(self.names):
+            return out
+        if self.ann is not None or self.codes is not None:
+            for i, q in normalized:
+                rows, scores = self._search(q, k, masks[i])
+                out[i] = [(self.names[r], float(sc)) for r, sc in zip(rows, scores)]
+            return out
+        block = max(1, max_block // len(self.names))
+        for start in range(0, len(normalized), block):
+            chunk = normalized[start:start + block]
+            scores = self._scores(np.stack([q for _, q in chunk]))
+            for j, (i, _) in enumerate(chunk):
+                out[i] = self._select(scores[j], k, masks[i])
+        return out
+
+    def _select(self, scores, k, mask=None):
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        if k < scores.shape[0]:
+            idx = np.argpartition(-scores, k - 1)[:k]
+        else:
+            idx = np.arange(scores.shape[0])
+        idx = idx[np.argsort(-scores[idx], kind='stable')]
+        return [(self.names[i], float(scores[i])) for i in idx]
+
+
+class VendorMatrix(_RowSearch):
+    def __init__(self, names, vectors, normalized=False, manifest=None):
+        self.names = list(names)
+        self.rows = {n: i for i, n in enumerate(self.names)}
+        # a memmapped store is normalized at write time; keep it as-is so the
+        # pages stay shared instead of being copied into this process
+        self.matrix = vectors if normalized else normalize_rows(vectors)
+        self.manifest = manifest or {}
+        # optional IVF index for large catalogs; exact search when None
+        self.ann = None
+        self.nprobe = 8
+        # optional compact codes for the first scoring pass
+        self.codes = None
+        self.rescore = 200
+
+    @classmethod
+    def open(cls, npy_path, manifest_path):
+        """Memory-map a store written by save_store(); None if missing or inconsistent."""
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            matrix = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        names = manifest.get('names') or []
+        if matrix.ndim != 2 or matrix.shape[0] != len(names):
+            # a writer replaced the .npy but not yet the manifest
+            return None
+        return cls(names, matrix, normalized=True, manifest=manifest)
+
+    def vector(self, name):
+        row = self.rows.get(name)
+        return None if row is None else self.matrix[row]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def attach_ann(self, path, nprobe=8):
+        """Use the IVF index at ``path`` if it was built for this matrix."""
+        self.ann = IVFIndex.load(path, self.manifest.get('matrix_sha256'))
+        self.nprobe = nprobe
+        return self.ann is not None
+
+    def attach_codes(self, path, kind, rescore=200):
+        """Score through the codes at ``path`` if they are of ``kind`` and were built for this matrix."""
+        self.codes = VectorCodes.load(path, kind, self.manifest.get('matrix_sha256'))
+        self.rescore = rescore
+        return self.codes is not None
+
+    def _search(self, q, k, mask):
+        """(rows, exact scores) of the top k through the IVF index and/or the compact codes."""
+        rows = self.ann.candidates(q, k, self.nprobe, mask) if self.ann is not None else None
+        if self.codes is None:
+            return top_rows(rows, np.asarray(self.matrix[rows]) @ q, k)
+        approx = self.codes.scores(q, rows)
+        if rows is None:
+            rows = np.arange(len(self.names))
+            if mask is not None:
+                rows, approx = rows[mask], approx[mask]
+        # shortlist by code score, then rescore those rows from the float32 matrix
+        shortlist = np.sort(top_rows(rows, approx, max(k, self.rescore))[0])
+        return top_rows(shortlist, np.asarray(self.matrix[shortlist]) @ q, k)
+
+    def _scores(self, q):
+        """Cosine of every row with a normalized query (or a block of queries, one per row)."""
+        return self.matrix @ q if q.ndim == 1 else q @ self.matrix.T
+
+
+class LayeredMatrix(_RowSearch):
+    """A base store plus a delta of newer vectors; delta rows are numbered after the base's.
+
+    A vendor in both maps to its delta row and its base row is never returned.
+    The base keeps its IVF index and codes; the (small) delta is always scored exactly.
+    """
+
+    def __init__(self, base, delta):
+        self.base, self.delta = base, delta
+        self.names = base.names + delta.names
+        self.rows = dict(base.rows)
+        self.rows.update((n, len(base) + i) for i, n in enumerate(delta.names))
+        self.manifest = dict(base.manifest)
+        self.manifest['hashes'] = list(base.manifest.get('hashes') or [None] * len(base)) + list(delta.manifest.get('hashes') or [None] * len(delta))
+        self.manifest['delta'] = len(delta)
+        self.ann = base.ann
+        self.nprobe = base.nprobe
+        self.codes = base.codes
+        self.rescore = base.rescore
+        # base rows superseded by the delta
+        self.shadowed = base.mask_for(delta.names)
+
+    @property
+    def dim(self):
+        return self.base.dim
+
+    def vector(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            return None
+        return self.base.vector(name) if row < len(self.base) else self.delta.vector(name)
+
+    def _split(self, mask):
+        nb = len(self.base)
+        if mask is None:
+            return ~self.shadowed, None
+        return mask[:nb] & ~self.shadowed, mask[nb:]
+
+    def _scores(self, q):
+        return np.concatenate([self.base._scores(q), self.delta._scores(q)], axis=q.ndim - 1)
+
+    def _select(self, scores, k, mask=None):
+        base_mask, delta_mask = self._split(mask)
+        full = np.concatenate([base_mask, delta_mask if delta_mask is not None else np.ones(len(self.delta), dtype=bool)])
+        return super()._select(scores, k, full)
+
+    def _search(self, q, k, mask):
+        base_mask, delta_mask = self._split(mask)
+        rows, scores = self.base._search(q, k, base_mask)
+        extra = self.delta._scores(q)
+        if delta_mask is not None:
+            extra = np.where(delta_mask, extra, -np.inf)
+        rows = np.concatenate([rows, np.arange(len(self.delta)) + len(self.base)])
+        scores = np.concatenate([scores, extra])
+        keep = np.isfinite(scores)
+        rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')[:k]
+        return rows[order], scores[order]
+
+
+def save_store(npy_path, manifest_path, names, vectors, model, hashes=None):
+    """Write the normalized float32 matrix and its manifest atomically.
+
+    The .npy is replaced first and the manifest last; readers key on the
+    manifest so they never see names that do not match the matrix rows.
+    """
+    names = list(names)
+    m = normalize_rows(vectors) if len(names) else np.zeros((0, 0), dtype=np.float32)
+    tmp = npy_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, m)
+    os.replace(tmp, npy_path)
+    manifest = {
+        'format': STORE_FORMAT,
+        'model': model,
+        'dim': int(m.shape[1]) if m.ndim == 2 else 0,
+        'count': len(names),
+        'dtype': 'float32',
+        'normalized': True,
+        'createdAt': datetime.utcnow().isoformat() + 'Z',
+        'matrix_sha256': hashlib.sha256(m.tobytes()).hexdigest(),
+        'names': names,
+        'hashes': list(hashes) if hashes is not None else [None] * len(names),
+    }
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def convert_json_store(json_path, npy_path, manifest_path, model, catalog=None):
+    """Convert a legacy {name: [floats]} embeddings JSON into the binary store.
+
+    The JSON carries no content hashes, so hashes are taken from the current
+    catalog blob for each vendor (assumed to be what was embedded).
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    names = [n for n, v in mapping.items() if v]
+    blobs = {v.get('name'): blob_hash(vendor_blob(v)) for v in (catalog or [])}
+    return save_store(npy_path, manifest_path, names, [mapping[n] for n in names], model, [blobs.get(n) for n in names])
+
+
+def build_ann_for_store(npy_path, manifest_path, ann_path, min_rows, nlist=None):
+    """Build (or drop) the IVF index next to the store; returns the index or None.
+
+    Catalogs smaller than ``min_rows`` keep exact search, and any stale index
+    file is removed.
+    """
+    vm = VendorMatrix.open(npy_path, manifest_path)
+    if vm is None or len(vm) < min_rows:
+        if os.path.exists(ann_path):
+            os.remove(ann_path)
+        return None
+    index = IVFIndex.build(vm.matrix, nlist=nlist, matrix_sha256=vm.manifest.get('matrix_sha256'))
+    index.save(ann_path)
+    return index
+
+
+def build_codes_for_store(npy_path, manifest_path, codes_path, kind):
+    """Encode the store's matrix as ``kind`` codes next to it; returns the codes or None."""
+    vm = VendorMatrix.open(npy_path, manifest_path)
+    if vm is None or not len(vm):
+        return None
+    codes = VectorCodes.build(vm.matrix, kind, matrix_sha256=vm.manifest.get('matrix_sha256'))
+    codes.save(codes_path)
+    return codes